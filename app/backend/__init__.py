@@ -1,2 +1,2 @@
 # from .model import last_request_time, router, check_stop_idle_containers
-from .model import router, check_stop_idle_containers, ContainerManager
\ No newline at end of file
+from .model import router, check_stop_idle_containers, run_prefetch_scheduler, watch_config, ContainerManager
\ No newline at end of file
@@ -1,3 +1,3 @@
 # from ._internals import last_request_time, check_stop_idle_containers, container_status, model_config
-from ._internals import check_stop_idle_containers, model_config, ContainerManager
+from ._internals import check_stop_idle_containers, run_prefetch_scheduler, watch_config, model_config, ContainerManager
 from .model import router
\ No newline at end of file
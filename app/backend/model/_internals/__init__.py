@@ -1,2 +1,16 @@
 # from .container import ContainerManager, last_request_time, container_status, check_stop_idle_containers, model_config
-from .container import ContainerManager, check_stop_idle_containers, model_config
\ No newline at end of file
+from .container import ContainerManager, check_stop_idle_containers, run_prefetch_scheduler, watch_config, model_config
+from .body import read_model_name, replay_body, scan_model_name
+from .embedding_cache import EmbeddingCache, embedding_key, key_params
+from .metrics import RouterMetrics
+from .telemetry import GpuTelemetry, GpuReading
+from .batcher import EmbeddingBatcher, UpstreamBatchError, split_embeddings
+from .response_cache import ResponseCache, CachedResponse, is_cacheable, response_key
+from .gguf import GgufIndex, GgufInfo, read_gguf_header, kv_cache_bytes
+from .park import ModelParking, warm_files
+from .predictor import DemandPredictor, plan_prefetch
+from .coordination import StateBackend, LocalStateBackend, make_state_backend
+from .fairness import FairShare, ModelScheduler, TenantPolicy, TokenBucket
+from .reload import ConfigWatcher, diff_config, validate_config
+from .inflight import RequestTracker, TrackedRequest
+from .fallback import ModelFallback, ModelGroup
\ No newline at end of file
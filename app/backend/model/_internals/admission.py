@@ -0,0 +1,94 @@
+import math
+import time
+from typing import TypedDict
+
+from exceptions import ModelQueueFull
+
+
+class QueueStats(TypedDict):
+    queued:int
+    max_queued:int
+    admitted:int
+    rejected:int
+    timed_out:int
+    wait_seconds_total:float
+    wait_seconds_max:float
+
+
+class AdmissionQueue:
+    """Bounded waiting room for requests to a model that is not ready yet
+
+    Only tracks the depth and wait time of the waiting requests, the waiting itself is done on the shared cold-start task.
+    """
+    def __init__(self, model_name:str, max_queued:int, timeout:float):
+        self.model_name = model_name
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self.queued = 0
+        self.max_queued_seen = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def retry_after(self, expected_start:float|None=None) -> int:
+        """Seconds a rejected client should wait before retrying
+
+        Args:
+            expected_start (float | None, optional): Last observed cold-start duration of the model. Defaults to None.
+
+        Returns:
+            int: Retry-After value in seconds
+        """
+        return max(1, math.ceil(expected_start if expected_start else self.timeout))
+
+    def enter(self, expected_start:float|None=None) -> float:
+        """Admit a request into the waiting room
+
+        Args:
+            expected_start (float | None, optional): Last observed cold-start duration, used for Retry-After. Defaults to None.
+
+        Raises:
+            ModelQueueFull: If `max_queued` requests are already waiting
+
+        Returns:
+            float: Admission timestamp to hand back to `leave`
+        """
+        if self.queued >= self.max_queued:
+            self.rejected += 1
+            raise ModelQueueFull(self.model_name, retry_after=self.retry_after(expected_start))
+        self.queued += 1
+        self.max_queued_seen = max(self.max_queued_seen, self.queued)
+        return time.perf_counter()
+
+    def leave(self, entered_at:float, timed_out:bool=False) -> float:
+        """Release a request from the waiting room and record its wait time
+
+        Args:
+            entered_at (float): Timestamp returned by `enter`
+            timed_out (bool, optional): Whether the request gave up waiting. Defaults to False.
+
+        Returns:
+            float: Seconds the request waited
+        """
+        waited = time.perf_counter() - entered_at
+        self.queued -= 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        if timed_out:
+            self.timed_out += 1
+        else:
+            self.admitted += 1
+        return waited
+
+    def stats(self) -> QueueStats:
+        return {
+            'queued': self.queued,
+            'max_queued': self.max_queued_seen,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'wait_seconds_total': round(self.wait_total, 3),
+            'wait_seconds_max': round(self.wait_max, 3),
+        }
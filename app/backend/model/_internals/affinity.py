@@ -0,0 +1,120 @@
+import json
+import hashlib
+from collections import OrderedDict
+from typing import TypedDict
+
+# a completion prompt is fingerprinted in blocks of this many characters or tokens, the partial tail is ignored
+PROMPT_BLOCK = 256
+
+
+class AffinityStats(TypedDict):
+    lookups:int
+    hits:int
+    fallbacks:int
+    prefix_reuse_ratio:float
+    entries:int
+    max_entries:int
+
+
+def prefix_fingerprints(model_name:str, path:str, body:dict, session_id:str|None=None) -> list[bytes]:
+    """Chained fingerprints of every prefix of a request, shortest first.
+
+    Chat requests are split per message and completion prompts in `PROMPT_BLOCK` sized blocks. The next turn of a
+    conversation repeats the previous request as its prefix, so one of its fingerprints equals the last fingerprint
+    of the previous turn. With a session id the request has a single fingerprint for the whole session.
+
+    Args:
+        model_name (str): Model name based on the config
+        path (str): Endpoint path
+        body (dict): Decoded request body
+        session_id (str | None, optional): Client provided session id. Defaults to None.
+
+    Returns:
+        list[bytes]: One fingerprint per prefix, empty if the body has nothing to fingerprint
+    """
+    seed = hashlib.sha1(f'{model_name}\0{path}\0'.encode())
+    if session_id:
+        seed.update(b'session\0' + session_id.encode())
+        return [seed.digest()]
+
+    if 'messages' in body:
+        items = [json.dumps(message, sort_keys=True, separators=(',', ':')) for message in body['messages'] or ()]
+    else:
+        prompt = body.get('prompt')
+        if isinstance(prompt, list) and prompt and isinstance(prompt[0], int):
+            prompt = json.dumps(prompt, separators=(',', ':'))
+        if not isinstance(prompt, str):
+            return []
+        items = [prompt[i:i + PROMPT_BLOCK] for i in range(0, len(prompt) - PROMPT_BLOCK + 1, PROMPT_BLOCK)]
+
+    fingerprints = []
+    digest = seed.digest()
+    for item in items:
+        digest = hashlib.sha1(digest + item.encode()).digest()
+        fingerprints.append(digest)
+    return fingerprints
+
+
+class AffinityTable:
+    """Bounded LRU from a request prefix fingerprint to the replica and slot that last served it
+
+    Args:
+        max_entries (int): Fingerprints kept, the least recently used are dropped first
+    """
+    def __init__(self, max_entries:int=10_000):
+        self.max_entries = max_entries
+        self._entries:OrderedDict[bytes, tuple[int, int|None]] = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.fallbacks = 0
+        self.reused_items = 0
+        self.total_items = 0
+
+    def lookup(self, fingerprints:list[bytes]) -> tuple[int, int, int|None]|None:
+        """Find the replica holding the longest known prefix of a request
+
+        Args:
+            fingerprints (list[bytes]): Fingerprints from `prefix_fingerprints`
+
+        Returns:
+            tuple[int, int, int|None]|None: Prefix length, replica index and slot id, None if no prefix is known
+        """
+        for depth in range(len(fingerprints), 0, -1):
+            target = self._entries.get(fingerprints[depth - 1])
+            if target is not None:
+                self._entries.move_to_end(fingerprints[depth - 1])
+                return depth, *target
+        return None
+
+    def record(self, items:int, reused:int, fallback:bool=False):
+        """Count one routed request
+
+        Args:
+            items (int): Prefix length of the request
+            reused (int): Prefix length found on the replica it was routed to, 0 on a miss or fallback
+            fallback (bool, optional): Whether the known replica was skipped because it was busy. Defaults to False.
+        """
+        self.lookups += 1
+        self.total_items += items
+        self.reused_items += reused
+        if reused:
+            self.hits += 1
+        if fallback:
+            self.fallbacks += 1
+
+    def assign(self, fingerprint:bytes, replica_index:int, slot:int|None):
+        self._entries[fingerprint] = (replica_index, slot)
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> AffinityStats:
+        return {
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'fallbacks': self.fallbacks,
+            # share of the request prefixes (messages or prompt blocks) that were routed to a replica already holding them
+            'prefix_reuse_ratio': round(self.reused_items / self.total_items, 4) if self.total_items else 0.0,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+        }
@@ -0,0 +1,138 @@
+import json
+import asyncio
+import httpx
+from typing import Awaitable, Callable, TypedDict
+
+from logger import get_logger
+
+logger = get_logger()
+
+
+class UpstreamBatchError(Exception):
+    """The batched upstream call answered with an error, `response` is passed back to every caller of the batch"""
+    def __init__(self, response:httpx.Response):
+        super().__init__(f'Batched embeddings request failed with status {response.status_code}')
+        self.response = response
+
+
+class BatcherStats(TypedDict):
+    batches:int
+    items:int
+    max_batch:int
+    max_wait_ms:float
+
+
+def split_embeddings(payload:dict, items:list) -> list[tuple[list[float], int]]:
+    """Split an upstream `/v1/embeddings` response into one vector per input.
+
+    llama-server only reports usage for the whole call, so `prompt_tokens` is apportioned over the inputs by their length.
+
+    Args:
+        payload (dict): Decoded upstream response
+        items (list): Inputs of the upstream call, in order
+
+    Returns:
+        list[tuple[list[float], int]]: Vector and prompt tokens of each input, in input order
+    """
+    data = sorted(payload['data'], key=lambda d: d['index'])
+    prompt_tokens = payload.get('usage', {}).get('prompt_tokens', 0)
+    lengths = [max(1, len(item)) for item in items]
+    total_length = sum(lengths)
+    return [(d['embedding'], round(prompt_tokens * length / total_length)) for d, length in zip(data, lengths)]
+
+
+class _Batch:
+    __slots__ = ('model_name', 'body', 'items', 'futures', 'timer')
+
+    def __init__(self, model_name:str, body:dict):
+        self.model_name = model_name
+        self.body = body
+        self.items = []
+        self.futures:list[asyncio.Future] = []
+        self.timer:asyncio.TimerHandle|None = None
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embedding inputs for the same model into one upstream call.
+
+    A batch is opened by the first input and sent once it holds `max_batch` inputs or `max_wait` seconds have
+    passed, whichever comes first. Only inputs whose other request fields are equal share a batch.
+
+    Args:
+        send (Callable[[str, dict], Awaitable[httpx.Response]]): Sends one `/v1/embeddings` body to the model
+        max_batch (int): Maximum inputs per upstream call
+        max_wait (float): Seconds the first input of a batch waits for others
+    """
+    def __init__(self, send:Callable[[str, dict], Awaitable[httpx.Response]], max_batch:int=32, max_wait:float=0.005):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._send = send
+        self._pending:dict[tuple[str, str], _Batch] = {}
+        self._in_flight:set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, model_name:str, params:dict, body:dict, item) -> tuple[list[float], int]:
+        """Add one input to the open batch of its model and wait for its vector
+
+        Args:
+            model_name (str): Model name based on the config
+            params (dict): Request fields other than the input, from `key_params`
+            body (dict): Decoded request body, used as the template of the batched call
+            item (str|list[int]): One input string or token array
+
+        Raises:
+            UpstreamBatchError: If the upstream call did not answer with 200
+
+        Returns:
+            tuple[list[float], int]: Vector and prompt tokens of the input
+        """
+        loop = asyncio.get_running_loop()
+        key = (model_name, json.dumps(params, sort_keys=True))
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _Batch(model_name, body)
+            batch.timer = loop.call_later(self.max_wait, self._flush, key, batch)
+        future = loop.create_future()
+        batch.items.append(item)
+        batch.futures.append(future)
+        if len(batch.items) >= self.max_batch:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key:tuple[str, str], batch:_Batch):
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        batch.timer.cancel()
+        task = asyncio.create_task(self._run(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _run(self, batch:_Batch):
+        self.batches += 1
+        self.items += len(batch.items)
+        try:
+            resp = await self._send(batch.model_name, {**batch.body, 'input': batch.items})
+            if resp.status_code != 200:
+                for future in batch.futures:
+                    if not future.done():
+                        future.set_exception(UpstreamBatchError(resp))
+                return
+            results = split_embeddings(resp.json(), batch.items)
+        except Exception as e:
+            logger.warning(f'Batched embeddings request for model {batch.model_name} failed: {e}')
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(batch.futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> BatcherStats:
+        return {
+            'batches': self.batches,
+            'items': self.items,
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000,
+        }
@@ -0,0 +1,113 @@
+import re
+import json
+from json.scanner import make_scanner
+from typing import AsyncIterator
+
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_FIRST_KEY_PAT = re.compile(rb'\s*\{\s*"model"\s*:\s*(' + _STRING + rb')')
+_COLON_PAT = re.compile(rb'\s*:')
+_WS_PAT = re.compile(r'[ \t\n\r]*')
+_MODEL_KEY = b'"model"'
+_BACKSLASH = ord('\\')
+_HEAD_SIZE = 4096
+
+# C accelerated `json` value scanner, lets us skip over values without decoding the whole document
+_scan_once = make_scanner(json.JSONDecoder())
+
+
+def _top_level_value(raw:bytes, start:int) -> tuple[bool, str|None]:
+    """Check whether the `"model"` key at `start` belongs to the top level object.
+
+    The members following the key are walked with the C json scanner. A top level member is followed only by
+    sibling members and the closing brace of the document, a nested one hits its parent's brace before the end.
+    """
+    text = raw[start:].decode('utf-8')
+    ws = _WS_PAT.match
+    try:
+        _, idx = _scan_once(text, 0)
+        idx = ws(text, idx).end() + 1
+        value, idx = _scan_once(text, ws(text, idx).end())
+        while True:
+            idx = ws(text, idx).end()
+            if text[idx] == '}':
+                if ws(text, idx + 1).end() != len(text):
+                    return False, None
+                return True, value if isinstance(value, str) else None
+            if text[idx] != ',':
+                return False, None
+            _, idx = _scan_once(text, ws(text, idx + 1).end())
+            idx = ws(text, idx).end()
+            if text[idx] != ':':
+                return False, None
+            _, idx = _scan_once(text, ws(text, idx + 1).end())
+    except (StopIteration, ValueError, IndexError):
+        return False, None
+
+
+def scan_model_name(raw:bytes) -> str|None:
+    """Extract the top level `model` field from a raw JSON body without decoding the whole document.
+
+    When `model` is the first key it is read straight from the head of the body. Otherwise candidate keys are located
+    with `bytes.find` and only the members after the candidate are scanned to confirm it is not nested.
+
+    Args:
+        raw (bytes): Raw request body
+
+    Returns:
+        str|None: Model name, or None if the body has no top level string `model` field
+    """
+    if match := _FIRST_KEY_PAT.match(raw):
+        return json.loads(match.group(1))
+
+    pos = raw.find(_MODEL_KEY)
+    while pos != -1:
+        # an unescaped `"model"` followed by a colon can only be a key in valid JSON
+        if (pos == 0 or raw[pos - 1] != _BACKSLASH) and _COLON_PAT.match(raw, pos + len(_MODEL_KEY)):
+            is_top_level, model_name = _top_level_value(raw, pos)
+            if is_top_level:
+                return model_name
+        pos = raw.find(_MODEL_KEY, pos + 1)
+    return None
+
+
+async def read_model_name(stream:AsyncIterator[bytes]) -> tuple[str|None, list[bytes]]:
+    """Read the request body stream until the top level `model` field is known
+
+    If `model` is the first key, reading stops right after it and the rest of the body is left in `stream`,
+    otherwise the whole body is read and scanned with `scan_model_name`.
+
+    Args:
+        stream (AsyncIterator[bytes]): Incoming request body stream, usually `Request.stream()`
+
+    Returns:
+        tuple[str|None, list[bytes]]: Model name and the raw chunks consumed so far
+    """
+    consumed = []
+    head = b''
+    async for chunk in stream:
+        if not chunk:
+            continue
+        consumed.append(chunk)
+        if len(head) < _HEAD_SIZE:
+            head += chunk
+            if match := _FIRST_KEY_PAT.match(head):
+                return json.loads(match.group(1)), consumed
+    raw = b''.join(consumed)
+    return scan_model_name(raw), [raw]
+
+
+async def replay_body(consumed:list[bytes], stream:AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Re-emit the already consumed chunks followed by the rest of the body stream, byte for byte
+
+    Args:
+        consumed (list[bytes]): Chunks already read from `stream`
+        stream (AsyncIterator[bytes]): Remaining request body stream
+
+    Yields:
+        bytes: Body chunks in their original order
+    """
+    for chunk in consumed:
+        yield chunk
+    async for chunk in stream:
+        if chunk:
+            yield chunk
@@ -13,3 +13,34 @@ def load_config(path_file:str):
         config = yaml.safe_load(f)
     return config
 
+
+_SIZE_UNITS = {
+    '': 1, 'b': 1,
+    'k': 1000, 'kb': 1000, 'kib': 1024,
+    'm': 1000**2, 'mb': 1000**2, 'mib': 1024**2,
+    'g': 1000**3, 'gb': 1000**3, 'gib': 1024**3,
+    't': 1000**4, 'tb': 1000**4, 'tib': 1024**4,
+}
+
+def parse_size(value) -> int|None:
+    """Parse a human readable size from the config into bytes
+
+    Args:
+        value (str|int|float|None): Size such as `6GB`, `512MiB` or a plain number of bytes
+
+    Raises:
+        ValueError: If the unit is not recognized
+
+    Returns:
+        int|None: Size in bytes, None if `value` is empty
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().lower().replace(' ', '')
+    number = text.rstrip('abcdefghijklmnopqrstuvwxyz')
+    unit = text[len(number):]
+    if unit not in _SIZE_UNITS or not number:
+        raise ValueError(f'Invalid size {value!r}')
+    return int(float(number) * _SIZE_UNITS[unit])
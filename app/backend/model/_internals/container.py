@@ -1,18 +1,40 @@
 import os
+import json
 import asyncio
 import time
 import pathlib
 from pathlib import Path
 import re
+import shlex
 import httpx
 from typing import TypedDict
 
 from logger import get_logger
-from .config import load_config
-from exceptions import ContainerUnhealthyError, ContainerError, ModelNotFound, ContainerNotFound, ModelFileError, ContainerExitedEarly
+from .config import load_config, parse_size
+from .admission import AdmissionQueue, QueueStats
+from .inflight import InFlightStats, RequestTracker, TrackedRequest
+from .eviction import EvictionEngine, get_policy, estimate_gguf_memory, measure_process_memory
+from .gguf import GgufIndex, GgufInfo, estimate_model_memory, shard_paths
+from .park import ModelParking
+from .predictor import DemandPredictor, plan_prefetch
+from .coordination import StateBackend, make_state_backend, stop_orphans
+from .fairness import FairShare, FairTurn, TenantPolicy
+from .fallback import ModelFallback, ModelGroup
+from .reload import ConfigWatcher, diff_config, validate_config
+from .embedding_cache import EmbeddingCache
+from .batcher import EmbeddingBatcher
+from .response_cache import ResponseCache
+from .affinity import AffinityTable, prefix_fingerprints
+from .supervisor import ProcessWatch, RestartBackoff, READY_PATTERN
+from .metrics import RouterMetrics
+from .telemetry import GpuTelemetry, make_gpu_backend
+from .replica import Replica, ReplicaLease, ReplicaPool, replica_bounds, resolve_ports
+from exceptions import BaseError, ContainerUnhealthyError, ContainerError, ModelNotFound, ContainerNotFound, ModelFileError, ContainerExitedEarly, ModelQueueTimeout, RateLimited, InvalidConfig
 
 config_yaml_path = os.getenv('CONFIG_PATH', '/app')
 model_dir_path = os.getenv('MODEL_PATH', '/app/models')
+# files the router writes for itself, the model directory is often mounted read-only
+state_dir_path = os.getenv('STATE_PATH', config_yaml_path)
 model_config = load_config(path_file=os.path.join(config_yaml_path, 'config.yaml'))
 
 class ServerStatus(TypedDict):
@@ -28,28 +50,106 @@ class ContainerManager:
     def __init__(self):
         self._last_request_time:dict[str, float] = {}
         self._server_status:dict[str, ServerStatus] = {}
-        self._server_proc:dict[str, asyncio.subprocess.Process] = {}
-        self._validated_file_path:dict[str, bool] = {}
+        self._pools:dict[str, ReplicaPool] = {}
         self._locks:dict[str, asyncio.Lock] = {}
+        self._starting:dict[str, asyncio.Task] = {}
+        self._queues:dict[str, AdmissionQueue] = {}
+        self._start_duration:dict[str, float] = {}
+        self.requests = RequestTracker()
+        # requests served by a member of a fallback group in place of the requested model, substituted or hedged
+        self.lent_requests = RequestTracker()
+        self.gguf_index = self._make_gguf_index()
+        self._eviction = EvictionEngine(
+            budget=parse_size(model_config['server'].get('memory_budget')),
+            policy=get_policy(model_config['server'].get('eviction_policy', 'lru')),
+            estimator=self._estimate_memory
+        )
+        self._eviction_lock = asyncio.Lock()
+        self.embedding_cache = self._make_embedding_cache()
+        self.embedding_batcher = self._make_embedding_batcher()
+        self.response_cache = self._make_response_cache()
+        self.affinity = self._make_affinity_table()
+        self.fairness = self._make_fairness()
+        self.fallback = self._make_fallback()
+        self._backoff:dict[str, RestartBackoff] = {}
+        self._crashed:set[str] = set()
+        # restarts of crashed replicas still waiting for their backoff, cancelled when the model is detached by a reload
+        self._restarts:dict[str, set[asyncio.Task]] = {}
+        self.metrics = RouterMetrics()
+        self.gpu_telemetry = self._make_gpu_telemetry()
+        self.parking = self._make_parking()
+        self.predictor = self._make_predictor()
+        self._keep_warm:set[str] = set()
+        self._prefetch_task:asyncio.Task|None = None
+        self._start_errors:dict[str, tuple[float, str]] = {}
+        self._model_index = {model_name: i for i, model_name in enumerate(model_config['models'])}
+        self.state = self._make_state_backend()
+        self._state_task:asyncio.Task|None = None
+        # set once a new leader has cleaned up after the previous one
+        self._leading = False
+        self._start_requests_seen:dict[tuple[int, int], int] = {}
+        self._published_view:dict|None = None
+        self._applied_view:dict|None = None
+        self.config_watcher = ConfigWatcher(os.path.join(config_yaml_path, 'config.yaml'))
+        self._reload_lock = asyncio.Lock()
+        self._config_version = 1
+        self._config_loaded_at = time.time()
+        self._last_diff:dict|None = None
+        # models removed from the config that still drain, and the models whose servers wait to be rolled or removed
+        self._retiring:set[str] = set()
+        self._pending_rolls:dict[str, str] = {}
+        self._rolling:str|None = None
+        self._roll_task:asyncio.Task|None = None
+        self._roll_errors:dict[str, str] = {}
 
     def _validate_gguf_file(self, path_str:str):
-        if path_str in self._validated_file_path:
-            return True
-        
         path = Path(path_str)
         if not (path.exists() and path.is_file() and path.suffix == '.gguf'):
             return False
         
         pat = re.compile(r'(\d+)-of-(\d+)\.gguf$', re.IGNORECASE)
         if match := pat.search(path_str):
-            is_valid_shard = 1 == int(match.group(1))
-            if is_valid_shard:
-                self._validated_file_path[path_str] = is_valid_shard
-            return is_valid_shard
+            if 1 != int(match.group(1)):
+                return False
 
-        self._validated_file_path[path_str] = True
-             
+        # a readable header and every shard present, unchanged files are answered from the index
+        info = self.gguf_index.get(path_str)
+        if info is None:
+            return False
+        if not info['complete']:
+            logger.warning(f'Model file {path_str} is missing shards, expected {info["split_count"]}')
+            return False
         return True
+
+    def _make_gguf_index(self) -> GgufIndex:
+        index_path = model_config['server'].get('gguf_index_path', os.path.join(state_dir_path, '.gguf-index.json'))
+        return GgufIndex(index_path or None)
+
+    def index_models(self) -> int:
+        """Index the GGUF metadata of every model file under `MODEL_PATH`. Blocking, run it off the event loop.
+
+        Returns:
+            int: Number of files whose header had to be read, files unchanged since the last run are skipped
+        """
+        start = time.perf_counter()
+        parsed = self.gguf_index.scan(model_dir_path)
+        logger.info(f'Indexed GGUF files in {model_dir_path} in {time.perf_counter() - start:.3f}s, {parsed} header(s) read')
+        return parsed
+
+    def model_info(self, model_name:str) -> GgufInfo|None:
+        """GGUF metadata of a configured model as last indexed, None if its file is missing, unreadable or not
+        indexed yet. Answered from memory, so it is safe on the event loop.
+        """
+        return self.gguf_index.cached(self._resolve_model_path(model_name))
+
+    def context_size(self, model_name:str) -> int:
+        """Context size the model server runs with, from `--ctx-size`/`-c`. 0 means the trained context of the model."""
+        flags = self._split_flag(model_config['models'][model_name].get('config') or [])
+        ctx_size = int(flags.get('--ctx-size') or flags.get('-c') or 4096) # llama.cpp default context is 4096
+        if ctx_size == 0:
+            info = self.model_info(model_name)
+            ctx_size = (info and info['context_length']) or 4096
+        return ctx_size
     
     def _split_flag(self, flags:list[str]) -> dict:
         flag_dict = {}
@@ -62,19 +162,1087 @@ class ContainerManager:
                 flag_dict[tmp_flag] = flag
         return flag_dict
     
+    def _resolve_model_path(self, model_name:str) -> str:
+        config = model_config['models'][model_name]
+        return str(pathlib.Path(os.path.join(model_dir_path, config['model_path'])).expanduser().resolve())
+
+    def _estimate_memory(self, model_name:str) -> int:
+        config = model_config['models'][model_name]
+        min_replicas, _ = replica_bounds(config)
+        hint = parse_size(config.get('memory'))
+        if hint is None:
+            info = self.model_info(model_name)
+            if info is not None and info['complete']:
+                hint = estimate_model_memory(info, self.context_size(model_name))
+            else:
+                hint = estimate_gguf_memory(self._resolve_model_path(model_name))
+        return hint * min_replicas
+
+    def _make_embedding_cache(self) -> EmbeddingCache|None:
+        cache_config = model_config['server'].get('embedding_cache')
+        if not cache_config:
+            return None
+        if cache_config is True:
+            cache_config = {}
+        cache = EmbeddingCache(
+            max_bytes=parse_size(cache_config.get('max_bytes', '256MB')),
+            disk_path=cache_config.get('disk_path'),
+            disk_max_entries=int(cache_config.get('disk_max_entries', 100_000))
+        )
+        cache.load_disk()
+        return cache
+
+    def _make_embedding_batcher(self) -> EmbeddingBatcher|None:
+        batching_config = model_config['server'].get('embedding_batching')
+        if not batching_config:
+            return None
+        if batching_config is True:
+            batching_config = {}
+        return EmbeddingBatcher(
+            send=lambda model_name, body: self.post_json(model_name, '/v1/embeddings', body),
+            max_batch=int(batching_config.get('max_batch', 32)),
+            max_wait=float(batching_config.get('max_wait_ms', 5)) / 1000
+        )
+
+    def _make_response_cache(self) -> ResponseCache|None:
+        cache_config = model_config['server'].get('response_cache')
+        if not cache_config:
+            return None
+        if cache_config is True:
+            cache_config = {}
+        return ResponseCache(
+            max_bytes=parse_size(cache_config.get('max_bytes', '64MB')),
+            ttl=float(cache_config.get('ttl', 600))
+        )
+
+    def _make_affinity_table(self) -> AffinityTable|None:
+        affinity_config = model_config['server'].get('session_affinity')
+        if not affinity_config:
+            return None
+        if affinity_config is True:
+            affinity_config = {}
+        return AffinityTable(max_entries=int(affinity_config.get('max_entries', 10_000)))
+
+    def _make_fairness(self) -> FairShare|None:
+        fairness_config = model_config['server'].get('fair_scheduling')
+        if not fairness_config:
+            return None
+        if fairness_config is True:
+            fairness_config = {}
+        tenants = {}
+        for name, tenant_config in (fairness_config.get('tenants') or {}).items():
+            policy = TenantPolicy.from_config(name, tenant_config)
+            for key in tenant_config.get('keys') or []:
+                tenants[str(key)] = policy
+        return FairShare(
+            tenants,
+            default=TenantPolicy.from_config('default', fairness_config.get('default') or {}),
+            capacity=self._model_capacity,
+            header=fairness_config.get('tenant_header', 'Authorization'),
+            max_waiting=int(fairness_config.get('max_waiting', 256)),
+            timeout=float(fairness_config.get('queue_timeout', model_config['server'].get('queue_timeout', 120))),
+            default_max_tokens=int(fairness_config.get('default_max_tokens', 256))
+        )
+
+    def _model_capacity(self, model_name:str) -> int:
+        """Requests the servers of a model take at once: `max_concurrency`, or the `--parallel` slots of every ready
+        replica less the requests other router workers have in flight on them
+        """
+        config = model_config['models'][model_name]
+        if 'max_concurrency' in config:
+            return int(config['max_concurrency'])
+        pool = self._pools.get(model_name)
+        if pool is None:
+            return 0
+        return max(0, sum(len(replica.slot_in_flight) - replica.remote_in_flight for replica in pool.ready()))
+
+    def tenant_of(self, headers) -> str|None:
+        """Tenant of a request from its headers, None when fair scheduling is disabled"""
+        if self.fairness is None:
+            return None
+        return self.fairness.tenant_name(headers.get(self.fairness.header))
+
+    def check_rate_limit(self, tenant:str|None, tokens:int):
+        """Charge a request to the rate limits of its tenant
+
+        Raises:
+            RateLimited: If the tenant is over its request or token rate
+        """
+        if self.fairness is None or tenant is None:
+            return
+        try:
+            self.fairness.check(tenant, tokens)
+        except RateLimited:
+            self.metrics.rate_limited.inc(tenant)
+            raise
+
+    async def fair_turn(self, model_name:str, tenant:str|None, tokens:int) -> FairTurn:
+        """Wait until the fair queue of the model hands this request a free server slot
+
+        Raises:
+            ModelBusy: If too many requests wait for the model or the turn did not come within the queue timeout
+
+        Returns:
+            FairTurn: Must be released when the request is done, a no-op when fair scheduling is disabled
+        """
+        if self.fairness is None or tenant is None:
+            return FairTurn(None)
+        start = time.perf_counter()
+        turn = await self.fairness.acquire(model_name, tenant, tokens)
+        self.metrics.fair_wait.observe(model_name, time.perf_counter() - start)
+        return turn
+
+    def _dispatch_waiting(self, model_name:str):
+        if self.fairness is not None:
+            self.fairness.dispatch(model_name)
+
+    def _make_fallback(self) -> ModelFallback|None:
+        fallback_config = model_config['server'].get('fallback')
+        if not fallback_config:
+            return None
+        if fallback_config is True:
+            fallback_config = {}
+        groups = [ModelGroup.from_config(group_config) for group_config in fallback_config.get('groups') or []]
+        for group in groups:
+            unknown = [model_name for model_name in group.models if model_name not in model_config['models']]
+            if unknown:
+                logger.warning(f'Fallback group {group.models} lists unknown model(s) {unknown}, they are skipped until added')
+        hedge_config = fallback_config.get('hedge')
+        if hedge_config is True:
+            hedge_config = {}
+        return ModelFallback(
+            groups,
+            slo=float(fallback_config.get('slo', 2)),
+            tag_header=fallback_config.get('tag_header', 'X-Request-Tags'),
+            hedge_quantile=float(hedge_config.get('quantile', 0.95)) if isinstance(hedge_config, dict) else None,
+            min_samples=int(hedge_config.get('min_samples', 20)) if isinstance(hedge_config, dict) else 20,
+            window=int(hedge_config.get('window', 200)) if isinstance(hedge_config, dict) else 200
+        )
+
+    def expected_wait(self, model_name:str) -> float|None:
+        """Seconds a request would wait for the model to be ready, its last cold start time and None if it never started"""
+        if self.is_running(model_name):
+            return 0.0
+        return self._start_duration.get(model_name)
+
+    def _warm_members(self, model_name:str, headers) -> list[str]:
+        policy = self.fallback
+        members = [
+            member for member in policy.members(model_name, policy.tags_of(headers))
+            if self.is_running(member) and member not in self._retiring
+        ]
+        # members with a free server slot first, in group order otherwise
+        return sorted(members, key=lambda member: self.requests.in_flight(member) >= self._model_capacity(member))
+
+    def substitute(self, model_name:str, headers) -> str:
+        """Model that serves a request for `model_name`, the model itself unless `server.fallback` is enabled and it
+        would wait longer than the SLO for a cold start while a member of its group is warm. The requested model is
+        then started in the background for the requests that follow.
+
+        Args:
+            model_name (str): Requested model
+            headers (Headers): Request headers, carrying the request tags
+
+        Returns:
+            str: Name of the model to send the request to
+        """
+        policy = self.fallback
+        if (policy is None or self.is_running(model_name) or model_name not in model_config['models']
+                or model_name in self._retiring or not policy.should_substitute(self.expected_wait(model_name))):
+            return model_name
+        members = self._warm_members(model_name, headers)
+        if not members:
+            return model_name
+        member = members[0]
+        policy.record_substitute(model_name)
+        self.metrics.substitutions.inc(model_name)
+        # the member must not be evicted by the start it stands in for, a model that only fits without it is not started
+        if self._eviction.fits(model_name, protected={*self._starting, *self.lent_requests.active(), member}):
+            self._start_once(model_name, protected=(member,))
+            logger.info(f'Serving a request for cold model {model_name} with {member} while it starts')
+        else:
+            logger.info(f'Serving a request for cold model {model_name} with {member}, it only fits in the memory budget without {member}')
+        return member
+
+    def lend_request(self, model_name:str, requested:str) -> TrackedRequest:
+        """Count a request sent to `model_name` for another model of its group, a model serving such requests is
+        never evicted. Released like `track_request`, nothing is counted when `model_name` is the requested model.
+        """
+        return self.lent_requests.begin(model_name if model_name != requested else None)
+
+    def hedge_plan(self, model_name:str, headers, body:dict) -> tuple[str, float]|None:
+        """Where and when to hedge a request to a warm model, a second member of its group and the delay after which
+        it is sent there too. None when hedging is disabled, the model has too few latencies yet or no member is warm.
+        """
+        policy = self.fallback
+        if policy is None or not policy.hedging:
+            return None
+        delay = policy.hedge_delay(model_name, bool(body.get('stream')))
+        if delay is None:
+            return None
+        members = self._warm_members(model_name, headers)
+        return (members[0], delay) if members else None
+
+    def record_first_chunk(self, model_name:str, body:dict|None, seconds:float):
+        """Remember the time to the first chunk of a request, the hedging delay of the model is a quantile of it"""
+        if self.fallback is not None and body is not None:
+            self.fallback.observe(model_name, bool(body.get('stream')), seconds)
+
+    def record_hedge(self, model_name:str, won:bool):
+        self.metrics.hedges.inc(model_name)
+        self.fallback.record_hedge(model_name, won)
+
+    def fallback_stats(self) -> dict|None:
+        """Equivalence groups, hedging delays and substitution counters, None when fallback is disabled"""
+        return self.fallback.stats() if self.fallback is not None else None
+
+    @property
+    def session_header(self) -> str:
+        affinity_config = model_config['server'].get('session_affinity')
+        if isinstance(affinity_config, dict):
+            return affinity_config.get('session_header', 'X-Session-ID')
+        return 'X-Session-ID'
+
+    def _make_gpu_telemetry(self) -> GpuTelemetry:
+        telemetry_config = model_config['server'].get('gpu_telemetry') or {}
+        backend = make_gpu_backend(
+            telemetry_config.get('backend', 'nvml'),
+            fake_devices=int(telemetry_config.get('fake_devices', 1)),
+            fake_memory=parse_size(telemetry_config.get('fake_memory', '24GB'))
+        )
+        return GpuTelemetry(
+            backend,
+            interval=float(telemetry_config.get('interval', 2)),
+            history=int(telemetry_config.get('history', 60))
+        )
+
+    def _make_parking(self) -> ModelParking|None:
+        park_config = model_config['server'].get('park')
+        if not park_config:
+            return None
+        if park_config is True:
+            park_config = {}
+        return ModelParking(
+            max_bytes=parse_size(park_config.get('max_bytes')),
+            refresh_interval=float(park_config.get('refresh_interval', 300)),
+            method=park_config.get('method', 'read')
+        )
+
+    def _make_predictor(self) -> DemandPredictor|None:
+        prefetch_config = model_config['server'].get('predictive_prefetch')
+        if not prefetch_config:
+            return None
+        if prefetch_config is True:
+            prefetch_config = {}
+        predictor = DemandPredictor(
+            window=float(prefetch_config.get('window', 120)),
+            ewma_alpha=float(prefetch_config.get('ewma_alpha', 0.2))
+        )
+        state_path = prefetch_config.get('state_path', os.path.join(state_dir_path, '.prefetch-state.json'))
+        if state_path:
+            predictor.load(state_path)
+        return predictor
+
+    def _make_state_backend(self) -> StateBackend|None:
+        coordination_config = model_config['server'].get('coordination')
+        if not coordination_config:
+            return None
+        if coordination_config is True:
+            coordination_config = {}
+        return make_state_backend(
+            coordination_config.get('backend', 'local'),
+            list(model_config['models']),
+            path=coordination_config.get('path'),
+            max_workers=coordination_config.get('max_workers', 64),
+            max_replicas=coordination_config.get('max_replicas', 16)
+        )
+
+    @property
+    def owns_processes(self) -> bool:
+        """Whether this router starts and stops the model servers itself, False for a follower worker that routes from the leader's view"""
+        return self.state is None or self._leading
+
+    async def start_coordination(self):
+        """Join the router workers sharing `server.coordination` state: become the leader if no other worker is, and keep
+        syncing readiness, load and last request times every `coordination.sync_interval` seconds
+        """
+        if self.state is None:
+            return
+        if self.state.try_lead():
+            await self._take_over()
+        else:
+            self._apply_view(self.state.view())
+        logger.info(f'Joined router coordination as worker {self.state.stats()["worker"]}, {"leader" if self.state.is_leader else "follower"}')
+        self._state_task = asyncio.create_task(self._sync_state())
+
+    async def _take_over(self):
+        """Become the owner of the model servers. Servers of a previous leader that died can't be supervised from
+        here, they are killed and started again on demand.
+        """
+        # nothing is routed to the previous leader's servers from here on
+        for pool in self._pools.values():
+            for replica in pool.replicas:
+                replica.ready = False
+        for status in self._server_status.values():
+            status['status'] = False
+        view = self.state.view() or {}
+        orphans = {
+            pid: self._resolve_model_path(model_name)
+            for model_name, entry in view.get('models', {}).items() if model_name in model_config['models']
+            for pid in entry.get('pids', [])
+        }
+        if orphans:
+            killed = await asyncio.to_thread(stop_orphans, orphans)
+            logger.warning(f'Took over as leader, stopped {killed} model server(s) left by the previous leader')
+        self._leading = True
+        self._publish_view()
+
+    def _model_view(self) -> dict:
+        models = {}
+        for model_name, pool in self._pools.items():
+            models[model_name] = {
+                'status': self.is_running(model_name),
+                'ready': [replica.index for replica in pool.ready()],
+                'pids': [replica.proc.pid for replica in pool.replicas if replica.proc is not None]
+            }
+        for model_name, (failed_at, error) in self._start_errors.items():
+            models.setdefault(model_name, {'status': False, 'ready': [], 'pids': []}).update(failed_at=failed_at, error=error)
+        return {'leader_pid': os.getpid(), 'models': models}
+
+    def _publish_view(self):
+        view = self._model_view()
+        if view != self._published_view:
+            self.state.publish(view)
+            self._published_view = view
+
+    def _apply_view(self, view:dict|None):
+        """Follower: take model readiness from the leader's view"""
+        if view is None or view is self._applied_view:
+            return
+        self._applied_view = view
+        models = view.get('models', {})
+        for model_name in self._model_index:
+            entry = models.get(model_name)
+            if entry is None and model_name not in self._pools:
+                continue
+            pool = self._get_pool(model_name)
+            ready = set(entry['ready']) if entry is not None else set()
+            for replica in pool.replicas:
+                replica.ready = replica.index in ready
+            self._dispatch_waiting(model_name)
+            status = entry is not None and entry['status']
+            if status or model_name in self._server_status:
+                self._server_status[model_name] = {
+                    'status': status,
+                    'config': self._split_flag(model_config['models'][model_name]['config'])
+                }
+
+    def _sync_once(self):
+        """Report this worker's load and last requests, take the other workers' load into the replica picks. The leader
+        also serves the start requests of the followers, scales on the load of every worker and publishes its view.
+        """
+        state = self.state
+        state.heartbeat()
+        for model_name, index in self._model_index.items():
+            pool = self._pools.get(model_name)
+            in_flight = [replica.in_flight for replica in pool.replicas] if pool is not None else []
+            state.report(index, self._last_request_time.get(model_name, 0.0), in_flight)
+
+        now = time.monotonic()
+        leader = self._leading
+        for (model_name, index), peer in zip(self._model_index.items(), state.peers()):
+            pool = self._pools.get(model_name)
+            if pool is not None:
+                for replica, load in zip(pool.replicas, peer.in_flight):
+                    replica.remote_in_flight = load
+                    if load:
+                        # busy on another worker, not idle
+                        replica.last_used = now
+                self._dispatch_waiting(model_name)
+            if not leader:
+                continue
+            if peer.last_request > self._last_request_time.get(model_name, 0.0):
+                self._last_request_time[model_name] = peer.last_request
+                self._eviction.record_request(model_name)
+            for row, count in peer.start_requests.items():
+                seen = self._start_requests_seen.get((row, index), 0)
+                if count != seen:
+                    self._start_requests_seen[(row, index)] = count
+                    # a lower count is a new worker in the row of a gone one
+                    if count > seen and not self.is_running(model_name):
+                        self._start_once(model_name)
+            if (pool is not None and self.is_running(model_name) and pool.max_replicas > pool.min_replicas
+                    and pool.wants_scale_up(self._scale_up_threshold(model_name))):
+                pool.scaling = True
+                asyncio.create_task(self.scale_up(model_name))
+        if leader:
+            self._publish_view()
+        else:
+            self._apply_view(state.view())
+
+    async def _sync_state(self):
+        interval = self.coordination_config.get('sync_interval', 0.05)
+        next_lead = 0.0
+        while True:
+            try:
+                self._sync_once()
+                # the leader lock is free again once the leader exits, the first follower to try takes over
+                if not self.state.is_leader and time.monotonic() >= next_lead:
+                    next_lead = time.monotonic() + 1.0
+                    if self.state.try_lead():
+                        await self._take_over()
+            except Exception as e:
+                logger.error(f'Router coordination round failed: {e}')
+            await asyncio.sleep(interval)
+
+    @property
+    def coordination_config(self) -> dict:
+        coordination_config = model_config['server'].get('coordination')
+        return coordination_config if isinstance(coordination_config, dict) else {}
+
+    async def _wait_for_leader(self, model_name:str) -> bool:
+        """Follower cold start: ask the leader to start the model and wait until its view shows it ready"""
+        requested_at = time.time()
+        self.state.request_start(self._model_index[model_name])
+        interval = self.coordination_config.get('sync_interval', 0.05)
+        while not self.is_running(model_name):
+            if self.owns_processes:
+                # the leader died in the meantime and this worker took over
+                return await self._timed_start(model_name)
+            entry = ((self.state.view() or {}).get('models') or {}).get(model_name) or {}
+            if entry.get('failed_at', 0.0) >= requested_at:
+                logger.error(f'Leader could not start model {model_name}: {entry.get("error")}')
+                raise ContainerError(model_name)
+            await asyncio.sleep(interval)
+        return True
+
+    def coordination_stats(self) -> dict|None:
+        """Leadership and live workers of the shared router state, None when coordination is disabled"""
+        return self.state.stats() if self.state is not None else None
+
+    @property
+    def config_reload_config(self) -> dict:
+        reload_config = model_config['server'].get('config_reload')
+        return reload_config if isinstance(reload_config, dict) else {}
+
+    async def reload_config(self, new_config:dict|None=None) -> dict:
+        """Load a new config without restarting the models it leaves unchanged.
+
+        The new config replaces the running one at once: new models are routable right away and changes that don't
+        touch the server process apply in place. The servers of models whose flags, file, ports or replica counts
+        changed are rolled one model at a time in the background: drained, stopped and started again if they were
+        running. Removed models stop taking requests at once, drain and stop.
+
+        Args:
+            new_config (dict | None, optional): Config to load. Defaults to reading `config.yaml` again.
+
+        Raises:
+            InvalidConfig: If the config can't be read or is malformed, the running config is kept
+
+        Returns:
+            dict: New config version and the models and server keys by kind of change
+        """
+        async with self._reload_lock:
+            try:
+                if new_config is None:
+                    new_config = await asyncio.to_thread(self.config_watcher.read)
+                validate_config(new_config)
+            except ValueError as e:
+                raise InvalidConfig(str(e))
+            diff = diff_config(model_config, new_config)
+            if self.state is not None and (diff['added'] or diff['removed']):
+                # the shared state is laid out for a fixed set of models
+                raise InvalidConfig('models can only be added or removed by restarting every router worker that shares the state')
+            new_models = new_config['models']
+            for model_name in diff['restarted']:
+                # a broken file would leave the model down after its roll
+                model_path = str(pathlib.Path(os.path.join(model_dir_path, new_models[model_name]['model_path'])).expanduser().resolve())
+                if not await asyncio.to_thread(self._validate_gguf_file, model_path):
+                    raise InvalidConfig(f'model file {model_path} of model {model_name} is missing or invalid')
+
+            server_config = model_config['server']
+            server_config.clear()
+            server_config.update(new_config['server'])
+            self._eviction.budget = parse_size(server_config.get('memory_budget'))
+            self._eviction.policy = get_policy(server_config.get('eviction_policy', 'lru'))
+            models = model_config['models']
+            for model_name, config in new_models.items():
+                models[model_name] = config
+                if model_name in self._retiring:
+                    # added back before its removal ran, a removal that already stopped it leaves it to start on demand
+                    self._retiring.discard(model_name)
+                    if self._pending_rolls.get(model_name) == 'remove':
+                        del self._pending_rolls[model_name]
+                self._refresh_model(model_name)
+                if model_name in diff['updated'] and not self.is_running(model_name):
+                    # the memory hint may have changed, estimate the next start again
+                    self._eviction.resize(model_name, 0)
+            for model_name in diff['restarted']:
+                self._pending_rolls[model_name] = 'roll'
+            for model_name in diff['removed']:
+                self._retiring.add(model_name)
+                self._pending_rolls[model_name] = 'remove'
+
+            self._config_version += 1
+            self._config_loaded_at = time.time()
+            self._last_diff = diff
+            logger.info(
+                f'Loaded config version {self._config_version}: added {diff["added"]}, removed {diff["removed"]}, '
+                f'restarting {diff["restarted"]}, updated {diff["updated"]}, server settings {diff["server"]}'
+            )
+            if diff['startup_only']:
+                logger.warning(f'Server settings {diff["startup_only"]} changed, they take effect when the router restarts')
+            if self._pending_rolls and (self._roll_task is None or self._roll_task.done()):
+                self._roll_task = asyncio.create_task(self._roll_pending())
+            return {'version': self._config_version, **diff}
+
+    def _refresh_model(self, model_name:str):
+        """Apply the settings of a model that are read once, when its queue or restart backoff is created"""
+        queue = self._queues.get(model_name)
+        if queue is not None:
+            queue.max_queued, queue.timeout = self._queue_settings(model_name)
+        self._backoff.pop(model_name, None)
+
+    async def _roll_pending(self):
+        """Apply the pending model restarts and removals one model at a time, so a reload takes at most one model
+        down at once
+        """
+        while self._pending_rolls:
+            model_name = next(iter(self._pending_rolls))
+            action = self._pending_rolls.pop(model_name)
+            self._rolling = model_name
+            try:
+                if action == 'remove':
+                    await self._remove_model(model_name)
+                else:
+                    await self._roll_model(model_name)
+                self._roll_errors.pop(model_name, None)
+            except Exception as e:
+                logger.error(f'Could not apply the new config of model {model_name}: {e}')
+                self._roll_errors[model_name] = str(e)
+            finally:
+                self._rolling = None
+
+    async def wait_for_rolls(self):
+        """Wait until every pending model restart and removal of the reloads so far is applied"""
+        while self._roll_task is not None and not self._roll_task.done():
+            await asyncio.shield(self._roll_task)
+
+    async def _settle_start(self, model_name:str):
+        task = self._starting.get(model_name)
+        if task is not None:
+            # the outcome is handled by `_start_done`
+            await asyncio.wait([task])
+
+    async def _drain(self, model_name:str, timeout:float) -> int:
+        """Wait until no request is in flight on a model, counting the ones still waiting for a fair queue turn
+
+        Args:
+            model_name (str): Model name based on the config.
+            timeout (float): Maximum time to wait in seconds
+
+        Returns:
+            int: Requests still in flight when `timeout` ran out
+        """
+        deadline = time.monotonic() + timeout
+        left = await self.requests.wait_idle(model_name, timeout)
+        pool = self._pools.get(model_name)
+        # leases taken outside the proxy path and, with coordination, the requests of the other workers
+        while pool is not None and pool.load() and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return max(left, pool.load() if pool is not None else 0)
+
+    async def _drain_and_detach(self, model_name:str):
+        """Take a model out of rotation, drain it and stop its servers. The pool is dropped, so the next start builds
+        it from the current config.
+        """
+        status = self._server_status.get(model_name)
+        if status is not None:
+            status['status'] = False
+        timeout = float(self.config_reload_config.get('drain_timeout', self.drain_timeout))
+        left = await self._drain(model_name, timeout)
+        if left:
+            logger.warning(f'{left} request(s) still in flight on model {model_name} after {timeout:.0f}s, stopping it anyway')
+        if model_name not in self._locks:
+            self._locks[model_name] = asyncio.Lock()
+        async with self._locks[model_name]:
+            pool = self._pools.pop(model_name, None)
+            self._eviction.record_stop(model_name)
+            # a pending restart would bring back a replica of the old pool, the replicas it is spawning are stopped below
+            self._crashed.discard(model_name)
+            for task in self._restarts.pop(model_name, ()):
+                task.cancel()
+            if pool is None:
+                return
+            await asyncio.gather(*(
+                self._stop_replica(model_name, replica) for replica in pool.replicas
+                if replica.ready or replica.proc is not None
+            ))
+            for replica in pool.replicas:
+                await replica.aclose()
+
+    async def _roll_model(self, model_name:str):
+        """Replace the servers of one model with ones started from its new config. Requests arriving meanwhile wait
+        for the restart in the admission queue like on a cold start, the ones in flight drain first.
+        """
+        await self._settle_start(model_name)
+        restart = self.is_running(model_name) and self.owns_processes
+        logger.info(f'Applying the new config of model {model_name}{", restarting it" if restart else ""}')
+
+        async def replace() -> bool:
+            await self._drain_and_detach(model_name)
+            # the old flags may have needed a different amount of memory
+            self._eviction.resize(model_name, 0)
+            # a follower takes the readiness of the restarted model from the leader's next view
+            self._applied_view = None
+            if restart:
+                await self._timed_start(model_name)
+            return True
+
+        task = asyncio.create_task(replace())
+        if restart:
+            self._starting[model_name] = task
+            task.add_done_callback(lambda t: self._start_done(model_name, t))
+        await task
+
+    async def _remove_model(self, model_name:str):
+        """Drain and stop a model removed from the config, then forget it"""
+        await self._settle_start(model_name)
+        logger.info(f'Removing model {model_name}')
+        await self._drain_and_detach(model_name)
+        if model_name not in self._retiring:
+            # added back while it drained, it is started again on demand
+            return
+        self._retiring.discard(model_name)
+        del model_config['models'][model_name]
+        for state in (self._server_status, self._queues, self._backoff, self._start_duration, self._last_request_time, self._start_errors, self._locks):
+            state.pop(model_name, None)
+        self._crashed.discard(model_name)
+        self._keep_warm.discard(model_name)
+        self._eviction.forget(model_name)
+        self.requests.forget(model_name)
+        self.lent_requests.forget(model_name)
+        if self.parking is not None:
+            self.parking.unpark(model_name)
+
+    def config_stats(self) -> dict:
+        """Version and last changes of the loaded config, and the model restarts and removals still to apply"""
+        return {
+            'version': self._config_version,
+            'loaded_at': self._config_loaded_at,
+            'changes': self._last_diff,
+            'rolling': self._rolling,
+            'pending': list(self._pending_rolls),
+            'retiring': sorted(self._retiring),
+            'errors': dict(self._roll_errors)
+        }
+
+    @property
+    def prefetch_config(self) -> dict:
+        prefetch_config = model_config['server'].get('predictive_prefetch')
+        return prefetch_config if isinstance(prefetch_config, dict) else {}
+
+    def save_predictor(self):
+        state_path = self.prefetch_config.get('state_path', os.path.join(state_dir_path, '.prefetch-state.json'))
+        # the workers share the file, the leader's statistics are the ones that start models
+        if self.predictor is not None and state_path and self.owns_processes:
+            self.predictor.save(state_path)
+
+    def keep_warm(self, model_name:str) -> bool:
+        """Whether the prefetch scheduler expects a request for a running model soon, so it is not stopped as idle"""
+        return model_name in self._keep_warm
+
+    async def run_prefetch(self):
+        """One round of the prefetch scheduler: start, warm or keep models the request statistics expect to be used soon.
+
+        Models are only started when they fit in the memory budget without evicting anything.
+        """
+        if not self.owns_processes:
+            return
+        prefetch_config = self.prefetch_config
+        running = {model_name for model_name in model_config['models'] if self.is_running(model_name)} | set(self._starting)
+        plan = plan_prefetch(
+            self.predictor, model_config['models'], running,
+            horizon=float(prefetch_config.get('horizon', 60)),
+            start_threshold=float(prefetch_config.get('start_threshold', 0.7)),
+            warm_threshold=float(prefetch_config.get('warm_threshold', 0.3)),
+            keep_threshold=float(prefetch_config.get('keep_threshold', 0.5))
+        )
+        self._keep_warm = set(plan['keep'])
+        for model_name in plan['start']:
+            if model_name in self._starting or not self._eviction.fits(self._eviction.estimate(model_name)):
+                continue
+            logger.info(f'Starting model {model_name} ahead of demand')
+            self.metrics.prestarts.inc(model_name)
+            # give the model a full idle period to receive the request it was started for
+            self._last_request_time[model_name] = time.time()
+            self._start_once(model_name)
+        if self.parking is not None:
+            for model_name in plan['warm']:
+                if not self.parking.is_parked(model_name) and model_config['models'][model_name].get('park', True):
+                    self.parking.park(model_name, self.model_files(model_name))
+
+    def prefetch_stats(self) -> dict|None:
+        """Request statistics and demand scores of the prefetch scheduler, None when it is disabled"""
+        if self.predictor is None:
+            return None
+        stats = self.predictor.stats(horizon=float(self.prefetch_config.get('horizon', 60)))
+        stats['keep_warm'] = sorted(self._keep_warm)
+        return stats
+
+    def model_files(self, model_name:str) -> list[str]:
+        """Every file of a configured model, all shards for split models"""
+        return shard_paths(self._resolve_model_path(model_name))
+
+    async def prefetch(self, model_name:str) -> int:
+        """Warm the page cache with the files of a model that is likely to be started soon
+
+        Args:
+            model_name (str): Model name based on the config.
+
+        Returns:
+            int: Bytes warmed, 0 when parking is disabled
+        """
+        if self.parking is None or model_name not in model_config['models']:
+            return 0
+        return await self.parking.prefetch(self.model_files(model_name))
+
+    def model_identity(self, model_name:str) -> str:
+        """Identity of the model file backing `model_name`, changes whenever the file is replaced
+
+        Args:
+            model_name (str): Model name based on the config.
+
+        Returns:
+            str: Resolved path, size and modification time of the model file
+        """
+        model_path = self._resolve_model_path(model_name)
+        try:
+            stat = os.stat(model_path)
+        except OSError:
+            return model_path
+        return f'{model_path}:{stat.st_size}:{stat.st_mtime_ns}'
+
+    def _make_client(self, base_url:str) -> httpx.AsyncClient:
+        # long-lived client per replica, keeps a keep-alive connection pool so requests don't pay a new TCP connection each time
+        server_config = model_config['server']
+        max_conn = server_config.get('max_connections', 100)
+        return httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(server_config.get('upstream_timeout', 300.0), connect=5.0),
+            limits=httpx.Limits(max_connections=max_conn, max_keepalive_connections=max_conn)
+        )
+
+    def _get_pool(self, model_name:str) -> ReplicaPool:
+        pool = self._pools.get(model_name)
+        if pool is None:
+            config = model_config['models'][model_name]
+            min_replicas, max_replicas = replica_bounds(config)
+            pool = ReplicaPool(
+                model_name,
+                host=model_config['server']['host'],
+                ports=resolve_ports(config, max_replicas),
+                min_replicas=min_replicas,
+                max_replicas=max_replicas,
+                balancer=config.get('balancer', model_config['server'].get('balancer', 'least_outstanding')),
+                client_factory=self._make_client,
+                slots=self._parallel_slots(model_name)
+            )
+            self._pools[model_name] = pool
+        return pool
+
     async def pre_start(self):
+        """Warm up all configured models concurrently.
+
+        Models are started by descending `priority` with at most `server.pre_start_concurrency` loads in flight.
+        When `server.memory_budget` is set, a model whose estimated memory does not fit in what is left of the budget is skipped.
+        """
+        if not self.owns_processes:
+            logger.info('Not warming up models, the leader worker starts them')
+            return
         config_model = model_config['models']
-        logger.info(f'Starting all models. Found {len(config_model)} models')
-        for model_name in config_model:
-            _succ = await self.start_container(model_name)
-            if _succ:
-                continue
-            else:
-                asyncio.sleep(5)
-    
+        server_config = model_config['server']
+        concurrency = max(1, int(server_config.get('pre_start_concurrency', 2)))
+        budget = self._eviction.budget
+        logger.info(f'Starting all models. Found {len(config_model)} models, warming up {concurrency} at a time')
+
+        order = sorted(config_model, key=lambda name: -int(config_model[name].get('priority', 0)))
+        semaphore = asyncio.Semaphore(concurrency)
+        reserved = 0
+
+        async def warm_up(model_name:str):
+            async with semaphore:
+                start_time = time.perf_counter()
+                try:
+                    await self.start_container(model_name)
+                    logger.info(f'Model {model_name} warmed up in {time.perf_counter() - start_time:.2f}s')
+                except Exception as e:
+                    logger.error(f'Could not warm up model {model_name}: {e}')
+
+        tasks = []
+        for model_name in order:
+            if budget is not None:
+                need = self._eviction.estimate(model_name)
+                if reserved + need > budget:
+                    logger.warning(f'Skipping warm up for model {model_name}, estimated memory {need} exceeds remaining budget {budget - reserved}')
+                    continue
+                reserved += need
+            tasks.append(asyncio.create_task(warm_up(model_name)))
+        await asyncio.gather(*tasks)
+
+    async def _wait_until_healthy(self, model_name:str, replica:Replica, watch:ProcessWatch, timeout:float) -> bool:
+        """Wait until the model server prints its readiness line. `/health` is polled with exponential backoff
+        in between, for builds whose log output differs
+
+        Args:
+            model_name (str): Model name based on the config.
+            replica (Replica): Replica the process serves
+            watch (ProcessWatch): Watcher of the spawned server process
+            timeout (float): Maximum time to wait in seconds
+
+        Raises:
+            ContainerExitedEarly: If the process exits before becoming healthy
+
+        Returns:
+            bool: True if the server became healthy before `timeout`
+        """
+        server_config = model_config['server']
+        delay = float(server_config.get('health_poll_initial', 0.05))
+        max_delay = float(server_config.get('health_poll_max', 0.5))
+        http_client = replica.client
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if watch.exited.is_set():
+                logger.error(f'Server for model {model_name} exited while loading:\n{watch.last_output()}')
+                raise ContainerExitedEarly(ret_code=watch.proc.returncode, model_name=model_name)
+            if watch.ready.is_set():
+                return True
+            try:
+                response = await http_client.get('/health', timeout=5.0)
+                if response.status_code == 200:
+                    return True
+            except httpx.ConnectError as e:
+                logger.debug(f'Health check attempt - Connection failed: {e}')
+            except httpx.TimeoutException as e:
+                logger.warning(f'Health check attempt - Timeout: {e}')
+            except Exception as e:
+                logger.warning(f'Health check attempt - Unexpected error: {type(e).__name__}: {e}')
+            await watch.wait(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 1.5, max_delay)
+        return False
+
+    def _server_command(self, cwd:str|None) -> list[str]:
+        # `llama_server_command` replaces the binary, e.g. with the fake server of the benchmarks
+        command = model_config['server'].get('llama_server_command')
+        if not command:
+            return ['./llama-server' if cwd is not None else 'llama-server']
+        if isinstance(command, str):
+            return shlex.split(command)
+        return [str(part) for part in command]
+
+    async def _spawn_replica(self, model_name:str, replica:Replica, timeout:float):
+        """Spawn one llama-server process for `replica` and wait until it is healthy
+
+        Raises:
+            ContainerUnhealthyError: When the server could not pass the health check within `timeout`
+            ContainerExitedEarly: When the server process exits before it is ready
+            ContainerError: When spawning the server encountered an error
+        """
+        cwd = model_config['server']['llama_server_path']
+        host = model_config['server']['host']
+        model_path = self._resolve_model_path(model_name)
+        flag_config = model_config['models'][model_name]['config']
+        cmd = [*self._server_command(cwd), '-m', str(model_path),'--host', str(host), '--port', str(replica.port), *flag_config]
+        logger.info(f'Printing executed cmd {cmd}')
+        proc = None
+        spawn_time = time.perf_counter()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                cwd=cwd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+            replica.proc = proc
+            server_config = model_config['server']
+            replica.watch = ProcessWatch(
+                f'{model_name}:{replica.port}', proc,
+                on_exit=lambda code: self._on_replica_exit(model_name, replica, proc, code),
+                ready_pattern=model_config['models'][model_name].get('ready_pattern', server_config.get('ready_pattern', READY_PATTERN)),
+                log_output=bool(server_config.get('log_model_output', False))
+            )
+
+            if not await self._wait_until_healthy(model_name, replica, replica.watch, timeout):
+                raise ContainerUnhealthyError(model_name)
+            replica.ready = True
+            replica.last_used = time.monotonic()
+            self._dispatch_waiting(model_name)
+            self.metrics.cold_start.observe(model_name, time.perf_counter() - spawn_time)
+            self.metrics.starts.inc(model_name)
+        except Exception as e:
+            replica.proc = None
+            if proc is not None and proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+            await replica.aclose()
+            if isinstance(e, BaseError):
+                raise
+            raise ContainerError(model_name)
+
+    def _on_replica_exit(self, model_name:str, replica:Replica, proc:asyncio.subprocess.Process, code:int):
+        """Exit callback of every server process. Stops and failed starts clear `replica.ready` before the process
+        exits, so an exit of a ready replica is a crash. The state is updated without awaiting, so no request
+        can see a half updated pool.
+        """
+        if replica.proc is not proc or not replica.ready:
+            return
+        replica.ready = False
+        replica.proc = None
+        self.metrics.crashes.inc(model_name)
+        logger.error(f'Server for model {model_name} on port {replica.port} exited unexpectedly with code {code}:\n{replica.watch.last_output()}')
+        pool = self._pools[model_name]
+        if not pool.ready():
+            self._server_status[model_name]['status'] = False
+            self._eviction.record_stop(model_name)
+            self._crashed.add(model_name)
+        if model_config['models'][model_name].get('restart_on_crash', model_config['server'].get('restart_on_crash', True)):
+            task = asyncio.create_task(self._restart(model_name, replica, uptime=time.monotonic() - replica.watch.started_at))
+            restarts = self._restarts.setdefault(model_name, set())
+            restarts.add(task)
+            task.add_done_callback(restarts.discard)
+
+    def _get_backoff(self, model_name:str) -> RestartBackoff:
+        backoff = self._backoff.get(model_name)
+        if backoff is None:
+            server_config = model_config['server']
+            backoff = self._backoff[model_name] = RestartBackoff(
+                initial=float(server_config.get('restart_backoff_initial', 1)),
+                maximum=float(server_config.get('restart_backoff_max', 30)),
+                reset_after=float(server_config.get('restart_reset_after', 60)),
+                max_attempts=int(server_config.get('restart_max_attempts', 5))
+            )
+        return backoff
+
+    async def _restart(self, model_name:str, replica:Replica, uptime:float):
+        """Bring a crashed replica back after the model's backoff delay. If it was the last ready replica the whole
+        model is cold started again, unless it was stopped on purpose in the meantime
+
+        Args:
+            model_name (str): Model name based on the config.
+            replica (Replica): Crashed replica
+            uptime (float): Seconds the crashed process had been running
+        """
+        await replica.aclose()
+        backoff = self._get_backoff(model_name)
+        while True:
+            delay = backoff.next_delay(uptime)
+            if delay is None:
+                logger.error(f'Giving up restarting model {model_name}, it crashed again after {backoff.max_attempts} restarts')
+                self._crashed.discard(model_name)
+                return
+            logger.info(f'Restarting model {model_name} on port {replica.port} in {delay:.1f}s')
+            await asyncio.sleep(delay)
+            uptime = 0.0
+            pool = self._pools.get(model_name)
+            if pool is None or replica not in pool.replicas:
+                # detached by a config reload meanwhile, the replica belongs to a pool that is gone
+                return
+            try:
+                if model_name in self._crashed:
+                    if self.is_running(model_name):
+                        # a request already cold started it again
+                        self._crashed.discard(model_name)
+                        return
+                    # shielded, cancelling the restart must not cancel a start other requests wait for
+                    await asyncio.shield(self._start_once(model_name))
+                    self._crashed.discard(model_name)
+                elif self.is_running(model_name) and replica.proc is None and len(pool.ready()) < pool.min_replicas:
+                    await self._spawn_replica(model_name, replica, timeout=120)
+                else:
+                    # stopped on purpose, or an autoscaled replica the pool can do without
+                    return
+                self.metrics.restarts.inc(model_name)
+                return
+            except Exception as e:
+                logger.warning(f'Restart of model {model_name} failed: {e}')
+                if model_name not in self._crashed and not self.is_running(model_name):
+                    return
+
+    @property
+    def drain_timeout(self) -> float:
+        """Seconds a stop waits for the requests in flight on the model to finish, `server.drain_timeout`"""
+        return float(model_config['server'].get('drain_timeout', 60))
+
+    @property
+    def eviction_drain_timeout(self) -> float:
+        """Seconds an evicted model drains, `server.eviction_drain_timeout`. A cold start waits for it, so it is
+        kept short and never above `drain_timeout`
+        """
+        return min(float(model_config['server'].get('eviction_drain_timeout', 5)), self.drain_timeout)
+
+    @property
+    def stop_timeout(self) -> float:
+        """Seconds a model server gets to exit after SIGTERM before it is killed, `server.stop_timeout`"""
+        return float(model_config['server'].get('stop_timeout', 15))
+
+    def track_request(self, model_name:str) -> TrackedRequest:
+        """Count a request to a ready model as in flight until its response is fully sent. Call it right after
+        `ensure_running` returns, so a stop that begins later waits for it, and release it on every exit path.
+        """
+        return self.requests.begin(model_name)
+
+    def idle_seconds(self, model_name:str) -> float:
+        """Seconds since a request to the model was last in flight, on this router or with coordination on another
+        worker. A long generation keeps the model busy until its last chunk is sent, not just when it arrives.
+        """
+        if self.requests.in_flight(model_name):
+            return 0.0
+        idle = time.time() - self._last_request_time.get(model_name, 0.0)
+        done = self.requests.idle_seconds(model_name)
+        if done is not None:
+            idle = min(idle, done)
+        pool = self._pools.get(model_name)
+        if pool is not None and pool.replicas:
+            if pool.load():
+                return 0.0
+            idle = min(idle, time.monotonic() - max(replica.last_used for replica in pool.replicas))
+        return idle
+
+    def in_flight_stats(self) -> dict[str, InFlightStats]:
+        """Requests in flight and seconds since the last one finished, for every model that had a request"""
+        return self.requests.stats()
+
+    async def _stop_replica(self, model_name:str, replica:Replica):
+        proc = replica.proc
+        replica.ready = False
+        try:
+            if proc is None or proc.returncode is not None:
+                return
+            self.metrics.stops.inc(model_name)
+            try:
+                logger.info(f'Terminating server for model {model_name} on port {replica.port} gracefully')
+                proc.terminate()
+                await asyncio.wait_for(proc.wait(), timeout=self.stop_timeout)
+                logger.info(f'Server for model {model_name} on port {replica.port} terminated gracefully')
+            except asyncio.TimeoutError:
+                logger.warning(f'Server for model {model_name} on port {replica.port} hung out. Killing with SIGKILL')
+                proc.kill()
+                await proc.wait()
+        finally:
+            replica.proc = None
+            await replica.aclose()
+
+    def _replica_memory(self, pool:ReplicaPool) -> int:
+        measured = [measure_process_memory(replica.proc.pid) for replica in pool.ready() if replica.proc is not None]
+        if measured and all(measured):
+            return sum(measured)
+        return 0
+
     async def start_container(self, model_name:str, timeout=120) -> True:
         """Start container/server for the given `model_name`. This method will be based on the given config.
 
+        The model's `min_replicas` servers are spawned concurrently, the model is ready once at least one of them is healthy.
+
         Args:
             model_name (str): Model name based on the config. This is case sensitive and must be the same as the one specified within the config.yaml
             timeout (int, optional): Timeout setting when loading the model. Defaults to 120.
@@ -82,127 +1250,413 @@ class ContainerManager:
         Raises:
             ModelNotFound: If model doesnt exist within the config.yaml
             ContainerUnhealthyError: When starting the container/server and could not perform health check to determine if container/server is ready
+            ContainerExitedEarly: When the container/server process exits before it is ready
             ContainerError: When starting the container/server encountered an error
 
         Returns:
             True: Return True if container/server is running and ready to use 
         """
-        if model_name not in model_config['models']:
+        if model_name not in model_config['models'] or model_name in self._retiring:
             raise ModelNotFound(model_name)
         if model_name not in self._locks:
             self._locks[model_name] = asyncio.Lock()
         
         cwd = model_config['server']['llama_server_path']
         logger.info(f"Printing cwd llama server path based on config {cwd}")
-        host = model_config['server']['host']
-        config = model_config['models'][model_name]
-        port = config['port']
-        model_path = str(pathlib.Path(os.path.join(model_dir_path, config['model_path'])).expanduser().resolve())
-        if not self._validate_gguf_file(model_path):
+        model_path = self._resolve_model_path(model_name)
+        if not await asyncio.to_thread(self._validate_gguf_file, model_path):
             raise ModelFileError(model_path=model_path, model_name=model_name)
-        flag_config = config['config']
+        flag_config = model_config['models'][model_name]['config']
 
         async with self._locks[model_name]:
-            if self._server_status.get(model_name, False):
+            if self.is_running(model_name):
                 logger.info(f'Server for model {model_name} already running...')
                 return True
-            cmd = ['./llama-server' if cwd is not None else 'llama-server', '-m', str(model_path),'--host', str(host), '--port', str(port), *flag_config]
-            logger.info(f'Printing executed cmd {cmd}')
+            if self.parking is not None and self.parking.unpark(model_name):
+                logger.info(f'Starting parked model {model_name} from the page cache')
+            pool = self._get_pool(model_name)
+            start_time = time.perf_counter()
+            results = await asyncio.gather(
+                *(self._spawn_replica(model_name, replica, timeout) for replica in pool.replicas[:pool.min_replicas]),
+                return_exceptions=True
+            )
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if len(errors) == len(results):
+                self._eviction.record_stop(model_name)
+                raise errors[0]
+            for error in errors:
+                logger.warning(f'A replica of model {model_name} failed to start: {error}')
+
+            logger.info(f'Server for model {model_name} is ready with {len(pool.ready())} replica(s).')
+            self._server_status[model_name] = {
+                'status': True,
+                'config': self._split_flag(flag_config)
+            }
+            load_seconds = time.perf_counter() - start_time
+            # psutil and NVML process queries block, keep them off the event loop
+            memory = await asyncio.to_thread(self._replica_memory, pool)
+            self._eviction.record_start(model_name, load_seconds, memory)
+            return True
+
+    def acquire(self, model_name:str) -> ReplicaLease:
+        """Pick a ready replica of the given `model_name` for one request. Scales the pool out in the background when it is saturated.
+
+        Args:
+            model_name (str): Model name based on the config.
+
+        Raises:
+            ContainerUnhealthyError: If the model has no ready replica, e.g. it was stopped in between
+
+        Returns:
+            ReplicaLease: In-flight slot on the chosen replica, must be released when the request is done
+        """
+        pool = self._pools.get(model_name)
+        replica = pool.pick() if pool is not None else None
+        if replica is None:
+            raise ContainerUnhealthyError(model_name)
+        return self._lease(pool, replica)
+
+    def _lease(self, pool:ReplicaPool, replica:Replica, slot:int|None=None) -> ReplicaLease:
+        lease = ReplicaLease(replica, slot)
+        if self.owns_processes and pool.max_replicas > pool.min_replicas and pool.wants_scale_up(self._scale_up_threshold(pool.model_name)):
+            pool.scaling = True
+            asyncio.create_task(self.scale_up(pool.model_name))
+        return lease
+
+    def acquire_affine(self, model_name:str, path:str, body:dict, session_id:str|None=None) -> ReplicaLease:
+        """Pick the replica and slot that most likely hold the prompt cache of a request, see `acquire`.
+
+        The replica that served the longest known prefix of the request is preferred, falling back to the usual
+        balancer when it is gone or all its slots are busy. When a free slot is known the lease pins it, the caller
+        is expected to send it upstream as `id_slot`.
+
+        Args:
+            model_name (str): Model name based on the config.
+            path (str): Endpoint path
+            body (dict): Decoded request body
+            session_id (str | None, optional): Client provided session id, takes the place of the prefix. Defaults to None.
+
+        Raises:
+            ContainerUnhealthyError: If the model has no ready replica
+
+        Returns:
+            ReplicaLease: In-flight slot on the chosen replica, `lease.slot` is the pinned llama-server slot or None
+        """
+        if self.affinity is None:
+            return self.acquire(model_name)
+        pool = self._pools.get(model_name)
+        fingerprints = prefix_fingerprints(model_name, path, body, session_id)
+        if pool is None or not fingerprints:
+            return self.acquire(model_name)
+
+        found = self.affinity.lookup(fingerprints)
+        if found is not None:
+            depth, index, slot = found
+            replica = pool.replicas[index]
+            if replica.ready and replica.load < len(replica.slot_in_flight):
+                if slot is None or replica.slot_in_flight[slot]:
+                    slot = replica.free_slot()
+                self.affinity.record(len(fingerprints), depth)
+                self.affinity.assign(fingerprints[-1], replica.index, slot)
+                return self._lease(pool, replica, slot)
+
+        replica = pool.pick()
+        if replica is None:
+            raise ContainerUnhealthyError(model_name)
+        slot = replica.free_slot()
+        self.affinity.record(len(fingerprints), 0, fallback=found is not None)
+        self.affinity.assign(fingerprints[-1], replica.index, slot)
+        return self._lease(pool, replica, slot)
+
+    def _parallel_slots(self, model_name:str) -> int:
+        flags = self._split_flag(model_config['models'][model_name]['config'])
+        return int(flags.get('--parallel') or flags.get('-np') or 1)
+
+    async def post_json(self, model_name:str, path:str, body:dict) -> httpx.Response:
+        """Send a non streaming JSON request to one replica of a running model
+
+        Args:
+            model_name (str): Model name based on the config.
+            path (str): Upstream path, e.g. `/v1/embeddings`
+            body (dict): Request body
+
+        Returns:
+            httpx.Response: Fully read upstream response
+        """
+        lease = self.acquire(model_name)
+        try:
+            return await lease.client.post(path, content=json.dumps(body).encode(), headers={'content-type': 'application/json'})
+        finally:
+            lease.release()
+
+    def _scale_up_threshold(self, model_name:str) -> float:
+        config = model_config['models'][model_name]
+        if 'scale_up_in_flight' in config:
+            return float(config['scale_up_in_flight'])
+        # one replica is saturated once every llama-server slot is busy
+        return float(self._parallel_slots(model_name))
+
+    async def scale_up(self, model_name:str):
+        """Add one replica to the given `model_name` if the pool and the memory budget have room for it
+
+        Args:
+            model_name (str): Model name based on the config.
+        """
+        pool = self._get_pool(model_name)
+        pool.scaling = True
+        try:
+            if model_name in self._pending_rolls or model_name == self._rolling:
+                # its servers are about to be replaced by ones with a new config
+                return
+            replica = pool.idle_slot()
+            ready = pool.ready()
+            if replica is None or not ready:
+                return
+            per_replica = self._eviction.estimate(model_name) // len(ready)
+            if not self._eviction.fits(per_replica):
+                logger.info(f'Not scaling model {model_name} up, another replica does not fit in the memory budget')
+                return
+            self._eviction.resize(model_name, self._eviction.estimate(model_name) + per_replica)
+            logger.info(f'Scaling model {model_name} up to {len(ready) + 1} replicas on port {replica.port}')
             try:
-                proc = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    cwd=cwd,
-                    stdout=asyncio.subprocess.DEVNULL,
-                    stderr=asyncio.subprocess.DEVNULL
-                )
-
-                await asyncio.sleep(2)
-
-                if proc.returncode is not None:
-                    raise ContainerExitedEarly(ret_code=proc.returncode, model_name=model_name)
-
-                start_time = time.time()
-                while time.time() - start_time <= timeout:
-                    try:
-                        async with httpx.AsyncClient(timeout=5.0) as http_client:
-                            response = await http_client.get(
-                                url=f'http://{host}:{port}/health'
-                            )
-                            if response.status_code == 200:
-                                logger.info(f'Server for model {model_name} is ready.')
-                                flag_dict = self._split_flag(flag_config)
-                                self._server_status[model_name] = {
-                                    'status': True,
-                                    'config': flag_dict
-                                }
-                                self._server_proc[model_name] = proc
-                                return True
-                    except httpx.ConnectError as e:
-                        logger.warning(f'Health check attempt - Connection failed: {e}')
-                    except httpx.TimeoutException as e:
-                        logger.warning(f'Health check attempt - Timeout: {e}')
-                    except Exception as e:
-                        logger.warning(f'Health check attempt - Unexpected error: {type(e).__name__}: {e}')
-                    await asyncio.sleep(3)
-                raise ContainerUnhealthyError(model_name)
-            except Exception:
-                raise ContainerError(model_name)
+                await self._spawn_replica(model_name, replica, timeout=120)
+            except Exception as e:
+                self._eviction.resize(model_name, self._eviction.estimate(model_name) - per_replica)
+                logger.warning(f'Could not scale model {model_name} up: {e}')
+                return
+            if not self.is_running(model_name) or self._pools.get(model_name) is not pool:
+                # the model was stopped or rolled to a new config while the replica was loading
+                await self._stop_replica(model_name, replica)
+        finally:
+            pool.scaling = False
+
+    async def scale_in_idle_replicas(self, idle_time:float):
+        """Stop replicas above `min_replicas` that had no request in flight for `idle_time` seconds
+
+        Args:
+            idle_time (float): Idle threshold in seconds
+        """
+        if not self.owns_processes:
+            return
+        now = time.monotonic()
+        for model_name, pool in list(self._pools.items()):
+            ready = pool.ready()
+            if pool.scaling or len(ready) <= pool.min_replicas:
+                continue
+            per_replica = self._eviction.estimate(model_name) // len(ready)
+            surplus = len(ready) - pool.min_replicas
+            for replica in sorted(ready, key=lambda r: -r.index):
+                if surplus == 0:
+                    break
+                if replica.load == 0 and now - replica.last_used > idle_time:
+                    logger.info(f'Scaling model {model_name} in, stopping idle replica on port {replica.port}')
+                    await self._stop_replica(model_name, replica)
+                    self._eviction.resize(model_name, self._eviction.estimate(model_name) - per_replica)
+                    surplus -= 1
+
+    def replica_stats(self) -> dict:
+        """Replica count, ports and in-flight requests of every model that has been started
+
+        Returns:
+            dict: Replica statistics keyed by model name
+        """
+        return {model_name: pool.stats() for model_name, pool in self._pools.items()}
     
-    async def stop_container(self, model_name:str):
+    def is_running(self, model_name:str) -> bool:
+        """Check whether the server for the given `model_name` is up and ready
+
+        Args:
+            model_name (str): Model name based on the config.
+
+        Returns:
+            bool: True if the model server is ready to take requests
+        """
+        return self._server_status.get(model_name, {}).get('status', False)
+
+    def _queue_settings(self, model_name:str) -> tuple[int, float]:
+        server_config = model_config['server']
+        config = model_config['models'][model_name]
+        max_queued = int(config.get('max_queued_requests', server_config.get('max_queued_requests', 64)))
+        timeout = float(config.get('queue_timeout', server_config.get('queue_timeout', 120)))
+        return max_queued, timeout
+
+    def _get_queue(self, model_name:str) -> AdmissionQueue:
+        queue = self._queues.get(model_name)
+        if queue is None:
+            max_queued, timeout = self._queue_settings(model_name)
+            queue = AdmissionQueue(model_name, max_queued=max_queued, timeout=timeout)
+            self._queues[model_name] = queue
+        return queue
+
+    def _start_once(self, model_name:str, protected:tuple[str, ...]=()) -> asyncio.Task:
+        # single-flight cold start, every waiter shares the same task instead of queueing on the lock
+        task = self._starting.get(model_name)
+        if task is None:
+            logger.info(f'Cold starting server for {model_name}')
+            task = asyncio.create_task(self._timed_start(model_name, protected) if self.owns_processes else self._wait_for_leader(model_name))
+            self._starting[model_name] = task
+            task.add_done_callback(lambda t: self._start_done(model_name, t))
+        return task
+
+    async def _make_room(self, model_name:str, protected:tuple[str, ...]=()):
+        # plan and reserve under one lock so concurrent cold starts of different models don't count the same free memory.
+        # Models serving requests of another one are kept, their substituted generations would be cut off by the drain
+        async with self._eviction_lock:
+            victims = self._eviction.plan(model_name, protected={*self._starting, *self.lent_requests.active(), *protected})
+            self._eviction.reserve(model_name)
+            if self._eviction.budget is not None and self._eviction.used() > self._eviction.budget:
+                logger.warning(f'Starting model {model_name} goes over the memory budget, nothing else can be evicted')
+        for victim in victims:
+            logger.info(f'Evicting model {victim} ({self._eviction.policy.name}) to make room for {model_name}')
+            self.metrics.evictions.inc(victim)
+        # the victims drain side by side, the start waits for the slowest one but no longer than the eviction drain timeout
+        timeout = self.eviction_drain_timeout
+        await asyncio.gather(*(self.stop_container(victim, park=True, drain_timeout=timeout) for victim in victims))
+
+    async def _timed_start(self, model_name:str, protected:tuple[str, ...]=()) -> bool:
+        start_time = time.perf_counter()
+        await self._make_room(model_name, protected)
+        await self.start_container(model_name)
+        self._start_duration[model_name] = time.perf_counter() - start_time
+        return True
+
+    def _start_done(self, model_name:str, task:asyncio.Task):
+        if self._starting.get(model_name) is task:
+            del self._starting[model_name]
+        # mark the error as retrieved, the waiters may all have timed out already
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f'Cold start for model {model_name} failed: {task.exception()}')
+            self._start_errors[model_name] = (time.time(), str(task.exception()))
+
+    async def ensure_running(self, model_name:str):
+        """Make sure the server for the given `model_name` is ready, cold starting it if needed.
+
+        Concurrent callers for a cold model share a single start and wait in a bounded admission queue.
+
+        Args:
+            model_name (str): Model name based on the config.
+
+        Raises:
+            ModelNotFound: If model doesnt exist within the config.yaml
+            ModelQueueFull: If the admission queue of the model is full
+            ModelQueueTimeout: If the model is not ready within the queue timeout
+        """
+        if model_name in self._retiring:
+            # removed from the config, drains until it stops
+            raise ModelNotFound(model_name)
+        if self.is_running(model_name):
+            return
+        if model_name not in model_config['models']:
+            raise ModelNotFound(model_name)
+
+        queue = self._get_queue(model_name)
+        expected_start = self._start_duration.get(model_name)
+        entered_at = queue.enter(expected_start)
+        timed_out = False
+        try:
+            await asyncio.wait_for(asyncio.shield(self._start_once(model_name)), timeout=queue.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            raise ModelQueueTimeout(model_name, retry_after=queue.retry_after(expected_start))
+        finally:
+            self.metrics.queue_wait.observe(model_name, queue.leave(entered_at, timed_out=timed_out))
+
+    def queue_stats(self) -> dict[str, QueueStats]:
+        """Admission queue depth and wait time for every model that had to wait on a cold start
+
+        Returns:
+            dict[str, QueueStats]: Queue statistics keyed by model name
+        """
+        return {model_name: queue.stats() for model_name, queue in self._queues.items()}
+
+    async def stop_container(self, model_name:str, park:bool=False, drain_timeout:float|None=None):
         """Will stop the running container/server based on the given `model_name`
 
+        The model stops taking new requests first, requests arriving meanwhile wait for its next start. The ones
+        in flight get up to `server.drain_timeout` seconds to finish before the servers are terminated.
+
         Args:
             model_name (str): The model name server that want to be stopped
+            park (bool, optional): Keep the model files warm in the page cache for the next start, when `server.park` is enabled. Defaults to False.
+            drain_timeout (float | None, optional): Seconds to drain instead of `server.drain_timeout`. Defaults to None.
         """
-        if model_name not in model_config['models']:
+        if model_name not in model_config['models'] or not self.owns_processes:
             return
+        self._crashed.discard(model_name)
         
         if model_name not in self._locks:
             self._locks[model_name] = asyncio.Lock()
 
         async with self._locks[model_name]:
-            proc = self._server_proc.get(model_name)
+            pool = self._pools.get(model_name)
+            if not self.is_running(model_name) or pool is None:
+                logger.info(f'Server for model {model_name} already stopped')
+                return
 
-            try:
-                if not proc:
-                    logger.info(f'Server for model {model_name} already stopped')
-                    return
-                
-                self._server_status[model_name]['status'] = False
-                
-                try:
-                    logger.info(f'Terminating server for model {model_name} gracefully')
-                    proc.terminate()
-                    await asyncio.wait_for(proc.wait(), timeout=15)
-                    logger.info(f'Server for model {model_name} terminated gracefully')
-                except asyncio.TimeoutError:
-                    logger.warning(f'Server for model {model_name} hung out. Killing with SIGKILL')
-                    proc.kill()
-                    await proc.wait()
-                finally:
-                    self._server_proc[model_name] = None
-
-            except Exception:
-                raise
+            self._server_status[model_name]['status'] = False
+            if drain_timeout is None:
+                drain_timeout = self.drain_timeout
+            left = await self._drain(model_name, drain_timeout)
+            if left:
+                logger.warning(f'{left} request(s) still in flight on model {model_name} after {drain_timeout:.0f}s, stopping it anyway')
+            self._eviction.record_stop(model_name)
+            ready = len(pool.ready())
+            if ready > pool.min_replicas:
+                # the next cold start only brings `min_replicas` back
+                self._eviction.resize(model_name, self._eviction.estimate(model_name) * pool.min_replicas // ready)
+            await asyncio.gather(*(
+                self._stop_replica(model_name, replica) for replica in pool.replicas
+                if replica.ready or replica.proc is not None
+            ))
+            if park and self.parking is not None and model_config['models'][model_name].get('park', True):
+                self.parking.park(model_name, self.model_files(model_name))
 
     async def stop_all_container(self):
         """Stop all running container/server. Usually used when closing/shutting down the app
         """
         logger.info(f'App shutting down, stopping all running model')
+        if self._roll_task is not None:
+            self._roll_task.cancel()
+        if self.embedding_cache is not None:
+            self.embedding_cache.close()
+        if self.parking is not None:
+            await self.parking.close()
+        self.save_predictor()
+        if not self.owns_processes:
+            logger.info('Leaving the model servers to the leader worker')
+            await self._stop_coordination()
+            return
         if not self._server_status:
             logger.info('No server running')
+            await self._stop_coordination()
             return
-        for model_name, dict_val in self._server_status.items():
-            if dict_val['status']:
+        running = [model_name for model_name, dict_val in self._server_status.items() if dict_val['status']]
+        for model_name in self._server_status:
+            if model_name in running:
                 logger.info(f'Stopping model {model_name} server')
-                await self.stop_container(model_name)
             else:
                 logger.info(f'Server model {model_name} already stopped')
-                continue
+        # every model drains and terminates at once, shutdown takes as long as the slowest one
+        await asyncio.gather(*(self.stop_container(model_name) for model_name in running))
         if not self._server_status:
             logger.error('Encountered an error while stopping all running server')
         else:
             logger.info('All running server stopped succesfully')
+        await self._stop_coordination()
+
+    async def _stop_coordination(self):
+        if self.state is None:
+            return
+        if self._state_task is not None:
+            self._state_task.cancel()
+        if self._leading:
+            # followers see the stopped models before the next leader takes over
+            self._publish_view()
+        else:
+            for pool in self._pools.values():
+                for replica in pool.replicas:
+                    await replica.aclose()
+        self.state.close()
 
     async def update_last_request_time(self, model_name:str):
         """Update last request time for the given model container/server
@@ -211,19 +1665,101 @@ class ContainerManager:
             model_name (str): Model name server wished to be updated
         """
         self._last_request_time[model_name] = time.time()
+        if model_name in model_config['models']:
+            self._eviction.record_request(model_name)
+            if self.predictor is not None:
+                switched = self.predictor.last_model != model_name
+                self.predictor.record(model_name)
+                # the next model of a known sequence is usually requested within seconds, don't wait for the next round
+                if switched and (self._prefetch_task is None or self._prefetch_task.done()):
+                    self._prefetch_task = asyncio.create_task(self.run_prefetch())
+
+    def render_metrics(self) -> str:
+        """Refresh the gauges from the current pools and queues and render every metric
+
+        Returns:
+            str: Metrics in the Prometheus text exposition format
+        """
+        for model_name, pool in self._pools.items():
+            self.metrics.in_flight.set(model_name, pool.in_flight())
+            self.metrics.ready_replicas.set(model_name, len(pool.ready()))
+        for model_name, queue in self._queues.items():
+            self.metrics.queued.set(model_name, queue.queued)
+        return self.metrics.render()
+
+    def fairness_stats(self) -> dict|None:
+        """Fair queue of every model and per tenant admission counters, None when fair scheduling is disabled"""
+        return self.fairness.stats() if self.fairness is not None else None
 
-async def check_stop_idle_containers(container_manager:"ContainerManager", idle_time:int=180):
-    """Check and stop idle container based on the given `idle_time`
+    def affinity_stats(self) -> dict|None:
+        """Session affinity hit, fallback and prefix reuse counters, None when affinity routing is disabled"""
+        return self.affinity.stats() if self.affinity is not None else None
+
+    def memory_stats(self) -> dict:
+        """Memory budget, accounted usage and eviction counters of the models
+
+        Returns:
+            dict: Memory statistics
+        """
+        return self._eviction.stats()
+
+async def check_stop_idle_containers(container_manager:"ContainerManager", idle_time:int|None=None, stop_models:bool=True):
+    """Check and stop idle container based on the given `idle_time`, and scale autoscaled models back in to `min_replicas`.
+
+    With `server.memory_budget` set, memory pressure is handled by eviction when a model is loaded, so idle
+    models are kept unless `server.idle_timeout` is set explicitly.
 
     Args:
-        idle_time (int, optional): Threshold for idle time. Defaults to 180.
+        idle_time (int | None, optional): Threshold for idle time. Defaults to `server.idle_timeout`, 180 without a memory budget.
+        stop_models (bool, optional): Whether idle models are stopped, only surplus replicas are stopped otherwise. Defaults to True.
     """
+    server_config = model_config['server']
+    if idle_time is None:
+        default_idle = None if server_config.get('memory_budget') else 180
+        idle_time = server_config.get('idle_timeout', default_idle)
+    if not stop_models:
+        idle_time = None
+    replica_idle_time = server_config.get('replica_idle_timeout', 60)
+    autoscaled = any(replica_bounds(config)[1] > replica_bounds(config)[0] for config in model_config['models'].values())
+    if idle_time is None and not autoscaled:
+        logger.info('Idle reaping disabled, models are only stopped by memory budget eviction')
+        return
+    interval = server_config.get('idle_check_interval', 120)
     while True:
-        await asyncio.sleep(120)
-        curr_time = time.time()
-        for model_name, last_time in list(container_manager._last_request_time.items()):
-            if curr_time - last_time > idle_time:
-                if container_manager._server_status.get(model_name).get('status', False):
+        await asyncio.sleep(interval)
+        await container_manager.scale_in_idle_replicas(replica_idle_time)
+        if idle_time is None:
+            continue
+        for model_name in list(container_manager._last_request_time):
+            # idle only once nothing was in flight for the whole window, not counted from the request start
+            if container_manager.idle_seconds(model_name) > idle_time:
+                if container_manager.owns_processes and container_manager.is_running(model_name) and not container_manager.keep_warm(model_name):
                     logger.info(f'Stopping idle server for model {model_name}')
-                    await container_manager.stop_container(model_name)
+                    await container_manager.stop_container(model_name, park=True)
+
 
+async def run_prefetch_scheduler(container_manager:"ContainerManager"):
+    """Run the prefetch scheduler every `server.predictive_prefetch.interval` seconds and persist the request statistics"""
+    interval = float(container_manager.prefetch_config.get('interval', 15))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await container_manager.run_prefetch()
+        except Exception as e:
+            logger.error(f'Prefetch scheduler round failed: {e}')
+        await asyncio.to_thread(container_manager.save_predictor)
+
+
+async def watch_config(container_manager:"ContainerManager"):
+    """Reload `config.yaml` whenever its content changes, polled every `server.config_reload.interval` seconds"""
+    if not model_config['server'].get('config_reload'):
+        return
+    interval = float(container_manager.config_reload_config.get('interval', 2))
+    logger.info(f'Watching {container_manager.config_watcher.path} for changes every {interval}s')
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await asyncio.to_thread(container_manager.config_watcher.changed):
+                await container_manager.reload_config()
+        except Exception as e:
+            logger.error(f'Config reload failed: {e}')
@@ -0,0 +1,338 @@
+import abc
+import os
+import json
+import mmap
+import time
+import zlib
+import signal
+import struct
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from logger import get_logger
+
+logger = get_logger()
+
+_MAGIC = b'LRS1'
+# magic, layout hash, view sequence, view length
+_HEADER = struct.Struct('<4sIQI')
+# pid, padding, heartbeat
+_ROW_HEADER = struct.Struct('<IId')
+
+
+class PeerModel:
+    """What the other live workers report about one model"""
+    __slots__ = ('last_request', 'start_requests', 'in_flight')
+
+    def __init__(self, max_replicas:int):
+        self.last_request = 0.0
+        # start request counter of each worker row
+        self.start_requests:dict[int, int] = {}
+        self.in_flight = [0] * max_replicas
+
+
+class StateBackend(abc.ABC):
+    """Coordination between router workers serving the same models.
+
+    Exactly one worker, the leader, owns the llama-server processes: it starts, stops, scales and supervises them
+    and publishes a view of model readiness. Every worker, the leader included, routes requests from that view and
+    reports its own load, last request times and start requests for the leader to act on.
+    """
+    name = 'base'
+
+    @property
+    @abc.abstractmethod
+    def is_leader(self) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def try_lead(self) -> bool:
+        """Try to become the leader, returns True once this worker is the leader"""
+
+    @abc.abstractmethod
+    def publish(self, view:dict):
+        """Leader only: replace the shared view of the models"""
+
+    @abc.abstractmethod
+    def view(self) -> dict|None:
+        """Latest view published by the leader, None if nothing was published yet"""
+
+    @abc.abstractmethod
+    def report(self, model_index:int, last_request:float, in_flight:list[int]):
+        """Report this worker's last request time and per replica in-flight requests of one model"""
+
+    @abc.abstractmethod
+    def request_start(self, model_index:int):
+        """Ask the leader to start a model"""
+
+    @abc.abstractmethod
+    def peers(self) -> list[PeerModel]:
+        """Reports of every other live worker, summed per model"""
+
+    @abc.abstractmethod
+    def stats(self) -> dict:
+        ...
+
+    def close(self):
+        pass
+
+
+class LocalStateBackend(StateBackend):
+    """State shared by the workers of one host, e.g. `uvicorn --workers N`, through a memory-mapped file and file locks.
+
+    The leader is the worker holding an exclusive `flock` on `leader.lock`; the kernel releases it when the worker
+    dies, so another worker takes over on its next `try_lead`. Each worker claims one row of the shared file the
+    same way, with a lock per row, and is the only writer of that row. The view is a JSON document behind a
+    sequence counter (a seqlock): readers retry while it is odd or changed during the read, and only decode it
+    again when the sequence moved, so reading an unchanged view costs one unpack.
+
+    Args:
+        path (str): Directory of the state file and the locks, `/dev/shm` keeps it in memory
+        model_names (list[str]): Every configured model, in the same order on every worker
+        max_replicas (int, optional): Replica slots per model. Defaults to 16.
+        max_workers (int, optional): Worker rows. Defaults to 64.
+        view_bytes (int, optional): Space for the view document. Defaults to 256KB.
+        stale_after (float, optional): Seconds without heartbeat after which a row is ignored. Defaults to 5.
+    """
+    name = 'local'
+
+    def __init__(self, path:str, model_names:list[str], max_replicas:int=16, max_workers:int=64,
+                 view_bytes:int=256 * 1024, stale_after:float=5.0):
+        if fcntl is None:
+            raise RuntimeError('The local state backend needs fcntl, it is not available on this platform')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.model_names = list(model_names)
+        self.max_replicas = max_replicas
+        self.max_workers = max_workers
+        self.view_bytes = view_bytes
+        self.stale_after = stale_after
+        # one model of a row: last request, start requests, padding, in-flight per replica
+        self._model_block = struct.Struct(f'<dII{max_replicas}i')
+        self._model_size = self._model_block.size
+        self._row_size = _ROW_HEADER.size + self._model_size * len(self.model_names)
+        self._view_offset = _HEADER.size
+        self._rows_offset = self._view_offset + view_bytes
+        size = self._rows_offset + self._row_size * max_workers
+        layout = hash_layout(self.model_names, max_replicas, max_workers, view_bytes)
+
+        self._fd = os.open(os.path.join(path, 'state'), os.O_RDWR | os.O_CREAT, 0o600)
+        init_fd = os.open(os.path.join(path, 'init.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(init_fd, fcntl.LOCK_EX)
+            current = os.fstat(self._fd).st_size
+            header = os.pread(self._fd, _HEADER.size, 0) if current >= _HEADER.size else b''
+            if current != size or header[:4] != _MAGIC or _HEADER.unpack(header)[1] != layout:
+                # first worker, or the config changed since the file was written
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, layout, 0, 0), 0)
+            self._mm = mmap.mmap(self._fd, size)
+            self.row = self._claim_row()
+        finally:
+            fcntl.flock(init_fd, fcntl.LOCK_UN)
+            os.close(init_fd)
+        self._row_offset = self._rows_offset + self.row * self._row_size
+        self._leader_fd:int|None = None
+        self._view_seq = -1
+        self._view:dict|None = None
+        self._start_requests = [0] * len(self.model_names)
+        self.heartbeat()
+
+    def _claim_row(self) -> int:
+        for row in range(self.max_workers):
+            fd = os.open(os.path.join(self.path, f'worker-{row}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            self._row_fd = fd
+            offset = self._rows_offset + row * self._row_size
+            # the previous owner of the row is gone, drop what it reported
+            self._mm[offset:offset + self._row_size] = bytes(self._row_size)
+            return row
+        raise RuntimeError(f'All {self.max_workers} worker rows of {self.path} are taken')
+
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_fd is not None
+
+    def try_lead(self) -> bool:
+        if self._leader_fd is not None:
+            return True
+        fd = os.open(os.path.join(self.path, 'leader.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        return True
+
+    def heartbeat(self):
+        _ROW_HEADER.pack_into(self._mm, self._row_offset, os.getpid(), 0, time.time())
+
+    def publish(self, view:dict):
+        payload = json.dumps(view, separators=(',', ':')).encode()
+        if len(payload) > self.view_bytes:
+            raise ValueError(f'Model view of {len(payload)} bytes does not fit in {self.view_bytes} bytes')
+        _, layout, seq, _ = _HEADER.unpack_from(self._mm, 0)
+        # odd while writing, readers retry
+        _HEADER.pack_into(self._mm, 0, _MAGIC, layout, seq + 1, 0)
+        self._mm[self._view_offset:self._view_offset + len(payload)] = payload
+        _HEADER.pack_into(self._mm, 0, _MAGIC, layout, seq + 2, len(payload))
+
+    def view(self) -> dict|None:
+        for _ in range(100):
+            _, _, seq, length = _HEADER.unpack_from(self._mm, 0)
+            if seq == self._view_seq:
+                return self._view
+            if seq % 2:
+                time.sleep(0)
+                continue
+            payload = self._mm[self._view_offset:self._view_offset + length]
+            if _HEADER.unpack_from(self._mm, 0)[2] != seq:
+                continue
+            self._view_seq = seq
+            self._view = json.loads(payload) if length else None
+            return self._view
+        return self._view
+
+    def report(self, model_index:int, last_request:float, in_flight:list[int]):
+        offset = self._row_offset + _ROW_HEADER.size + model_index * self._model_size
+        loads = (in_flight + [0] * self.max_replicas)[:self.max_replicas]
+        self._model_block.pack_into(self._mm, offset, last_request, self._start_requests[model_index], 0, *loads)
+
+    def request_start(self, model_index:int):
+        self._start_requests[model_index] += 1
+        offset = self._row_offset + _ROW_HEADER.size + model_index * self._model_size
+        struct.pack_into('<I', self._mm, offset + 8, self._start_requests[model_index])
+
+    def peers(self) -> list[PeerModel]:
+        models = [PeerModel(self.max_replicas) for _ in self.model_names]
+        now = time.time()
+        block = self._model_block
+        for row in range(self.max_workers):
+            if row == self.row:
+                continue
+            offset = self._rows_offset + row * self._row_size
+            pid, _, heartbeat = _ROW_HEADER.unpack_from(self._mm, offset)
+            if not pid or now - heartbeat > self.stale_after:
+                continue
+            offset += _ROW_HEADER.size
+            for model, (last_request, start_requests, _, *loads) in zip(models, block.iter_unpack(self._mm[offset:offset + self._row_size - _ROW_HEADER.size])):
+                if last_request > model.last_request:
+                    model.last_request = last_request
+                model.start_requests[row] = start_requests
+                if any(loads):
+                    model.in_flight = [total + load for total, load in zip(model.in_flight, loads)]
+        return models
+
+    def live_workers(self) -> int:
+        now = time.time()
+        count = 0
+        for row in range(self.max_workers):
+            pid, _, heartbeat = _ROW_HEADER.unpack_from(self._mm, self._rows_offset + row * self._row_size)
+            if pid and now - heartbeat <= self.stale_after:
+                count += 1
+        return count
+
+    def stats(self) -> dict:
+        return {
+            'backend': self.name,
+            'path': self.path,
+            'leader': self.is_leader,
+            'worker': self.row,
+            'workers': self.live_workers(),
+        }
+
+    def close(self):
+        offset = self._row_offset
+        self._mm[offset:offset + self._row_size] = bytes(self._row_size)
+        if self._leader_fd is not None:
+            fcntl.flock(self._leader_fd, fcntl.LOCK_UN)
+            os.close(self._leader_fd)
+            self._leader_fd = None
+        fcntl.flock(self._row_fd, fcntl.LOCK_UN)
+        os.close(self._row_fd)
+        self._mm.close()
+        os.close(self._fd)
+
+
+def hash_layout(model_names:list[str], max_replicas:int, max_workers:int, view_bytes:int) -> int:
+    return zlib.crc32(json.dumps([model_names, max_replicas, max_workers, view_bytes]).encode())
+
+
+def default_state_path() -> str:
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'llama-router')
+
+
+def _alive(pid:int) -> bool:
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return False
+    # a zombie has released its ports already, whoever reaps it
+    return stat[stat.rfind(b')') + 2:][:1] != b'Z'
+
+
+def stop_orphans(pids:dict[int, str], timeout:float=5.0) -> int:
+    """Kill model servers left behind by a leader that died. Blocking, run it off the event loop.
+
+    A pid is only killed while its command line still names the model file it was started with, so a pid reused by
+    an unrelated process is left alone.
+
+    Args:
+        pids (dict[int, str]): Pid to resolved model path
+        timeout (float, optional): Seconds to wait for the processes to exit and free their ports. Defaults to 5.
+
+    Returns:
+        int: Number of processes killed
+    """
+    killed = []
+    for pid, model_path in pids.items():
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                cmdline = f.read().split(b'\0')
+        except OSError:
+            continue
+        if model_path.encode() not in cmdline:
+            continue
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed.append(pid)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + timeout
+    while killed and time.monotonic() < deadline:
+        if not any(_alive(pid) for pid in killed):
+            break
+        time.sleep(0.05)
+    return len(killed)
+
+
+def make_state_backend(name:str, model_names:list[str], **kwargs) -> StateBackend:
+    """Build the coordination backend from its config name
+
+    Args:
+        name (str): `local`, remote stores can be added next to it
+        model_names (list[str]): Every configured model, in config order
+
+    Raises:
+        ValueError: If the backend is unknown
+
+    Returns:
+        StateBackend: The backend
+    """
+    if name == 'local':
+        return LocalStateBackend(kwargs.get('path') or default_state_path(), model_names,
+                                 max_replicas=int(kwargs.get('max_replicas', 16)),
+                                 max_workers=int(kwargs.get('max_workers', 64)))
+    raise ValueError(f'Unknown coordination backend {name!r}, expected local')
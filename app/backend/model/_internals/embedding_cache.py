@@ -0,0 +1,256 @@
+import os
+import json
+import mmap
+import hashlib
+from array import array
+from collections import OrderedDict
+from typing import TypedDict
+
+from logger import get_logger
+
+logger = get_logger()
+
+# request fields that don't change the vectors and are left out of the cache key
+_KEY_IGNORED_FIELDS = frozenset(('model', 'input', 'user', 'encoding_format'))
+
+
+class EmbeddingCacheStats(TypedDict):
+    hits:int
+    misses:int
+    disk_hits:int
+    entries:int
+    bytes:int
+    max_bytes:int
+
+
+def embedding_key(model_name:str, model_identity:str, item, params:dict) -> bytes:
+    """Content address of one embedding input
+
+    Args:
+        model_name (str): Model name based on the config
+        model_identity (str): Identity of the model file, changes when the file is replaced
+        item (str|list[int]): One input string or token array
+        params (dict): Other request fields that may change the vectors
+
+    Returns:
+        bytes: sha256 digest
+    """
+    digest = hashlib.sha256()
+    digest.update(model_name.encode())
+    digest.update(b'\0')
+    digest.update(model_identity.encode())
+    digest.update(b'\0')
+    if params:
+        digest.update(json.dumps(params, sort_keys=True, separators=(',', ':')).encode())
+    digest.update(b'\0')
+    if isinstance(item, str):
+        digest.update(b's')
+        digest.update(item.encode())
+    else:
+        digest.update(b't')
+        digest.update(json.dumps(item, separators=(',', ':')).encode())
+    return digest.digest()
+
+
+def key_params(body:dict) -> dict:
+    return {k: v for k, v in body.items() if k not in _KEY_IGNORED_FIELDS}
+
+
+class DiskEmbeddingStore:
+    """Memory-mapped float32 vector store that survives restarts.
+
+    Vectors of one dimension live in a fixed size ring of slots in `<dim>.f32`. Each write appends `<key> <slot>` to
+    `<dim>.idx`, replaying that log on startup rebuilds the key to slot map. When the ring is full the oldest slot is reused.
+    The log is compacted to the live entries once it holds twice as many lines as the ring has slots.
+    """
+    def __init__(self, path:str, dim:int, max_entries:int):
+        self.dim = dim
+        self.max_entries = max_entries
+        self._slot_bytes = dim * 4
+        os.makedirs(path, exist_ok=True)
+        data_path = os.path.join(path, f'{dim}.f32')
+        self._index_path = os.path.join(path, f'{dim}.idx')
+
+        self._file = open(data_path, 'a+b')
+        size = max_entries * self._slot_bytes
+        if os.fstat(self._file.fileno()).st_size != size:
+            self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+
+        self._slots:dict[bytes, int] = {}
+        self._slot_keys:list[bytes|None] = [None] * max_entries
+        self._tokens:dict[bytes, int] = {}
+        self._next = 0
+        self._index_lines = 0
+        self._load_index()
+        self._index = open(self._index_path, 'a')
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return
+        count = 0
+        with open(self._index_path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 3:
+                    continue
+                key, slot, tokens = bytes.fromhex(parts[0]), int(parts[1]), int(parts[2])
+                if slot >= self.max_entries:
+                    continue
+                self._assign(key, slot, tokens)
+                self._next = (slot + 1) % self.max_entries
+                count += 1
+        self._index_lines = count
+        # compact the log so it doesn't grow without bound across restarts
+        if count > self.max_entries:
+            self._write_index()
+
+    def _write_index(self):
+        # the live entries in slot write order, so replaying the log restores `_next` as well
+        start = self._next
+        order = [(slot - start) % self.max_entries for slot in range(self.max_entries)]
+        tmp_path = f'{self._index_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            for _, slot in sorted(zip(order, range(self.max_entries))):
+                key = self._slot_keys[slot]
+                if key is not None:
+                    f.write(f'{key.hex()} {slot} {self._tokens[key]}\n')
+        os.replace(tmp_path, self._index_path)
+        self._index_lines = len(self._slots)
+
+    def _compact(self):
+        self._index.close()
+        self._write_index()
+        self._index = open(self._index_path, 'a')
+
+    def _assign(self, key:bytes, slot:int, tokens:int):
+        old = self._slot_keys[slot]
+        if old is not None:
+            self._slots.pop(old, None)
+            self._tokens.pop(old, None)
+        self._slots[key] = slot
+        self._slot_keys[slot] = key
+        self._tokens[key] = tokens
+
+    def get(self, key:bytes) -> tuple[array, int]|None:
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        vector = array('f')
+        vector.frombytes(self._mm[slot * self._slot_bytes:(slot + 1) * self._slot_bytes])
+        return vector, self._tokens[key]
+
+    def put(self, key:bytes, vector:array, tokens:int):
+        if key in self._slots or len(vector) != self.dim:
+            return
+        slot = self._next
+        self._next = (slot + 1) % self.max_entries
+        # vector first, then the index line, so a crash never indexes a half written slot
+        self._mm[slot * self._slot_bytes:(slot + 1) * self._slot_bytes] = vector.tobytes()
+        self._assign(key, slot, tokens)
+        self._index.write(f'{key.hex()} {slot} {tokens}\n')
+        self._index.flush()
+        self._index_lines += 1
+        if self._index_lines > 2 * self.max_entries:
+            self._compact()
+
+    def close(self):
+        self._index.close()
+        self._mm.flush()
+        self._mm.close()
+        self._file.close()
+
+
+class EmbeddingCache:
+    """Content addressed embedding cache, a byte bounded in-memory LRU with an optional on-disk tier
+
+    Vectors are kept as float32, so a cached vector may differ from the upstream one in the last digits.
+    """
+    def __init__(self, max_bytes:int, disk_path:str|None=None, disk_max_entries:int=100_000):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self._entries:OrderedDict[bytes, tuple[array, int]] = OrderedDict()
+        self._disk:dict[int, DiskEmbeddingStore] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def _disk_store(self, dim:int) -> DiskEmbeddingStore|None:
+        if self.disk_path is None:
+            return None
+        store = self._disk.get(dim)
+        if store is None:
+            store = self._disk[dim] = DiskEmbeddingStore(self.disk_path, dim, self.disk_max_entries)
+        return store
+
+    def _remember(self, key:bytes, vector:array, tokens:int):
+        size = len(vector) * 4
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[0]) * 4
+        self._entries[key] = (vector, tokens)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (old, _) = self._entries.popitem(last=False)
+            self._bytes -= len(old) * 4
+
+    def get(self, key:bytes) -> tuple[array, int]|None:
+        """Look up one vector, promoting disk hits into memory
+
+        Args:
+            key (bytes): Key from `embedding_key`
+
+        Returns:
+            tuple[array, int]|None: float32 vector and its prompt token count, None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        for store in self._disk.values():
+            entry = store.get(key)
+            if entry is not None:
+                self._remember(key, *entry)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def put(self, key:bytes, embedding:list[float], tokens:int):
+        vector = array('f', embedding)
+        self._remember(key, vector, tokens)
+        store = self._disk_store(len(vector))
+        if store is not None:
+            try:
+                store.put(key, vector, tokens)
+            except OSError as e:
+                logger.warning(f'Could not write embedding to the disk cache: {e}')
+
+    def load_disk(self):
+        """Open the on-disk stores written by a previous run"""
+        if self.disk_path is None or not os.path.isdir(self.disk_path):
+            return
+        for name in os.listdir(self.disk_path):
+            if name.endswith('.f32') and name[:-4].isdigit():
+                self._disk_store(int(name[:-4]))
+
+    def close(self):
+        for store in self._disk.values():
+            store.close()
+        self._disk.clear()
+
+    def stats(self) -> EmbeddingCacheStats:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+        }
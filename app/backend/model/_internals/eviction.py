@@ -0,0 +1,353 @@
+import abc
+import json
+import time
+from pathlib import Path
+from typing import Callable, Iterable, TypedDict
+
+from .gguf import shard_paths
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+# share of the weights size added on top for KV cache and compute buffers when nothing better is known
+MEMORY_OVERHEAD = 0.1
+# half-life in seconds of the request frequency used by LFU and cost-aware policies
+FREQUENCY_HALF_LIFE = 600.0
+
+
+def estimate_gguf_memory(model_path:str) -> int:
+    """Estimate the resident memory of a model from its GGUF file size. Sharded models sum every shard.
+
+    Args:
+        model_path (str): Path to the gguf file, the first shard for sharded models
+
+    Returns:
+        int: Estimated memory in bytes, 0 if the file is not accessible
+    """
+    size = 0
+    for file in shard_paths(model_path):
+        try:
+            size += Path(file).stat().st_size
+        except OSError:
+            continue
+    return int(size * (1 + MEMORY_OVERHEAD))
+
+
+def measure_process_memory(pid:int) -> int|None:
+    """Measure the memory used by a model server process, host RSS plus GPU memory
+
+    Args:
+        pid (int): Process id of the model server
+
+    Returns:
+        int|None: Memory in bytes, None when neither psutil nor NVML can measure it
+    """
+    total = None
+    if psutil is not None:
+        try:
+            total = psutil.Process(pid).memory_info().rss
+        except Exception:
+            pass
+    if pynvml is not None:
+        try:
+            for i in range(pynvml.nvmlDeviceGetCount()):
+                handle = pynvml.nvmlDeviceGetHandleByIndex(i)
+                for proc in pynvml.nvmlDeviceGetComputeRunningProcesses(handle):
+                    if proc.pid == pid and proc.usedGpuMemory:
+                        total = (total or 0) + proc.usedGpuMemory
+        except Exception:
+            pass
+    return total
+
+
+class ModelUsage:
+    """Usage record of a single model, updated in O(1) on every request"""
+    __slots__ = ('memory', 'running', 'last_used', 'frequency', 'load_seconds', 'evictions')
+
+    def __init__(self):
+        self.memory = 0
+        self.running = False
+        self.last_used = 0.0
+        self.frequency = 0.0
+        self.load_seconds = 0.0
+        self.evictions = 0
+
+    def decayed_frequency(self, now:float) -> float:
+        return self.frequency * 0.5 ** (max(0.0, now - self.last_used) / FREQUENCY_HALF_LIFE)
+
+
+class EvictionPolicy(abc.ABC):
+    """Base eviction policy. Running models with the lowest score are evicted first"""
+    name = 'base'
+
+    @abc.abstractmethod
+    def score(self, usage:ModelUsage, now:float) -> tuple:
+        ...
+
+
+class LRUPolicy(EvictionPolicy):
+    """Evict the least recently used model"""
+    name = 'lru'
+
+    def score(self, usage:ModelUsage, now:float) -> tuple:
+        return (usage.last_used,)
+
+
+class LFUPolicy(EvictionPolicy):
+    """Evict the least frequently used model, frequency decays over time so old bursts do not pin a model"""
+    name = 'lfu'
+
+    def score(self, usage:ModelUsage, now:float) -> tuple:
+        return (usage.decayed_frequency(now), usage.last_used)
+
+
+class CostAwarePolicy(EvictionPolicy):
+    """Evict the model that is cheapest to bring back, reload time multiplied by its request rate"""
+    name = 'cost'
+
+    def score(self, usage:ModelUsage, now:float) -> tuple:
+        return (usage.load_seconds * usage.decayed_frequency(now), usage.last_used)
+
+
+POLICIES:dict[str, type[EvictionPolicy]] = {
+    LRUPolicy.name: LRUPolicy,
+    LFUPolicy.name: LFUPolicy,
+    CostAwarePolicy.name: CostAwarePolicy,
+}
+
+
+def get_policy(name:str) -> EvictionPolicy:
+    """Build an eviction policy from its config name
+
+    Args:
+        name (str): One of `lru`, `lfu` or `cost`
+
+    Raises:
+        ValueError: If the policy name is unknown
+
+    Returns:
+        EvictionPolicy: Policy instance
+    """
+    if name not in POLICIES:
+        raise ValueError(f'Unknown eviction policy {name!r}, expected one of {list(POLICIES)}')
+    return POLICIES[name]()
+
+
+class EvictionEngine:
+    """Tracks per-model resident memory and picks which models to stop so a new one fits in the memory budget.
+
+    The engine is pure bookkeeping, it never starts or stops anything itself, which keeps it deterministic
+    for the simulation harness.
+    """
+    def __init__(self, budget:int|None, policy:EvictionPolicy, estimator:Callable[[str], int], clock:Callable[[], float]=time.monotonic):
+        self.budget = budget
+        self.policy = policy
+        self._estimator = estimator
+        self._clock = clock
+        self._usage:dict[str, ModelUsage] = {}
+
+    def _get(self, model_name:str) -> ModelUsage:
+        usage = self._usage.get(model_name)
+        if usage is None:
+            usage = self._usage[model_name] = ModelUsage()
+        return usage
+
+    def estimate(self, model_name:str) -> int:
+        """Memory expected for the given model, the last measured value if it has been loaded before
+
+        Args:
+            model_name (str): Model name based on the config.
+
+        Returns:
+            int: Memory in bytes
+        """
+        usage = self._usage.get(model_name)
+        if usage is not None and usage.memory:
+            return usage.memory
+        return self._estimator(model_name)
+
+    def used(self) -> int:
+        """Memory in bytes of every model currently running or reserved"""
+        return sum(usage.memory for usage in self._usage.values() if usage.running)
+
+    def record_request(self, model_name:str, now:float|None=None):
+        now = self._clock() if now is None else now
+        usage = self._get(model_name)
+        usage.frequency = usage.decayed_frequency(now) + 1
+        usage.last_used = now
+
+    def reserve(self, model_name:str):
+        """Account the estimated memory of a model that is about to start"""
+        usage = self._get(model_name)
+        if not usage.running:
+            usage.memory = self.estimate(model_name)
+            usage.running = True
+
+    def record_start(self, model_name:str, load_seconds:float, memory:int|None=None):
+        usage = self._get(model_name)
+        usage.running = True
+        usage.load_seconds = load_seconds
+        usage.memory = memory or self.estimate(model_name)
+
+    def resize(self, model_name:str, memory:int):
+        """Update the accounted memory of a running model, e.g. after it gained or lost a replica"""
+        self._get(model_name).memory = memory
+
+    def fits(self, extra:int) -> bool:
+        """Whether `extra` bytes fit in the budget without evicting anything"""
+        return self.budget is None or self.used() + extra <= self.budget
+
+    def record_stop(self, model_name:str):
+        if model_name in self._usage:
+            self._usage[model_name].running = False
+
+    def forget(self, model_name:str):
+        """Drop the accounting of a model that was removed from the config"""
+        self._usage.pop(model_name, None)
+
+    def fits(self, model_name:str, protected:Iterable[str]=()) -> bool:
+        """Whether `model_name` fits in the budget once every running model but the protected ones is evicted"""
+        if self.budget is None:
+            return True
+        usage = self._usage.get(model_name)
+        if usage is not None and usage.running:
+            return True
+        protected = set(protected)
+        evictable = sum(u.memory for name, u in self._usage.items() if u.running and name != model_name and name not in protected)
+        return self.estimate(model_name) <= self.budget - self.used() + evictable
+
+    def plan(self, model_name:str, protected:Iterable[str]=(), now:float|None=None) -> list[str]:
+        """Pick the running models to stop so `model_name` fits in the budget. Picked models are released from the accounting right away.
+
+        Args:
+            model_name (str): Model about to be started
+            protected (Iterable[str], optional): Models that must not be evicted, e.g. ones still starting. Defaults to ().
+            now (float | None, optional): Current time, defaults to the engine clock.
+
+        Returns:
+            list[str]: Models to stop, in eviction order. May not free enough memory if everything left is protected
+        """
+        if self.budget is None:
+            return []
+        now = self._clock() if now is None else now
+        usage = self._usage.get(model_name)
+        if usage is not None and usage.running:
+            return []
+        free = self.budget - self.used()
+        need = self.estimate(model_name)
+        if need <= free:
+            return []
+
+        protected = set(protected)
+        candidates = sorted(
+            (name for name, u in self._usage.items() if u.running and name != model_name and name not in protected),
+            key=lambda name: self.policy.score(self._usage[name], now)
+        )
+        victims = []
+        for name in candidates:
+            if free >= need:
+                break
+            victim = self._usage[name]
+            victim.running = False
+            victim.evictions += 1
+            free += victim.memory
+            victims.append(name)
+        return victims
+
+    def stats(self) -> dict:
+        return {
+            'budget': self.budget,
+            'used': self.used(),
+            'policy': self.policy.name,
+            'models': {
+                name: {'memory': usage.memory, 'running': usage.running, 'evictions': usage.evictions}
+                for name, usage in self._usage.items()
+            }
+        }
+
+
+class SimulationResult(TypedDict):
+    policy:str
+    requests:int
+    hits:int
+    cold_starts:int
+    evictions:int
+    load_seconds:float
+    hit_ratio:float
+    peak_memory:int
+
+
+def load_trace(path:str) -> list[tuple[float, str]]:
+    """Load a JSONL request trace. Each line is a request body or log record with a `model` field and
+    optionally a `timestamp`/`ts`/`created` field in seconds. Lines without a timestamp are spaced one second apart.
+
+    Args:
+        path (str): Trace file path
+
+    Returns:
+        list[tuple[float, str]]: (timestamp, model name) pairs sorted by time
+    """
+    trace = []
+    with open(path) as f:
+        for i, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            model_name = record.get('model')
+            if not model_name:
+                continue
+            ts = record.get('timestamp', record.get('ts', record.get('created', float(i))))
+            trace.append((float(ts), model_name))
+    trace.sort(key=lambda item: item[0])
+    return trace
+
+
+def simulate(trace:Iterable[tuple[float, str]], models:dict[str, tuple[int, float]], budget:int, policy:EvictionPolicy) -> SimulationResult:
+    """Replay a request trace against an eviction policy. Loads are instantaneous so results only depend on the trace.
+
+    Args:
+        trace (Iterable[tuple[float, str]]): (timestamp, model name) pairs in time order
+        models (dict[str, tuple[int, float]]): Memory in bytes and load time in seconds for each model
+        budget (int): Memory budget in bytes
+        policy (EvictionPolicy): Policy under test
+
+    Returns:
+        SimulationResult: Hit and cold start counters for the replay
+    """
+    engine = EvictionEngine(budget, policy, estimator=lambda name: models[name][0], clock=lambda: 0.0)
+    requests = hits = cold_starts = evictions = 0
+    load_seconds = 0.0
+    peak = 0
+    for now, model_name in trace:
+        if model_name not in models:
+            continue
+        requests += 1
+        engine.record_request(model_name, now=now)
+        usage = engine._usage[model_name]
+        if usage.running:
+            hits += 1
+            continue
+        victims = engine.plan(model_name, now=now)
+        evictions += len(victims)
+        cold_starts += 1
+        load_seconds += models[model_name][1]
+        engine.record_start(model_name, models[model_name][1], models[model_name][0])
+        peak = max(peak, engine.used())
+    return {
+        'policy': policy.name,
+        'requests': requests,
+        'hits': hits,
+        'cold_starts': cold_starts,
+        'evictions': evictions,
+        'load_seconds': round(load_seconds, 3),
+        'hit_ratio': round(hits / requests, 4) if requests else 0.0,
+        'peak_memory': peak,
+    }
@@ -0,0 +1,353 @@
+import time
+import heapq
+import asyncio
+import hashlib
+from typing import Callable, TypedDict
+
+from exceptions import RateLimited, ModelBusy
+
+# rough bytes of a JSON request body per prompt token, good enough to weigh requests against each other
+BYTES_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """Token bucket refilled lazily on every call, so an idle bucket costs nothing"""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate:float, burst:float, now:float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now:float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount:float, now:float) -> float:
+        """Seconds until `amount` can be taken, 0 if it can be taken now. More than `burst` only needs a full bucket,
+        the rest is paid off afterwards."""
+        self._refill(now)
+        needed = min(amount, self.burst)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self, amount:float):
+        self.tokens -= amount
+
+    @property
+    def full(self) -> bool:
+        return self.tokens >= self.burst
+
+
+class TenantPolicy:
+    """Limits and share of one tenant
+
+    Args:
+        name (str): Tenant name used in stats and metrics
+        weight (float, optional): Share of a saturated model relative to the other tenants. Defaults to 1.
+        requests_per_second (float | None, optional): Sustained request rate, None for no limit. Defaults to None.
+        tokens_per_minute (float | None, optional): Sustained estimated tokens (prompt plus `max_tokens`), None for no limit. Defaults to None.
+        burst_seconds (float, optional): Bucket size in seconds of the sustained rate. Defaults to 10.
+    """
+    __slots__ = ('name', 'weight', 'requests_per_second', 'tokens_per_minute', 'burst_seconds')
+
+    def __init__(self, name:str, weight:float=1.0, requests_per_second:float|None=None,
+                 tokens_per_minute:float|None=None, burst_seconds:float=10.0):
+        if weight <= 0:
+            raise ValueError(f'Weight of tenant {name!r} must be positive')
+        self.name = name
+        self.weight = weight
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+
+    @classmethod
+    def from_config(cls, name:str, config:dict) -> "TenantPolicy":
+        return cls(
+            name,
+            weight=float(config.get('weight', 1)),
+            requests_per_second=float(config['requests_per_second']) if config.get('requests_per_second') else None,
+            tokens_per_minute=float(config['tokens_per_minute']) if config.get('tokens_per_minute') else None,
+            burst_seconds=float(config.get('burst_seconds', 10))
+        )
+
+
+class TenantStats(TypedDict):
+    admitted:int
+    rate_limited:int
+    rejected:int
+    tokens:int
+    wait_seconds_total:float
+    wait_seconds_max:float
+
+
+class TenantState:
+    __slots__ = ('policy', 'requests', 'tokens', 'stats')
+
+    def __init__(self, policy:TenantPolicy, now:float):
+        self.policy = policy
+        self.requests = None
+        self.tokens = None
+        if policy.requests_per_second:
+            rate = policy.requests_per_second
+            self.requests = TokenBucket(rate, max(1.0, rate * policy.burst_seconds), now)
+        if policy.tokens_per_minute:
+            rate = policy.tokens_per_minute / 60
+            self.tokens = TokenBucket(rate, max(1.0, rate * policy.burst_seconds), now)
+        self.stats:TenantStats = {'admitted': 0, 'rate_limited': 0, 'rejected': 0, 'tokens': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+
+    @property
+    def idle(self) -> bool:
+        return all(bucket is None or bucket.full for bucket in (self.requests, self.tokens))
+
+
+class FairTurn:
+    """A dispatched request of a `ModelScheduler`, `release` is idempotent like `ReplicaLease.release`"""
+    __slots__ = ('scheduler', '_released')
+
+    def __init__(self, scheduler:"ModelScheduler|None"):
+        self.scheduler = scheduler
+        self._released = scheduler is None
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.scheduler.release()
+
+
+class ModelScheduler:
+    """Weighted fair queue in front of the llama-server slots of one model.
+
+    Self-clocked fair queueing: a request of tenant t with cost c gets the finish tag
+    `max(V, F_t) + c / weight_t`, where `F_t` is the finish tag of the tenant's previous request and `V` the tag of
+    the request dispatched last. Waiting requests are dispatched by smallest tag from a heap, so a tenant that
+    keeps many requests queued pushes its own tags ahead and the others are served in between. Push and pop are
+    O(log n); waiters that gave up stay in the heap and are skipped when popped.
+
+    Args:
+        model_name (str): Model name based on the config
+        capacity (Callable[[], int]): Requests the model servers take at once, usually the `--parallel` slots of the ready replicas
+        max_waiting (int): Waiting requests, more are rejected
+        timeout (float): Seconds a request waits for its turn
+    """
+    def __init__(self, model_name:str, capacity:Callable[[], int], max_waiting:int, timeout:float):
+        self.model_name = model_name
+        self._capacity = capacity
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.in_service = 0
+        self.waiting = 0
+        self.dispatched = 0
+        self._virtual = 0.0
+        self._finish:dict[str, float] = {}
+        # pruned once it has doubled since the last prune, so each call pays O(1) amortized
+        self._prune_at = 4096
+        self._heap:list[tuple[float, int, asyncio.Future]] = []
+        self._seq = 0
+
+    def _tag(self, tenant:str, cost:float, weight:float) -> float:
+        finish = max(self._virtual, self._finish.get(tenant, 0.0)) + cost / weight
+        self._finish[tenant] = finish
+        if len(self._finish) > self._prune_at:
+            # a tag behind the virtual time counts the same as no tag
+            self._finish = {name: tag for name, tag in self._finish.items() if tag > self._virtual}
+            self._prune_at = max(4096, 2 * len(self._finish))
+        return finish
+
+    async def acquire(self, tenant:str, cost:float, weight:float=1.0) -> FairTurn:
+        """Wait for the turn of a request
+
+        Args:
+            tenant (str): Tenant name
+            cost (float): Estimated tokens of the request
+            weight (float, optional): Share of the tenant. Defaults to 1.
+
+        Raises:
+            ModelBusy: If too many requests are waiting, or the turn did not come within `timeout`
+
+        Returns:
+            FairTurn: Must be released when the request is done
+        """
+        finish = self._tag(tenant, max(cost, 1.0), weight)
+        if not self.waiting and self.in_service < self._capacity():
+            self._virtual = finish
+            self.in_service += 1
+            self.dispatched += 1
+            return FairTurn(self)
+        if self.waiting >= self.max_waiting:
+            raise ModelBusy(self.model_name, retry_after=max(1, round(self.timeout / 4)))
+        waiter = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        heapq.heappush(self._heap, (finish, self._seq, waiter))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # the turn was handed over while the request gave up, pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self.waiting -= 1
+                self._compact()
+            if isinstance(e, asyncio.TimeoutError):
+                raise ModelBusy(self.model_name, retry_after=max(1, round(self.timeout / 4)))
+            raise
+        return FairTurn(self)
+
+    def _compact(self):
+        if len(self._heap) > 2 * self.waiting + 64:
+            self._heap = [entry for entry in self._heap if not entry[2].done()]
+            heapq.heapify(self._heap)
+
+    def release(self):
+        self.in_service -= 1
+        self.dispatch()
+
+    def dispatch(self):
+        """Hand out free capacity to the waiting requests, call it whenever the capacity grows"""
+        capacity = self._capacity()
+        while self._heap and self.in_service < capacity:
+            finish, _, waiter = heapq.heappop(self._heap)
+            if waiter.done():
+                continue
+            self._virtual = finish
+            self.waiting -= 1
+            self.in_service += 1
+            self.dispatched += 1
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            'capacity': self._capacity(),
+            'in_service': self.in_service,
+            'waiting': self.waiting,
+            'dispatched': self.dispatched,
+        }
+
+
+class FairShare:
+    """Per tenant rate limits and weighted fair queueing of the requests of every model.
+
+    Tenants are told apart by a request header, the API key in `Authorization` by default. Configured tenants list
+    their keys, any other key is a tenant of its own with the default policy, requests without the header share
+    the `anonymous` tenant.
+
+    Args:
+        tenants (dict[str, TenantPolicy]): Policy by header value
+        default (TenantPolicy): Policy of unknown tenants, its name is replaced per tenant
+        capacity (Callable[[str], int]): Requests a model takes at once, by model name
+        header (str, optional): Header identifying the tenant. Defaults to `Authorization`.
+        max_waiting (int, optional): Waiting requests per model. Defaults to 256.
+        timeout (float, optional): Seconds a request waits for its turn. Defaults to 120.
+        default_max_tokens (int, optional): Completion tokens assumed when a request has no `max_tokens`. Defaults to 256.
+        clock (Callable[[], float], optional): Monotonic clock of the token buckets. Defaults to `time.monotonic`.
+    """
+    def __init__(self, tenants:dict[str, TenantPolicy], default:TenantPolicy, capacity:Callable[[str], int],
+                 header:str='Authorization', max_waiting:int=256, timeout:float=120.0, default_max_tokens:int=256,
+                 clock:Callable[[], float]=time.monotonic):
+        self.header = header
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.default_max_tokens = default_max_tokens
+        self._policies = tenants
+        self._default = default
+        self._capacity = capacity
+        self._clock = clock
+        self._tenants:dict[str, TenantState] = {}
+        self._prune_at = 10_000
+        self._schedulers:dict[str, ModelScheduler] = {}
+
+    def tenant_name(self, value:str|None) -> str:
+        """Tenant of a request from its header value"""
+        if not value:
+            return 'anonymous'
+        if value.lower().startswith('bearer '):
+            value = value[7:].strip()
+        policy = self._policies.get(value)
+        if policy is not None:
+            return policy.name
+        # never expose the key itself in stats and metrics
+        return 'key-' + hashlib.sha256(value.encode()).hexdigest()[:12]
+
+    def _state(self, tenant:str) -> TenantState:
+        state = self._tenants.get(tenant)
+        if state is None:
+            policy = next((policy for policy in self._policies.values() if policy.name == tenant), None)
+            if policy is None:
+                default = self._default
+                policy = TenantPolicy(tenant, default.weight, default.requests_per_second, default.tokens_per_minute, default.burst_seconds)
+            if len(self._tenants) > self._prune_at:
+                # tenants back to a full bucket behave as new ones, pruned again once the rest has doubled
+                self._tenants = {name: state for name, state in self._tenants.items() if not state.idle}
+                self._prune_at = max(10_000, 2 * len(self._tenants))
+            state = self._tenants[tenant] = TenantState(policy, self._clock())
+        return state
+
+    def estimate_tokens(self, body:dict|None, content_length:int) -> int:
+        """Prompt tokens from the body size plus the completion tokens the request asks for"""
+        tokens = content_length // BYTES_PER_TOKEN
+        if body is not None and ('messages' in body or 'prompt' in body):
+            tokens += int(body.get('max_tokens') or body.get('max_completion_tokens') or body.get('n_predict') or self.default_max_tokens)
+        return max(tokens, 1)
+
+    def check(self, tenant:str, tokens:int):
+        """Charge one request of `tokens` estimated tokens to the tenant's rate limits
+
+        Raises:
+            RateLimited: If the tenant is over its request or token rate, nothing is charged then
+        """
+        state = self._state(tenant)
+        now = self._clock()
+        wait = 0.0
+        if state.requests is not None:
+            wait = state.requests.wait_time(1, now)
+        if state.tokens is not None:
+            wait = max(wait, state.tokens.wait_time(tokens, now))
+        if wait > 0:
+            state.stats['rate_limited'] += 1
+            raise RateLimited(tenant, retry_after=max(1, round(wait + 0.5)))
+        if state.requests is not None:
+            state.requests.take(1)
+        if state.tokens is not None:
+            state.tokens.take(tokens)
+        state.stats['tokens'] += tokens
+
+    def scheduler(self, model_name:str) -> ModelScheduler:
+        scheduler = self._schedulers.get(model_name)
+        if scheduler is None:
+            scheduler = self._schedulers[model_name] = ModelScheduler(
+                model_name, lambda: self._capacity(model_name), self.max_waiting, self.timeout
+            )
+        return scheduler
+
+    async def acquire(self, model_name:str, tenant:str, tokens:int) -> FairTurn:
+        """Wait for the fair turn of a request on `model_name`, see `ModelScheduler.acquire`"""
+        state = self._state(tenant)
+        start = time.perf_counter()
+        try:
+            turn = await self.scheduler(model_name).acquire(tenant, tokens, state.policy.weight)
+        except ModelBusy:
+            state.stats['rejected'] += 1
+            raise
+        waited = time.perf_counter() - start
+        state.stats['admitted'] += 1
+        state.stats['wait_seconds_total'] += waited
+        state.stats['wait_seconds_max'] = max(state.stats['wait_seconds_max'], waited)
+        return turn
+
+    def dispatch(self, model_name:str):
+        scheduler = self._schedulers.get(model_name)
+        if scheduler is not None:
+            scheduler.dispatch()
+
+    def stats(self) -> dict:
+        return {
+            'models': {model_name: scheduler.stats() for model_name, scheduler in self._schedulers.items()},
+            'tenants': {
+                tenant: {**state.stats, 'wait_seconds_total': round(state.stats['wait_seconds_total'], 3), 'wait_seconds_max': round(state.stats['wait_seconds_max'], 3)}
+                for tenant, state in self._tenants.items()
+            },
+        }
@@ -0,0 +1,138 @@
+import math
+from collections import deque
+from typing import Iterable, TypedDict
+
+
+class ModelGroup:
+    """Models that may answer each other's requests
+
+    Args:
+        models (list[str]): Members, in order of preference as a substitute
+        tags (Iterable[str] | None, optional): Request tags that may be served by another member, None for every request. Defaults to None.
+    """
+    __slots__ = ('models', 'tags')
+
+    def __init__(self, models:list[str], tags:Iterable[str]|None=None):
+        self.models = models
+        self.tags = frozenset(tags) if tags else None
+
+    @classmethod
+    def from_config(cls, config:dict) -> "ModelGroup":
+        return cls([str(model_name) for model_name in config.get('models') or []], config.get('tags'))
+
+    def allows(self, tags:frozenset[str]) -> bool:
+        return self.tags is None or not self.tags.isdisjoint(tags)
+
+
+class LatencyWindow:
+    """Time to first chunk of the last requests to a model, the hedging delay is a quantile of it"""
+    __slots__ = ('samples',)
+
+    def __init__(self, size:int):
+        self.samples:deque[float] = deque(maxlen=size)
+
+    def quantile(self, q:float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class FallbackStats(TypedDict):
+    substituted:int
+    hedged:int
+    hedge_wins:int
+
+
+class ModelFallback:
+    """Equivalence groups of models. A request for a model that would wait longer than `slo` for its cold start is
+    served by a warm member of its group while the requested model starts in the background, and with hedging a
+    request to a warm model that has no first chunk after the `hedge_quantile` of its recent latencies is sent to a
+    second member too, the first to answer wins.
+
+    Requests are tagged with a comma separated header, a group with `tags` only lends its members to requests
+    carrying one of them, e.g. `interactive` ones that would rather have any answer now than the requested model later.
+
+    Args:
+        groups (list[ModelGroup]): Equivalence groups
+        slo (float, optional): Seconds a request may wait for a cold start. Defaults to 2.
+        tag_header (str, optional): Header with the tags of a request. Defaults to `X-Request-Tags`.
+        hedge_quantile (float | None, optional): Latency quantile after which a request is hedged, None disables hedging. Defaults to None.
+        min_samples (int, optional): Latencies of a model needed before its requests are hedged. Defaults to 20.
+        window (int, optional): Latencies kept per model. Defaults to 200.
+    """
+    def __init__(self, groups:list[ModelGroup], slo:float=2.0, tag_header:str='X-Request-Tags',
+                 hedge_quantile:float|None=None, min_samples:int=20, window:int=200):
+        self.groups = groups
+        self.slo = slo
+        self.tag_header = tag_header
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies:dict[tuple[str, bool], LatencyWindow] = {}
+        self._stats:dict[str, FallbackStats] = {}
+
+    @property
+    def hedging(self) -> bool:
+        return self.hedge_quantile is not None
+
+    def tags_of(self, headers) -> frozenset[str]:
+        value = headers.get(self.tag_header)
+        if not value:
+            return frozenset()
+        return frozenset(tag.strip() for tag in value.split(',') if tag.strip())
+
+    def members(self, model_name:str, tags:frozenset[str]) -> list[str]:
+        """Models that may serve a request for `model_name` with the given tags, in order of preference"""
+        members = []
+        for group in self.groups:
+            if model_name not in group.models or not group.allows(tags):
+                continue
+            for member in group.models:
+                if member != model_name and member not in members:
+                    members.append(member)
+        return members
+
+    def should_substitute(self, expected_wait:float|None) -> bool:
+        """Whether a request would wait too long for a cold start, a model that never started is assumed to"""
+        return expected_wait is None or expected_wait > self.slo
+
+    def observe(self, model_name:str, streaming:bool, seconds:float):
+        if not self.hedging:
+            return
+        window = self._latencies.get((model_name, streaming))
+        if window is None:
+            window = self._latencies[(model_name, streaming)] = LatencyWindow(self.window)
+        window.samples.append(seconds)
+
+    def hedge_delay(self, model_name:str, streaming:bool) -> float|None:
+        """Seconds to wait for the first chunk before a request is hedged, None without enough latencies yet"""
+        window = self._latencies.get((model_name, streaming))
+        if not self.hedging or window is None or len(window.samples) < self.min_samples:
+            return None
+        return window.quantile(self.hedge_quantile)
+
+    def _get_stats(self, model_name:str) -> FallbackStats:
+        stats = self._stats.get(model_name)
+        if stats is None:
+            stats = self._stats[model_name] = {'substituted': 0, 'hedged': 0, 'hedge_wins': 0}
+        return stats
+
+    def record_substitute(self, model_name:str):
+        self._get_stats(model_name)['substituted'] += 1
+
+    def record_hedge(self, model_name:str, won:bool):
+        stats = self._get_stats(model_name)
+        stats['hedged'] += 1
+        if won:
+            stats['hedge_wins'] += 1
+
+    def stats(self) -> dict:
+        return {
+            'slo': self.slo,
+            'groups': [{'models': group.models, 'tags': sorted(group.tags) if group.tags else None} for group in self.groups],
+            'hedge_delays': {
+                f'{model_name}{" (stream)" if streaming else ""}': round(delay, 3)
+                for model_name, streaming in self._latencies
+                if (delay := self.hedge_delay(model_name, streaming)) is not None
+            },
+            'models': dict(self._stats)
+        }
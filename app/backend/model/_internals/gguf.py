@@ -0,0 +1,373 @@
+import os
+import re
+import json
+import mmap
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import NamedTuple, TypedDict
+
+from logger import get_logger
+
+logger = get_logger()
+
+GGUF_MAGIC = b'GGUF'
+DEFAULT_ALIGNMENT = 32
+# share of the weights size added for compute buffers, the KV cache is sized from the metadata instead
+COMPUTE_OVERHEAD = 0.05
+
+_SHARD_PAT = re.compile(r'-(\d+)-of-(\d+)\.gguf$', re.IGNORECASE)
+
+# GGUF metadata value types, fixed size ones map to their struct format
+_UINT8, _INT8, _UINT16, _INT16, _UINT32, _INT32, _FLOAT32, _BOOL, _STRING, _ARRAY, _UINT64, _INT64, _FLOAT64 = range(13)
+_SCALAR_FORMATS = {
+    _UINT8: '<B', _INT8: '<b', _UINT16: '<H', _INT16: '<h', _UINT32: '<I', _INT32: '<i',
+    _FLOAT32: '<f', _BOOL: '<?', _UINT64: '<Q', _INT64: '<q', _FLOAT64: '<d',
+}
+_SCALAR_SIZES = {value_type: struct.calcsize(fmt) for value_type, fmt in _SCALAR_FORMATS.items()}
+
+# `general.file_type` values of llama.cpp (enum llama_ftype)
+FILE_TYPES = {
+    0: 'F32', 1: 'F16', 2: 'Q4_0', 3: 'Q4_1', 7: 'Q8_0', 8: 'Q5_0', 9: 'Q5_1', 10: 'Q2_K', 11: 'Q3_K_S',
+    12: 'Q3_K_M', 13: 'Q3_K_L', 14: 'Q4_K_S', 15: 'Q4_K_M', 16: 'Q5_K_S', 17: 'Q5_K_M', 18: 'Q6_K',
+    19: 'IQ2_XXS', 20: 'IQ2_XS', 21: 'Q2_K_S', 22: 'IQ3_XS', 23: 'IQ3_XXS', 24: 'IQ1_S', 25: 'IQ4_NL',
+    26: 'IQ3_S', 27: 'IQ3_M', 28: 'IQ2_S', 29: 'IQ2_M', 30: 'IQ4_XS', 31: 'IQ1_M', 32: 'BF16',
+    36: 'TQ1_0', 37: 'TQ2_0', 38: 'MXFP4_MOE',
+}
+
+# per-shard fields of `GgufInfo` that are summed over the shards of a split model
+_SUMMED_FIELDS = ('parameters', 'tensor_bytes', 'tensor_count')
+
+
+class GgufInfo(TypedDict):
+    architecture:str|None
+    name:str|None
+    parameters:int
+    quantization:str|None
+    context_length:int|None
+    block_count:int|None
+    embedding_length:int|None
+    head_count:int|None
+    head_count_kv:int|None
+    key_length:int|None
+    value_length:int|None
+    tensor_count:int
+    tensor_bytes:int
+    split_count:int
+    complete:bool
+
+
+class GgufError(ValueError):
+    pass
+
+
+class ArrayValue(NamedTuple):
+    """Placeholder for an array value in the metadata, the items themselves are skipped"""
+    item_type:int
+    length:int
+
+
+class _HeaderReader:
+    """Sequential little-endian reader over the mapped header, only the pages it touches are read from disk"""
+    __slots__ = ('buf', 'pos')
+
+    def __init__(self, buf):
+        self.buf = buf
+        self.pos = 0
+
+    def scalar(self, value_type:int):
+        value, = struct.unpack_from(_SCALAR_FORMATS[value_type], self.buf, self.pos)
+        self.pos += _SCALAR_SIZES[value_type]
+        return value
+
+    def u32(self) -> int:
+        return self.scalar(_UINT32)
+
+    def u64(self) -> int:
+        return self.scalar(_UINT64)
+
+    def string(self) -> str:
+        length = self.u64()
+        start = self.pos
+        self.pos += length
+        if self.pos > len(self.buf):
+            raise GgufError('string runs past the end of the file')
+        return bytes(self.buf[start:self.pos]).decode('utf-8', errors='replace')
+
+    def skip_string(self):
+        length = self.u64()
+        self.pos += length
+
+    def value(self, value_type:int):
+        if value_type in _SCALAR_FORMATS:
+            return self.scalar(value_type)
+        if value_type == _STRING:
+            return self.string()
+        if value_type == _ARRAY:
+            item_type = self.u32()
+            count = self.u64()
+            # arrays are mostly the tokenizer vocabulary and merges, only their length is kept
+            if item_type in _SCALAR_SIZES:
+                self.pos += _SCALAR_SIZES[item_type] * count
+            elif item_type == _STRING:
+                for _ in range(count):
+                    self.skip_string()
+            else:
+                for _ in range(count):
+                    self.value(item_type)
+            return ArrayValue(item_type, count)
+        raise GgufError(f'unknown metadata value type {value_type}')
+
+
+def read_gguf_header(path:str) -> tuple[dict, int, int, int]:
+    """Parse the metadata and tensor infos of one GGUF file without reading the tensor data
+
+    Args:
+        path (str): Path to a gguf file or shard
+
+    Raises:
+        GgufError: If the file is not a valid GGUF v2/v3 file
+
+    Returns:
+        tuple[dict, int, int, int]: Metadata (arrays replaced by `ArrayValue`), tensor count, parameter count and tensor data bytes
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 24:
+            raise GgufError('file too small')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:4] != GGUF_MAGIC:
+                raise GgufError('bad magic')
+            reader = _HeaderReader(memoryview(mm))
+            try:
+                reader.pos = 4
+                version = reader.u32()
+                if version < 2:
+                    raise GgufError(f'unsupported GGUF version {version}')
+                tensor_count = reader.u64()
+                kv_count = reader.u64()
+                metadata = {}
+                for _ in range(kv_count):
+                    key = reader.string()
+                    metadata[key] = reader.value(reader.u32())
+
+                parameters = 0
+                for _ in range(tensor_count):
+                    reader.skip_string()
+                    n_dims = reader.u32()
+                    elements = 1
+                    for _ in range(n_dims):
+                        elements *= reader.u64()
+                    parameters += elements
+                    reader.pos += 4 + 8  # ggml type and data offset
+            except struct.error as e:
+                raise GgufError(f'truncated header: {e}')
+            finally:
+                reader.buf.release()
+
+    alignment = int(metadata.get('general.alignment', DEFAULT_ALIGNMENT)) or DEFAULT_ALIGNMENT
+    data_start = (reader.pos + alignment - 1) // alignment * alignment
+    if tensor_count and data_start > size:
+        raise GgufError('tensor data starts past the end of the file')
+    return metadata, tensor_count, parameters, max(size - data_start, 0)
+
+
+def shard_paths(path:str) -> list[str]:
+    """Every shard of a split model given any of its shards, or just `path` for a single file model"""
+    p = Path(path)
+    match = _SHARD_PAT.search(p.name)
+    if not match:
+        return [str(p)]
+    prefix = p.name[:match.start()]
+    width = len(match.group(1))
+    total = int(match.group(2))
+    return [str(p.with_name(f'{prefix}-{i:0{width}d}-of-{match.group(2)}.gguf')) for i in range(1, total + 1)]
+
+
+def _info_from_header(metadata:dict, tensor_count:int, parameters:int, tensor_bytes:int) -> GgufInfo:
+    arch = metadata.get('general.architecture')
+
+    def arch_value(key:str):
+        value = metadata.get(f'{arch}.{key}') if arch else None
+        # some architectures store per layer arrays here, only scalars are used
+        return value if isinstance(value, int) and not isinstance(value, bool) else None
+
+    file_type = metadata.get('general.file_type')
+    return {
+        'architecture': arch,
+        'name': metadata.get('general.name'),
+        'parameters': parameters,
+        'quantization': FILE_TYPES.get(file_type, f'type {file_type}') if file_type is not None else None,
+        'context_length': arch_value('context_length'),
+        'block_count': arch_value('block_count'),
+        'embedding_length': arch_value('embedding_length'),
+        'head_count': arch_value('attention.head_count'),
+        'head_count_kv': arch_value('attention.head_count_kv'),
+        'key_length': arch_value('attention.key_length'),
+        'value_length': arch_value('attention.value_length'),
+        'tensor_count': tensor_count,
+        'tensor_bytes': tensor_bytes,
+        'split_count': int(metadata.get('split.count', 1)),
+        'complete': True,
+    }
+
+
+def kv_cache_bytes(info:GgufInfo, n_ctx:int, bytes_per_value:int=2) -> int:
+    """Size of an f16 KV cache for `n_ctx` tokens, 0 when the model does not describe its attention layout
+
+    Args:
+        info (GgufInfo): Model metadata
+        n_ctx (int): Context size of the server
+        bytes_per_value (int, optional): Size of one cache element. Defaults to 2 (f16).
+
+    Returns:
+        int: KV cache size in bytes
+    """
+    if not (info['block_count'] and info['embedding_length'] and info['head_count']):
+        return 0
+    head_dim = info['embedding_length'] // info['head_count']
+    n_head_kv = info['head_count_kv'] or info['head_count']
+    k = n_head_kv * (info['key_length'] or head_dim)
+    v = n_head_kv * (info['value_length'] or head_dim)
+    return info['block_count'] * n_ctx * (k + v) * bytes_per_value
+
+
+def estimate_model_memory(info:GgufInfo, n_ctx:int) -> int:
+    """Estimate the memory of a loaded model: weights, KV cache for `n_ctx` tokens and compute buffers
+
+    Args:
+        info (GgufInfo): Model metadata
+        n_ctx (int): Context size of the server
+
+    Returns:
+        int: Estimated memory in bytes
+    """
+    return int(info['tensor_bytes'] * (1 + COMPUTE_OVERHEAD)) + kv_cache_bytes(info, n_ctx)
+
+
+class GgufIndex:
+    """Persistent index of GGUF metadata, keyed by file path and invalidated by size and mtime.
+
+    Looking up an unchanged file costs one `stat` per shard. The index is written back to `path` whenever a file
+    had to be parsed, so the next start of the router does not open any model file.
+
+    `get` and `scan` may read headers and write the index, run them off the event loop. They are thread-safe, so
+    several of them can run at once. `cached` never touches the disk and is safe to call from the event loop.
+
+    Args:
+        path (str | None): JSON file the index is stored in, None keeps it in memory only
+    """
+    def __init__(self, path:str|None=None):
+        self.path = path
+        self._files:dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self.parsed = 0
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._files = json.load(f).get('files', {})
+            except (OSError, ValueError) as e:
+                logger.warning(f'Could not load the GGUF index {path}, rebuilding it: {e}')
+
+    def _file_info(self, path:str) -> GgufInfo|None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        entry = self._files.get(path)
+        if entry is not None and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry['info']
+        # parsed outside the lock, a concurrent parse of the same file stores the same entry
+        try:
+            info = _info_from_header(*read_gguf_header(path))
+        except (OSError, GgufError) as e:
+            logger.warning(f'Could not read GGUF header of {path}: {e}')
+            info = None
+        with self._lock:
+            self.parsed += 1
+            self._files[path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'info': info}
+            self._dirty = True
+        return info
+
+    def _merge(self, shards:list[str], infos:list[GgufInfo|None]) -> GgufInfo|None:
+        first = infos[0]
+        if first is None:
+            return None
+        merged:GgufInfo = dict(first)
+        merged['split_count'] = max(first['split_count'], len(shards))
+        merged['complete'] = all(info is not None for info in infos) and len(shards) >= first['split_count']
+        for field in _SUMMED_FIELDS:
+            merged[field] = sum(info[field] for info in infos if info is not None)
+        return merged
+
+    def get(self, path:str) -> GgufInfo|None:
+        """Metadata of a model, summed over all of its shards when it is split
+
+        Args:
+            path (str): Path to the gguf file, the first shard for split models
+
+        Returns:
+            GgufInfo|None: Model metadata, `complete` is False when a shard is missing or unreadable. None if `path` itself is not a readable GGUF file
+        """
+        shards = shard_paths(path)
+        infos = [self._file_info(shard) for shard in shards]
+        self.save()
+        return self._merge(shards, infos)
+
+    def cached(self, path:str) -> GgufInfo|None:
+        """Metadata of a model as last indexed, without reading or even stating the files. Unlike `get` this may be
+        stale, the index is refreshed by `scan` at startup and by `get` when a model is validated before it starts.
+
+        Args:
+            path (str): Path to the gguf file, the first shard for split models
+
+        Returns:
+            GgufInfo|None: Model metadata, None if a shard was never indexed or `path` is not a readable GGUF file
+        """
+        shards = shard_paths(path)
+        entries = [self._files.get(shard) for shard in shards]
+        if any(entry is None for entry in entries):
+            return None
+        return self._merge(shards, [entry['info'] for entry in entries])
+
+    def scan(self, root:str) -> int:
+        """Index every gguf file below `root`
+
+        Args:
+            root (str): Model directory
+
+        Returns:
+            int: Number of files that had to be parsed, the others were unchanged
+        """
+        before = self.parsed
+        for directory, _, files in os.walk(root):
+            for name in files:
+                if name.lower().endswith('.gguf'):
+                    self._file_info(os.path.join(directory, name))
+        self.save()
+        return self.parsed - before
+
+    def save(self):
+        if not self._dirty or self.path is None:
+            return
+        # writers take turns so the last `os.replace` always holds the newest index, each with a tmp file of its own
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps({'version': 1, 'files': self._files})
+                self._dirty = False
+            tmp = None
+            try:
+                fd, tmp = tempfile.mkstemp(prefix=f'{os.path.basename(self.path)}.', suffix='.tmp', dir=os.path.dirname(self.path) or '.')
+                with os.fdopen(fd, 'w') as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                self._dirty = True
+                logger.warning(f'Could not write the GGUF index {self.path}: {e}')
+                if tmp is not None and os.path.exists(tmp):
+                    os.remove(tmp)
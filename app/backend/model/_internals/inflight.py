@@ -0,0 +1,109 @@
+import asyncio
+import time
+from typing import TypedDict
+
+
+class InFlightStats(TypedDict):
+    in_flight:int
+    requests:int
+    idle_seconds:float|None
+
+
+class TrackedRequest:
+    """A request counted by a `RequestTracker`, `release` is idempotent like `ReplicaLease.release`"""
+    __slots__ = ('tracker', 'model_name', '_released')
+
+    def __init__(self, tracker:"RequestTracker", model_name:str|None):
+        self.tracker = tracker
+        self.model_name = model_name
+        self._released = model_name is None
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.tracker._done(self.model_name)
+
+
+class RequestTracker:
+    """Requests in flight per model, from the moment the model is ready for them until the response is fully sent.
+
+    Unlike the replica leases this also counts requests still waiting for a fair queue turn, and it remembers when
+    the last one finished, so a model streaming a long generation is never taken for idle.
+    """
+    def __init__(self):
+        self._in_flight:dict[str, int] = {}
+        self._requests:dict[str, int] = {}
+        self._last_done:dict[str, float] = {}
+        self._idle:dict[str, asyncio.Event] = {}
+
+    def begin(self, model_name:str|None) -> TrackedRequest:
+        """Count a request to a model, pass None for a request that must not be counted"""
+        if model_name is not None:
+            self._in_flight[model_name] = self._in_flight.get(model_name, 0) + 1
+            self._requests[model_name] = self._requests.get(model_name, 0) + 1
+        return TrackedRequest(self, model_name)
+
+    def _done(self, model_name:str):
+        if model_name not in self._in_flight:
+            # forgotten while the request was still running
+            return
+        count = self._in_flight[model_name] - 1
+        self._in_flight[model_name] = count
+        self._last_done[model_name] = time.monotonic()
+        if count == 0 and model_name in self._idle:
+            self._idle[model_name].set()
+
+    def in_flight(self, model_name:str) -> int:
+        return self._in_flight.get(model_name, 0)
+
+    def active(self) -> set[str]:
+        """Models with a request in flight"""
+        return {model_name for model_name, count in self._in_flight.items() if count}
+
+    def idle_seconds(self, model_name:str) -> float|None:
+        """Seconds since the last request of a model finished, 0 while one is in flight and None if none ever did"""
+        if self.in_flight(model_name):
+            return 0.0
+        last_done = self._last_done.get(model_name)
+        return time.monotonic() - last_done if last_done is not None else None
+
+    async def wait_idle(self, model_name:str, timeout:float) -> int:
+        """Wait until no request of a model is in flight
+
+        Args:
+            model_name (str): Model name based on the config.
+            timeout (float): Maximum time to wait in seconds
+
+        Returns:
+            int: Requests still in flight when `timeout` ran out
+        """
+        deadline = time.monotonic() + timeout
+        while self.in_flight(model_name):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = self._idle.get(model_name)
+            if event is None:
+                event = self._idle[model_name] = asyncio.Event()
+            event.clear()
+            try:
+                await asyncio.wait_for(event.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+        return self.in_flight(model_name)
+
+    def forget(self, model_name:str):
+        """Drop the counters of a model that was removed from the config"""
+        for state in (self._in_flight, self._requests, self._last_done, self._idle):
+            state.pop(model_name, None)
+
+    def stats(self) -> dict[str, InFlightStats]:
+        stats = {}
+        for model_name, count in self._in_flight.items():
+            idle = self.idle_seconds(model_name)
+            stats[model_name] = {
+                'in_flight': count,
+                'requests': self._requests[model_name],
+                'idle_seconds': round(idle, 3) if idle is not None else None
+            }
+        return stats
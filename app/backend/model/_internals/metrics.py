@@ -0,0 +1,123 @@
+from bisect import bisect_left
+
+# upper bounds in seconds, fine grained at the low end for router overhead and coarse for cold starts
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _format_value(value:float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(label:str) -> str:
+    return label.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Histogram with fixed buckets and a single label.
+
+    Each label value owns one flat list of per-bucket counts plus the sum, so an observation is a bisect and
+    two in-place additions. Counts are made cumulative only when rendered.
+    """
+    __slots__ = ('name', 'help', 'label', 'buckets', '_series')
+
+    def __init__(self, name:str, help:str, label:str='model', buckets:tuple[float, ...]=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._series:dict[str, list[float]] = {}
+
+    def observe(self, label_value:str, value:float):
+        series = self._series.get(label_value)
+        if series is None:
+            # one slot per bucket, one for +Inf and the running sum
+            series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        bounds = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+        for label_value, series in self._series.items():
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label}}} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{{{label}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with a single label"""
+    __slots__ = ('name', 'help', 'label', '_values')
+
+    def __init__(self, name:str, help:str, label:str='model'):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values:dict[str, float] = {}
+
+    def inc(self, label_value:str, amount:float=1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for label_value, value in self._values.items():
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {_format_value(value)}')
+        return lines
+
+
+class Gauge:
+    """Gauge with a single label, usually set right before rendering from state the router already keeps"""
+    __slots__ = ('name', 'help', 'label', '_values')
+
+    def __init__(self, name:str, help:str, label:str='model'):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values:dict[str, float] = {}
+
+    def set(self, label_value:str, value:float):
+        self._values[label_value] = value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        for label_value, value in self._values.items():
+            lines.append(f'{self.name}{{{self.label}="{_escape(label_value)}"}} {_format_value(value)}')
+        return lines
+
+
+class RouterMetrics:
+    """Every metric exposed on `/metrics`, in the Prometheus text format"""
+    def __init__(self):
+        self.router_overhead = Histogram('llama_router_overhead_seconds', 'Time spent in the router before the request is sent upstream, excluding cold start waits')
+        self.queue_wait = Histogram('llama_router_queue_wait_seconds', 'Time a request waited in the admission queue for a cold start')
+        self.cold_start = Histogram('llama_router_cold_start_seconds', 'Time from spawning a llama-server process until it is healthy')
+        self.upstream_ttft = Histogram('llama_router_upstream_ttft_seconds', 'Time from sending the request upstream until the first response chunk')
+        self.upstream_duration = Histogram('llama_router_upstream_duration_seconds', 'Time from sending the request upstream until the response is fully forwarded')
+        self.fair_wait = Histogram('llama_router_fair_queue_wait_seconds', 'Time a request waited in the fair queue for a free model server slot')
+        self.starts = Counter('llama_router_model_starts_total', 'Model server processes started')
+        self.stops = Counter('llama_router_model_stops_total', 'Model server processes stopped')
+        self.crashes = Counter('llama_router_model_crashes_total', 'Model server processes that exited while serving')
+        self.restarts = Counter('llama_router_model_restarts_total', 'Crashed model servers brought back by the supervisor')
+        self.prestarts = Counter('llama_router_model_prestarts_total', 'Models started ahead of demand by the prefetch scheduler')
+        self.evictions = Counter('llama_router_evictions_total', 'Models stopped to make room under the memory budget')
+        self.substitutions = Counter('llama_router_substitutions_total', 'Requests for a cold model served by a warm model of its group')
+        self.hedges = Counter('llama_router_hedged_requests_total', 'Slow requests also sent to a second model of their group')
+        self.errors = Counter('llama_router_errors_total', 'Errors returned to clients', label='error_code')
+        self.rate_limited = Counter('llama_router_rate_limited_total', 'Requests rejected by the rate limits of their tenant', label='tenant')
+        self.in_flight = Gauge('llama_router_in_flight_requests', 'Requests currently being served by the model servers')
+        self.queued = Gauge('llama_router_queued_requests', 'Requests currently waiting for a cold start')
+        self.ready_replicas = Gauge('llama_router_ready_replicas', 'Healthy llama-server processes')
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.router_overhead, self.queue_wait, self.cold_start, self.upstream_ttft, self.upstream_duration, self.fair_wait,
+                       self.starts, self.stops, self.crashes, self.restarts, self.prestarts, self.evictions, self.substitutions, self.hedges, self.errors, self.rate_limited,
+                       self.in_flight, self.queued, self.ready_replicas):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
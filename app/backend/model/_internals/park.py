@@ -0,0 +1,211 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import TypedDict
+
+from logger import get_logger
+
+logger = get_logger()
+
+PARK_METHODS = ('read', 'advise')
+_READ_CHUNK = 8 * 1024 * 1024
+
+
+class ParkedModel(TypedDict):
+    paths:list[str]
+    bytes:int
+    parked_at:float
+
+
+class ParkingStats(TypedDict):
+    method:str
+    parked:dict[str, ParkedModel]
+    parked_bytes:int
+    max_bytes:int|None
+    parks:int
+    parked_starts:int
+    dropped:int
+    prefetched_bytes:int
+
+
+def warm_files(paths:list[str], method:str='read') -> int:
+    """Pull files into the page cache. Blocking, run it in a worker thread.
+
+    `advise` only asks the kernel for readahead with `POSIX_FADV_WILLNEED`, which some filesystems cap to a few
+    megabytes. `read` additionally reads the files through, so they are resident once this returns.
+
+    Args:
+        paths (list[str]): Files to warm, missing ones are skipped
+        method (str, optional): `read` or `advise`. Defaults to 'read'.
+
+    Returns:
+        int: Bytes of the files that were warmed
+    """
+    total = 0
+    buffer = bytearray(_READ_CHUNK) if method == 'read' else None
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError as e:
+            logger.warning(f'Could not open {path} for prefetching: {e}')
+            continue
+        try:
+            size = os.fstat(fd).st_size
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            if buffer is not None:
+                while os.readv(fd, [buffer]):
+                    pass
+            total += size
+        finally:
+            os.close(fd)
+    return total
+
+
+def drop_files(paths:list[str]):
+    """Tell the kernel the cached pages of `paths` are no longer needed, only clean pages are dropped"""
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+class ModelParking:
+    """Park tier between running and stopped: the server process is gone, so the model holds no VRAM and no
+    process memory, but its GGUF files are kept warm in the page cache.
+
+    llama-server maps the weights with mmap, so a cold start of a parked model is served from memory instead of
+    disk. The files are warmed when the model is parked and again every `refresh_interval` seconds, pages the
+    kernel reclaimed under memory pressure in between are read back. When the parked files exceed `max_bytes`
+    the models parked the longest ago are dropped first.
+
+    Args:
+        max_bytes (int | None): Page cache the parked models may hold, None for no limit
+        refresh_interval (float): Seconds between two refreshes of the parked files
+        method (str, optional): How files are warmed, see `warm_files`. Defaults to 'read'.
+    """
+    def __init__(self, max_bytes:int|None, refresh_interval:float, method:str='read'):
+        if method not in PARK_METHODS:
+            raise ValueError(f'Unknown park method {method}, expected one of {", ".join(PARK_METHODS)}')
+        self.max_bytes = max_bytes
+        self.refresh_interval = refresh_interval
+        self.method = method
+        self._parked:OrderedDict[str, ParkedModel] = OrderedDict()
+        self._task:asyncio.Task|None = None
+        self._warming:set[asyncio.Task] = set()
+        self.parks = 0
+        self.parked_starts = 0
+        self.dropped = 0
+        self.prefetched_bytes = 0
+
+    def is_parked(self, model_name:str) -> bool:
+        return model_name in self._parked
+
+    async def prefetch(self, paths:list[str]) -> int:
+        """Warm `paths` in a worker thread, e.g. for a model that is likely to be requested next
+
+        Returns:
+            int: Bytes of the files that were warmed
+        """
+        warmed = await asyncio.to_thread(warm_files, paths, self.method)
+        self.prefetched_bytes += warmed
+        return warmed
+
+    def park(self, model_name:str, paths:list[str]):
+        """Park a stopped model, its files are warmed in the background
+
+        Args:
+            model_name (str): Model name based on the config
+            paths (list[str]): Every file of the model, all shards for split models
+        """
+        size = 0
+        for path in paths:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                continue
+        self._parked[model_name] = {'paths': paths, 'bytes': size, 'parked_at': time.time()}
+        self._parked.move_to_end(model_name)
+        self.parks += 1
+        dropped = []
+        while self.max_bytes is not None and self.parked_bytes() > self.max_bytes and len(self._parked) > 1:
+            victim, parked = self._parked.popitem(last=False)
+            logger.info(f'Dropping parked model {victim} from the page cache, parked models are over {self.max_bytes} bytes')
+            self.dropped += 1
+            dropped.extend(parked['paths'])
+        logger.info(f'Parking model {model_name}, keeping {size} bytes of model files in the page cache')
+        self._spawn(self._warm(paths, dropped))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._warming.add(task)
+        task.add_done_callback(self._warming.discard)
+
+    async def _warm(self, paths:list[str], dropped:list[str]):
+        try:
+            if dropped:
+                await asyncio.to_thread(drop_files, dropped)
+            await self.prefetch(paths)
+        except Exception as e:
+            logger.warning(f'Could not warm parked model files: {e}')
+
+    def unpark(self, model_name:str) -> bool:
+        """Forget a parked model once it is started again, the running server maps its files from then on
+
+        Returns:
+            bool: Whether the model was parked
+        """
+        if self._parked.pop(model_name, None) is None:
+            return False
+        self.parked_starts += 1
+        return True
+
+    async def refresh(self):
+        """Warm the files of every parked model again"""
+        for model_name, parked in list(self._parked.items()):
+            if model_name in self._parked:
+                await self.prefetch(parked['paths'])
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f'Could not refresh parked models: {e}')
+
+    async def close(self):
+        for task in list(self._warming):
+            task.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def parked_bytes(self) -> int:
+        return sum(parked['bytes'] for parked in self._parked.values())
+
+    def stats(self) -> ParkingStats:
+        return {
+            'method': self.method,
+            'parked': dict(self._parked),
+            'parked_bytes': self.parked_bytes(),
+            'max_bytes': self.max_bytes,
+            'parks': self.parks,
+            'parked_starts': self.parked_starts,
+            'dropped': self.dropped,
+            'prefetched_bytes': self.prefetched_bytes,
+        }
@@ -0,0 +1,219 @@
+import os
+import json
+import math
+import time
+from typing import Callable, Iterable, TypedDict
+
+from logger import get_logger
+
+logger = get_logger()
+
+HOURS = 24
+
+
+class ModelArrivals:
+    """Arrival statistics of a single model, updated in O(1) on every request"""
+    __slots__ = ('first_seen', 'last_seen', 'ewma_gap', 'count', 'hourly')
+
+    def __init__(self):
+        self.first_seen = 0.0
+        self.last_seen = 0.0
+        self.ewma_gap = 0.0
+        self.count = 0
+        self.hourly = [0] * HOURS
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data:dict) -> "ModelArrivals":
+        arrivals = cls()
+        for slot in cls.__slots__:
+            if slot in data:
+                setattr(arrivals, slot, data[slot])
+        return arrivals
+
+
+class PredictionStats(TypedDict):
+    models:dict[str, dict]
+    last_model:str|None
+    recorded:int
+
+
+class PrefetchPlan(TypedDict):
+    start:list[str]
+    warm:list[str]
+    keep:list[str]
+
+
+class DemandPredictor:
+    """Online model of request arrivals, used to start or warm models before they are requested.
+
+    Three signals are kept per model, each updated in O(1) per request:
+    - transitions: how often a request for model B arrives within `window` seconds after the last request went
+      to model A, over every switch away from A
+    - time of day: requests per hour of the day, averaged over the days observed
+    - EWMA of the inter-arrival time, which tracks the rate of an ongoing burst
+
+    Args:
+        window (float, optional): Seconds after the last request of a model in which a switch counts as a transition. Defaults to 120.
+        ewma_alpha (float, optional): Weight of the newest inter-arrival gap. Defaults to 0.2.
+        clock (Callable[[], float], optional): Wall clock, the hour of day is taken from it. Defaults to `time.time`.
+    """
+    def __init__(self, window:float=120.0, ewma_alpha:float=0.2, clock:Callable[[], float]=time.time):
+        self.window = window
+        self.ewma_alpha = ewma_alpha
+        self._clock = clock
+        self._arrivals:dict[str, ModelArrivals] = {}
+        self._transitions:dict[str, dict[str, int]] = {}
+        self._departures:dict[str, int] = {}
+        self._last_model:str|None = None
+        self._last_time = 0.0
+        self.recorded = 0
+
+    def record(self, model_name:str, now:float|None=None):
+        """Count one request of `model_name`"""
+        now = self._clock() if now is None else now
+        arrivals = self._arrivals.get(model_name)
+        if arrivals is None:
+            arrivals = self._arrivals[model_name] = ModelArrivals()
+            arrivals.first_seen = now
+        elif arrivals.count:
+            gap = max(now - arrivals.last_seen, 0.0)
+            arrivals.ewma_gap = gap if arrivals.count == 1 else arrivals.ewma_gap + self.ewma_alpha * (gap - arrivals.ewma_gap)
+        arrivals.last_seen = now
+        arrivals.count += 1
+        arrivals.hourly[time.localtime(now).tm_hour] += 1
+
+        previous = self._last_model
+        if previous is not None and previous != model_name:
+            self._departures[previous] = self._departures.get(previous, 0) + 1
+            if now - self._last_time <= self.window:
+                row = self._transitions.setdefault(previous, {})
+                row[model_name] = row.get(model_name, 0) + 1
+        self._last_model = model_name
+        self._last_time = now
+        self.recorded += 1
+
+    @property
+    def last_model(self) -> str|None:
+        return self._last_model
+
+    def transition_probability(self, model_name:str, now:float|None=None) -> float:
+        """Probability that `model_name` is requested next, given the model of the last request, 0 once the window has passed"""
+        now = self._clock() if now is None else now
+        previous = self._last_model
+        if previous is None or previous == model_name or now - self._last_time > self.window:
+            return 0.0
+        departures = self._departures.get(previous, 0)
+        if not departures:
+            return 0.0
+        return self._transitions.get(previous, {}).get(model_name, 0) / departures
+
+    def arrival_rate(self, model_name:str, now:float|None=None) -> float:
+        """Expected requests per second of `model_name`: the burst rate while a burst is ongoing, else the rate usual for this hour of the day"""
+        now = self._clock() if now is None else now
+        arrivals = self._arrivals.get(model_name)
+        if arrivals is None:
+            return 0.0
+        burst = 0.0
+        if arrivals.count > 1 and arrivals.ewma_gap > 0 and now - arrivals.last_seen <= 3 * arrivals.ewma_gap:
+            burst = 1 / arrivals.ewma_gap
+        days = max((now - arrivals.first_seen) / 86400, 1.0)
+        hourly = arrivals.hourly[time.localtime(now).tm_hour] / (days * 3600)
+        return max(burst, hourly)
+
+    def score(self, model_name:str, horizon:float, now:float|None=None) -> float:
+        """Probability that `model_name` receives a request within the next `horizon` seconds
+
+        Args:
+            model_name (str): Model name based on the config
+            horizon (float): Look ahead in seconds, e.g. the load time of the model
+            now (float | None, optional): Current time, defaults to the predictor clock.
+
+        Returns:
+            float: Score between 0 and 1
+        """
+        now = self._clock() if now is None else now
+        arrival = 1 - math.exp(-self.arrival_rate(model_name, now) * horizon)
+        return max(arrival, self.transition_probability(model_name, now))
+
+    def to_dict(self) -> dict:
+        return {
+            'version': 1,
+            'arrivals': {model_name: arrivals.to_dict() for model_name, arrivals in self._arrivals.items()},
+            'transitions': self._transitions,
+            'departures': self._departures,
+            'last_model': self._last_model,
+            'last_time': self._last_time,
+        }
+
+    def load_dict(self, data:dict):
+        self._arrivals = {model_name: ModelArrivals.from_dict(arrivals) for model_name, arrivals in data.get('arrivals', {}).items()}
+        self._transitions = data.get('transitions', {})
+        self._departures = data.get('departures', {})
+        self._last_model = data.get('last_model')
+        self._last_time = data.get('last_time', 0.0)
+
+    def save(self, path:str):
+        tmp = f'{path}.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f'Could not save the request statistics to {path}: {e}')
+
+    def load(self, path:str):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as f:
+                self.load_dict(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f'Could not load the request statistics from {path}, starting over: {e}')
+
+    def stats(self, horizon:float, now:float|None=None) -> PredictionStats:
+        now = self._clock() if now is None else now
+        return {
+            'models': {
+                model_name: {
+                    'requests': arrivals.count,
+                    'ewma_gap': round(arrivals.ewma_gap, 3),
+                    'score': round(self.score(model_name, horizon, now), 4),
+                }
+                for model_name, arrivals in self._arrivals.items()
+            },
+            'last_model': self._last_model,
+            'recorded': self.recorded,
+        }
+
+
+def plan_prefetch(predictor:DemandPredictor, model_names:Iterable[str], running:set[str], horizon:float,
+                  start_threshold:float, warm_threshold:float, keep_threshold:float, now:float|None=None) -> PrefetchPlan:
+    """Decide which models to act on ahead of demand. Pure, the caller checks the memory budget before starting anything.
+
+    Args:
+        predictor (DemandPredictor): Request statistics
+        model_names (Iterable[str]): Every configured model
+        running (set[str]): Models running or starting
+        horizon (float): Look ahead in seconds
+        start_threshold (float): Score from which a stopped model is started
+        warm_threshold (float): Score from which a stopped model has its files warmed in the page cache
+        keep_threshold (float): Score from which a running model is kept instead of being stopped as idle
+        now (float | None, optional): Current time, defaults to the predictor clock.
+
+    Returns:
+        PrefetchPlan: Models to start (most likely first), to warm and to keep running
+    """
+    plan:PrefetchPlan = {'start': [], 'warm': [], 'keep': []}
+    scores = {model_name: predictor.score(model_name, horizon, now) for model_name in model_names}
+    for model_name, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+        if model_name in running:
+            if score >= keep_threshold:
+                plan['keep'].append(model_name)
+        elif score >= start_threshold:
+            plan['start'].append(model_name)
+        elif score >= warm_threshold:
+            plan['warm'].append(model_name)
+    return plan
@@ -0,0 +1,150 @@
+import os
+import hashlib
+import yaml
+from typing import TypedDict
+
+from .config import parse_size
+from .eviction import get_policy
+from .replica import replica_bounds, resolve_ports
+
+# model keys that shape the server process or the replica pool, a change restarts the model
+RESTART_MODEL_KEYS = ('model_path', 'config', 'port', 'ports', 'port_range', 'replicas', 'min_replicas', 'max_replicas')
+# server keys every model server is spawned with
+SPAWN_SERVER_KEYS = ('host', 'llama_server_path', 'llama_server_command')
+# server keys only read when the router starts
+STARTUP_SERVER_KEYS = (
+    'coordination', 'embedding_cache', 'embedding_batching', 'response_cache', 'session_affinity', 'fair_scheduling',
+    'park', 'predictive_prefetch', 'gpu_telemetry', 'gguf_index_path', 'idle_timeout', 'idle_check_interval',
+    'replica_idle_timeout', 'config_reload', 'fallback'
+)
+
+
+class ConfigDiff(TypedDict):
+    added:list[str]
+    removed:list[str]
+    restarted:list[str]
+    updated:list[str]
+    unchanged:list[str]
+    server:list[str]
+    startup_only:list[str]
+
+
+def _spawn_settings(config:dict, model_name:str) -> dict:
+    server = config['server']
+    model = config['models'][model_name]
+    settings = {key: model.get(key) for key in RESTART_MODEL_KEYS}
+    settings.update({key: server.get(key) for key in SPAWN_SERVER_KEYS})
+    # server wide defaults a model inherits
+    settings['balancer'] = model.get('balancer', server.get('balancer', 'least_outstanding'))
+    settings['ready_pattern'] = model.get('ready_pattern', server.get('ready_pattern'))
+    return settings
+
+
+def diff_config(old:dict, new:dict) -> ConfigDiff:
+    """Compare two configs model by model
+
+    A model is `restarted` when anything its server is spawned with changes, its flags, file, ports or replica
+    counts, or one of the server wide spawn settings. Any other change, e.g. `priority`, `memory` or the queue
+    settings, is `updated` and applies without touching the running server.
+
+    Args:
+        old (dict): Running config
+        new (dict): Config to load
+
+    Returns:
+        ConfigDiff: Model names by kind of change and the changed `server` keys
+    """
+    old_models, new_models = old['models'], new['models']
+    diff:ConfigDiff = {
+        'added': [name for name in new_models if name not in old_models],
+        'removed': [name for name in old_models if name not in new_models],
+        'restarted': [], 'updated': [], 'unchanged': [], 'server': [], 'startup_only': []
+    }
+    for model_name in new_models:
+        if model_name not in old_models:
+            continue
+        if _spawn_settings(old, model_name) != _spawn_settings(new, model_name):
+            diff['restarted'].append(model_name)
+        elif old_models[model_name] != new_models[model_name]:
+            diff['updated'].append(model_name)
+        else:
+            diff['unchanged'].append(model_name)
+    old_server, new_server = old['server'], new['server']
+    diff['server'] = sorted(key for key in old_server.keys() | new_server.keys() if old_server.get(key) != new_server.get(key))
+    diff['startup_only'] = [key for key in diff['server'] if key in STARTUP_SERVER_KEYS]
+    return diff
+
+
+def validate_config(config) -> None:
+    """Check a config before it replaces the running one, so a broken edit never stops a working model
+
+    Raises:
+        ValueError: If the config is malformed, e.g. a model without `model_path` or two models on one port
+    """
+    if not isinstance(config, dict) or not isinstance(config.get('server'), dict) or not isinstance(config.get('models'), dict):
+        raise ValueError('The config needs a `server` and a `models` mapping')
+    ports:dict[int, str] = {}
+    for model_name, model in config['models'].items():
+        if not isinstance(model, dict) or not model.get('model_path') or not isinstance(model.get('config'), list):
+            raise ValueError(f'Model {model_name} needs a `model_path` and a `config` list')
+        try:
+            model_ports = resolve_ports(model, replica_bounds(model)[1])
+        except (KeyError, TypeError):
+            raise ValueError(f'Model {model_name} needs a `port`, `ports` or `port_range`')
+        for port in model_ports:
+            if port in ports:
+                raise ValueError(f'Models {ports[port]} and {model_name} both use port {port}')
+            ports[port] = model_name
+    parse_size(config['server'].get('memory_budget'))
+    get_policy(config['server'].get('eviction_policy', 'lru'))
+
+
+class ConfigWatcher:
+    """Detects changes of the config file by polling. The modification time, size and inode are checked first, the
+    content hash only when they changed, so saving the file unchanged or touching it does not reload anything.
+    """
+    def __init__(self, path:str):
+        self.path = path
+        self._signature = None
+        self._digest = None
+        try:
+            self.read()
+        except ValueError:
+            pass
+
+    def _stat(self) -> tuple[int, int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def changed(self) -> bool:
+        """Whether the content of the file differs from the last `read`. Blocking, run it off the event loop."""
+        try:
+            signature = self._stat()
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            with open(self.path, 'rb') as f:
+                return hashlib.sha256(f.read()).hexdigest() != self._digest
+        except OSError:
+            # in the middle of being replaced, seen on the next poll
+            return False
+
+    def read(self) -> dict:
+        """Load the file and remember its content as the current one, also when it does not parse, so a broken
+        file is reported once and not on every poll
+
+        Raises:
+            ValueError: If the file can't be read or is not valid YAML
+        """
+        try:
+            signature = self._stat()
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            raise ValueError(f'Could not read {self.path}: {e}')
+        self._signature = signature
+        self._digest = hashlib.sha256(data).hexdigest()
+        try:
+            return yaml.safe_load(data)
+        except yaml.YAMLError as e:
+            raise ValueError(f'{self.path} is not valid YAML: {e}')
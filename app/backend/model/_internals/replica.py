@@ -0,0 +1,190 @@
+import time
+import random
+import asyncio
+import httpx
+from typing import Callable
+
+BALANCERS = ('least_outstanding', 'p2c')
+
+
+def resolve_ports(model_config:dict, max_replicas:int) -> list[int]:
+    """Resolve the ports available to the replicas of a model.
+
+    Either an explicit `ports` list, a `port_range` such as `"8080-8083"`, or consecutive ports starting at `port`.
+
+    Args:
+        model_config (dict): Config of a single model
+        max_replicas (int): Maximum number of replicas of the model
+
+    Raises:
+        ValueError: If fewer ports than `max_replicas` are configured
+
+    Returns:
+        list[int]: One port per replica slot
+    """
+    if 'ports' in model_config:
+        ports = [int(port) for port in model_config['ports']]
+    elif 'port_range' in model_config:
+        first, last = (int(port) for port in str(model_config['port_range']).split('-'))
+        ports = list(range(first, last + 1))
+    else:
+        ports = [int(model_config['port']) + i for i in range(max_replicas)]
+    if len(ports) < max_replicas:
+        raise ValueError(f'{max_replicas} replicas need {max_replicas} ports, only {len(ports)} configured')
+    return ports[:max_replicas]
+
+
+def replica_bounds(model_config:dict) -> tuple[int, int]:
+    """Read `replicas` or `min_replicas`/`max_replicas` from a model config
+
+    Args:
+        model_config (dict): Config of a single model
+
+    Returns:
+        tuple[int, int]: Minimum and maximum number of replicas
+    """
+    min_replicas = max(1, int(model_config.get('min_replicas', model_config.get('replicas', 1))))
+    max_replicas = int(model_config.get('max_replicas', min_replicas))
+    return min_replicas, max(min_replicas, max_replicas)
+
+
+class Replica:
+    """A single llama-server process serving a model on its own port"""
+    def __init__(self, model_name:str, index:int, host:str, port:int, client_factory:Callable[[str], httpx.AsyncClient], slots:int=1):
+        self.model_name = model_name
+        self.index = index
+        self.port = port
+        self.base_url = f'http://{host}:{port}'
+        self.proc:asyncio.subprocess.Process|None = None
+        self.watch = None
+        self.ready = False
+        self.in_flight = 0
+        # requests other router workers have in flight on this replica, see `StateBackend`
+        self.remote_in_flight = 0
+        # in-flight requests pinned to each llama-server slot with `id_slot`
+        self.slot_in_flight = [0] * slots
+        self._next_slot = 0
+        self.last_used = time.monotonic()
+        self._client_factory = client_factory
+        self._client:httpx.AsyncClient|None = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Long-lived client with a keep-alive connection pool to this replica"""
+        if self._client is None or self._client.is_closed:
+            self._client = self._client_factory(self.base_url)
+        return self._client
+
+    @property
+    def load(self) -> int:
+        """In-flight requests of every router worker on this replica"""
+        return self.in_flight + self.remote_in_flight
+
+    def free_slot(self) -> int|None:
+        """A slot with no pinned request in flight, None if every slot is busy.
+
+        Slots are handed out round robin so new conversations don't keep overwriting the prompt cache of the same slot.
+        """
+        slots = len(self.slot_in_flight)
+        if self.load >= slots:
+            return None
+        for i in range(slots):
+            slot = (self._next_slot + i) % slots
+            if self.slot_in_flight[slot] == 0:
+                self._next_slot = slot + 1
+                return slot
+        return None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class ReplicaLease:
+    """In-flight slot on a replica, `release` is idempotent so it can be called from every exit path of a request"""
+    __slots__ = ('replica', 'slot', '_released')
+
+    def __init__(self, replica:Replica, slot:int|None=None):
+        self.replica = replica
+        self.slot = slot
+        self._released = False
+        replica.in_flight += 1
+        if slot is not None:
+            replica.slot_in_flight[slot] += 1
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self.replica.client
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.replica.in_flight -= 1
+            if self.slot is not None:
+                self.replica.slot_in_flight[self.slot] -= 1
+            self.replica.last_used = time.monotonic()
+
+
+class ReplicaPool:
+    """Replicas of one model and the dispatch policy between them"""
+    def __init__(self, model_name:str, host:str, ports:list[int], min_replicas:int, max_replicas:int,
+                 balancer:str, client_factory:Callable[[str], httpx.AsyncClient], slots:int=1):
+        if balancer not in BALANCERS:
+            raise ValueError(f'Unknown balancer {balancer!r}, expected one of {list(BALANCERS)}')
+        self.model_name = model_name
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.balancer = balancer
+        self.replicas = [Replica(model_name, i, host, port, client_factory, slots) for i, port in enumerate(ports)]
+        self.scaling = False
+        self._rng = random.Random()
+
+    def ready(self) -> list[Replica]:
+        return [replica for replica in self.replicas if replica.ready]
+
+    def idle_slot(self) -> Replica|None:
+        """First replica slot without a process, None if the pool is at `max_replicas`"""
+        for replica in self.replicas:
+            if replica.proc is None and not replica.ready:
+                return replica
+        return None
+
+    def in_flight(self) -> int:
+        return sum(replica.in_flight for replica in self.replicas)
+
+    def load(self) -> int:
+        return sum(replica.load for replica in self.replicas)
+
+    def pick(self) -> Replica|None:
+        """Pick the replica for the next request
+
+        Returns:
+            Replica|None: Replica with the fewest outstanding requests (or the better of two random ones with `p2c`), None if nothing is ready
+        """
+        ready = self.ready()
+        if not ready:
+            return None
+        if len(ready) == 1:
+            return ready[0]
+        if self.balancer == 'p2c':
+            first, second = self._rng.sample(ready, 2)
+            return first if first.load <= second.load else second
+        return min(ready, key=lambda replica: (replica.load, replica.last_used))
+
+    def wants_scale_up(self, threshold:float) -> bool:
+        """Whether the average in-flight requests per ready replica reached `threshold` and there is room for another replica"""
+        ready = self.ready()
+        if self.scaling or not ready or len(ready) >= self.max_replicas:
+            return False
+        return self.load() / len(ready) >= threshold
+
+    def stats(self) -> dict:
+        return {
+            'min_replicas': self.min_replicas,
+            'max_replicas': self.max_replicas,
+            'replicas': [
+                {'port': replica.port, 'ready': replica.ready, 'in_flight': replica.in_flight, 'remote_in_flight': replica.remote_in_flight}
+                for replica in self.replicas if replica.ready or replica.proc is not None
+            ]
+        }
@@ -0,0 +1,127 @@
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import TypedDict
+
+# request fields that don't change the generated output and are left out of the cache key
+_KEY_IGNORED_FIELDS = frozenset(('user',))
+
+
+class ResponseCacheStats(TypedDict):
+    hits:int
+    misses:int
+    entries:int
+    bytes:int
+    max_bytes:int
+
+
+def is_cacheable(body:dict) -> bool:
+    """Whether a completion request is deterministic, greedy sampling or a fixed seed
+
+    Args:
+        body (dict): Decoded request body
+
+    Returns:
+        bool: True if identical requests produce identical responses
+    """
+    if body.get('temperature') == 0:
+        return True
+    seed = body.get('seed')
+    # llama-server treats -1 as "pick a random seed"
+    return isinstance(seed, int) and seed >= 0
+
+
+def response_key(model_name:str, model_identity:str, path:str, body:dict) -> bytes:
+    """Canonical hash of a completion request. Key order and whitespace of the body don't matter
+
+    Args:
+        model_name (str): Model name based on the config
+        model_identity (str): Identity of the model file, changes when the file is replaced
+        path (str): Endpoint path, completions and chat completions never share entries
+        body (dict): Decoded request body
+
+    Returns:
+        bytes: sha256 digest
+    """
+    canonical = {k: v for k, v in body.items() if k not in _KEY_IGNORED_FIELDS}
+    digest = hashlib.sha256()
+    digest.update(f'{model_name}\0{model_identity}\0{path}\0'.encode())
+    digest.update(json.dumps(canonical, sort_keys=True, separators=(',', ':')).encode())
+    return digest.digest()
+
+
+class CachedResponse:
+    """Stored upstream response, the body of a streaming response is kept as the original SSE chunks"""
+    __slots__ = ('status_code', 'media_type', 'chunks', 'size', 'expires_at')
+
+    def __init__(self, status_code:int, media_type:str|None, chunks:list[bytes], expires_at:float):
+        self.status_code = status_code
+        self.media_type = media_type
+        self.chunks = chunks
+        self.size = sum(len(chunk) for chunk in chunks)
+        self.expires_at = expires_at
+
+    @property
+    def streaming(self) -> bool:
+        return (self.media_type or '').startswith('text/event-stream')
+
+
+class ResponseCache:
+    """Byte bounded LRU of completion responses with a time to live
+
+    Args:
+        max_bytes (int): Total size of the stored bodies
+        ttl (float): Seconds an entry stays valid
+    """
+    def __init__(self, max_bytes:int, ttl:float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries:OrderedDict[bytes, CachedResponse] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _remove(self, key:bytes):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def get(self, key:bytes) -> CachedResponse|None:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key:bytes, status_code:int, media_type:str|None, chunks:list[bytes]):
+        """Store a response, replacing any previous entry for `key`. Bodies bigger than the whole cache are skipped
+
+        Args:
+            key (bytes): Key from `response_key`
+            status_code (int): Upstream status code
+            media_type (str | None): Upstream content type
+            chunks (list[bytes]): Body, in the chunks it was received in
+        """
+        entry = CachedResponse(status_code, media_type, chunks, time.monotonic() + self.ttl)
+        if entry.size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def stats(self) -> ResponseCacheStats:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,117 @@
+import re
+import time
+import asyncio
+from collections import deque
+from typing import Callable
+
+from logger import get_logger
+
+logger = get_logger()
+
+# printed by llama-server once the model is loaded and the main loop starts taking requests,
+# the earlier "HTTP server is listening, hostname: ..." line is printed before the model is loaded
+READY_PATTERN = r'server is listening on'
+
+
+class ProcessWatch:
+    """Watches one llama-server process: drains its output, flags the readiness line and reports its exit.
+
+    The output pipe is always drained, otherwise a chatty server would block once the pipe buffer is full.
+
+    Args:
+        name (str): Label used in log lines, e.g. the model name and port
+        proc (asyncio.subprocess.Process): Process spawned with `stdout=PIPE` and `stderr=STDOUT`
+        on_exit (Callable[[int], None]): Called from the event loop with the return code once the process exits
+        ready_pattern (str, optional): Regex of the readiness line. Defaults to `READY_PATTERN`.
+        tail (int, optional): Output lines kept for crash reports. Defaults to 50.
+        log_output (bool, optional): Forward every output line to the debug log. Defaults to False.
+    """
+    def __init__(self, name:str, proc:asyncio.subprocess.Process, on_exit:Callable[[int], None],
+                 ready_pattern:str=READY_PATTERN, tail:int=50, log_output:bool=False):
+        self.name = name
+        self.proc = proc
+        self.ready = asyncio.Event()
+        self.exited = asyncio.Event()
+        self.output:deque[str] = deque(maxlen=tail)
+        self.started_at = time.monotonic()
+        self._pattern = re.compile(ready_pattern)
+        self._log_output = log_output
+        self._on_exit = on_exit
+        self._reader = asyncio.create_task(self._read()) if proc.stdout is not None else None
+        self._waiter = asyncio.create_task(self._wait())
+
+    async def _read(self):
+        stream = self.proc.stdout
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # line longer than the stream limit, the buffer has been discarded so keep reading
+                continue
+            if not line:
+                return
+            text = line.decode(errors='replace').rstrip()
+            self.output.append(text)
+            if self._log_output:
+                logger.debug(f'[{self.name}] {text}')
+            if not self.ready.is_set() and self._pattern.search(text):
+                self.ready.set()
+
+    async def _wait(self):
+        code = await self.proc.wait()
+        if self._reader is not None:
+            # let the reader pick up the last lines, they usually say why the process died
+            try:
+                await asyncio.wait_for(asyncio.shield(self._reader), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+        self.exited.set()
+        try:
+            self._on_exit(code)
+        except Exception as e:
+            logger.error(f'Exit handler for {self.name} failed: {e}')
+
+    async def wait(self, timeout:float) -> None:
+        """Wait until the process prints its readiness line or exits, at most `timeout` seconds"""
+        if self.ready.is_set() or self.exited.is_set():
+            return
+        waiters = [asyncio.create_task(self.ready.wait()), asyncio.create_task(self.exited.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def last_output(self, lines:int=10) -> str:
+        return '\n'.join(list(self.output)[-lines:])
+
+
+class RestartBackoff:
+    """Exponential restart delay of one model, reset once the model stayed up for `reset_after` seconds
+
+    Args:
+        initial (float): First delay in seconds
+        maximum (float): Delay cap in seconds
+        reset_after (float): Uptime in seconds after which a crash counts as the first one again
+        max_attempts (int): Consecutive failed restarts before giving up
+    """
+    def __init__(self, initial:float=1.0, maximum:float=30.0, reset_after:float=60.0, max_attempts:int=5):
+        self.initial = initial
+        self.maximum = maximum
+        self.reset_after = reset_after
+        self.max_attempts = max_attempts
+        self.attempts = 0
+
+    def next_delay(self, uptime:float) -> float|None:
+        """Delay before the next restart, None once `max_attempts` restarts in a row failed
+
+        Args:
+            uptime (float): Seconds the crashed process had been running
+        """
+        if uptime >= self.reset_after:
+            self.attempts = 0
+        if self.attempts >= self.max_attempts:
+            return None
+        delay = min(self.initial * 2 ** self.attempts, self.maximum)
+        self.attempts += 1
+        return delay
@@ -0,0 +1,217 @@
+import abc
+import time
+import asyncio
+from collections import deque
+from typing import TypedDict
+
+from logger import get_logger
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+logger = get_logger()
+
+
+class GpuReading(TypedDict):
+    index:int
+    name:str
+    memory_used:int
+    memory_total:int
+    utilization:int|None
+    timestamp:float
+
+
+class GpuBackend(abc.ABC):
+    """Source of GPU readings. Every method is blocking and is only called from the sampler thread"""
+    name = 'base'
+
+    @abc.abstractmethod
+    def open(self) -> int:
+        """Initialise the backend
+
+        Returns:
+            int: Number of devices
+        """
+
+    @abc.abstractmethod
+    def read(self) -> list[GpuReading]:
+        ...
+
+    def close(self):
+        pass
+
+
+class NvmlBackend(GpuBackend):
+    """Reads every device through NVML"""
+    name = 'nvml'
+
+    def __init__(self):
+        self._handles = []
+        self._names = []
+
+    def open(self) -> int:
+        if pynvml is None:
+            raise RuntimeError('nvidia-ml-py is not installed')
+        pynvml.nvmlInit()
+        self._handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in range(pynvml.nvmlDeviceGetCount())]
+        # device names never change, read them once instead of on every sample
+        self._names = [pynvml.nvmlDeviceGetName(handle) for handle in self._handles]
+        return len(self._handles)
+
+    def read(self) -> list[GpuReading]:
+        readings = []
+        now = time.time()
+        for i, handle in enumerate(self._handles):
+            info = pynvml.nvmlDeviceGetMemoryInfo(handle)
+            try:
+                utilization = pynvml.nvmlDeviceGetUtilizationRates(handle).gpu
+            except pynvml.NVMLError:
+                utilization = None
+            readings.append({
+                'index': i,
+                'name': self._names[i],
+                'memory_used': info.used,
+                'memory_total': info.total,
+                'utilization': utilization,
+                'timestamp': now
+            })
+        return readings
+
+    def close(self):
+        self._handles = []
+        pynvml.nvmlShutdown()
+
+
+class FakeGpuBackend(GpuBackend):
+    """Synthetic devices for testing and benchmarks without a GPU. Memory use follows a slow sawtooth so readings change over time
+
+    Args:
+        devices (int): Number of fake devices
+        memory_total (int): Memory of each device in bytes
+    """
+    name = 'fake'
+
+    def __init__(self, devices:int=1, memory_total:int=24 * 1024**3):
+        self.devices = devices
+        self.memory_total = memory_total
+        self._samples = 0
+
+    def open(self) -> int:
+        return self.devices
+
+    def read(self) -> list[GpuReading]:
+        self._samples += 1
+        now = time.time()
+        used = self.memory_total * (self._samples % 10) // 10
+        return [
+            {
+                'index': i,
+                'name': f'Fake GPU {i}',
+                'memory_used': used,
+                'memory_total': self.memory_total,
+                'utilization': self._samples * 10 % 100,
+                'timestamp': now
+            }
+            for i in range(self.devices)
+        ]
+
+
+class GpuTelemetry:
+    """Samples GPU readings in the background and serves the latest snapshot without blocking the event loop
+
+    Blocking backend calls run in a worker thread every `interval` seconds. The last `history` readings of each
+    device are kept in a ring buffer. When the backend cannot be opened, e.g. NVML is missing, the sampler stays
+    disabled and every snapshot is empty.
+
+    Args:
+        backend (GpuBackend|None): Reading source, None disables the sampler
+        interval (float): Seconds between two samples
+        history (int): Readings kept per device
+    """
+    def __init__(self, backend:GpuBackend|None, interval:float=2.0, history:int=60):
+        self.backend = backend
+        self.interval = interval
+        self.history = history
+        self.devices = 0
+        self._readings:list[deque[GpuReading]] = []
+        self._task:asyncio.Task|None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.devices > 0
+
+    async def start(self):
+        """Open the backend, take the first sample and keep sampling in the background"""
+        if self.backend is None or self._task is not None:
+            return
+        try:
+            self.devices = await asyncio.to_thread(self.backend.open)
+        except Exception as e:
+            logger.warning(f'Could not read GPUs with the {self.backend.name} backend: {e}. GPU telemetry is disabled.')
+            self.backend = None
+            return
+        self._readings = [deque(maxlen=self.history) for _ in range(self.devices)]
+        logger.info(f'Sampling {self.devices} GPU(s) with the {self.backend.name} backend every {self.interval}s')
+        await self._sample()
+        self._task = asyncio.create_task(self._run())
+
+    async def _sample(self):
+        try:
+            readings = await asyncio.to_thread(self.backend.read)
+        except Exception as e:
+            logger.warning(f'Could not sample GPUs: {e}')
+            return
+        for reading in readings:
+            self._readings[reading['index']].append(reading)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._sample()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.backend is not None and self.enabled:
+            await asyncio.to_thread(self.backend.close)
+            self.devices = 0
+
+    def snapshot(self) -> list[GpuReading]:
+        """Latest reading of every device, empty when telemetry is disabled or nothing has been sampled yet"""
+        return [readings[-1] for readings in self._readings if readings]
+
+    def recent(self, index:int) -> list[GpuReading]:
+        """Readings of one device kept in the ring buffer, oldest first"""
+        if index >= len(self._readings):
+            return []
+        return list(self._readings[index])
+
+
+def make_gpu_backend(name:str|None, fake_devices:int=1, fake_memory:int=24 * 1024**3) -> GpuBackend|None:
+    """Build the GPU backend from its config name
+
+    Args:
+        name (str | None): `nvml`, `fake` or `none`
+        fake_devices (int, optional): Device count of the fake backend. Defaults to 1.
+        fake_memory (int, optional): Memory in bytes of each fake device. Defaults to 24GiB.
+
+    Raises:
+        ValueError: If the backend name is unknown
+
+    Returns:
+        GpuBackend|None: Backend instance, None for `none`
+    """
+    if name in (None, 'none'):
+        return None
+    if name == 'nvml':
+        return NvmlBackend()
+    if name == 'fake':
+        return FakeGpuBackend(fake_devices, fake_memory)
+    raise ValueError(f"Unknown GPU telemetry backend {name!r}, expected one of ['nvml', 'fake', 'none']")
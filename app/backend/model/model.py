@@ -1,15 +1,22 @@
-from fastapi import APIRouter, Request, Depends
-from fastapi.responses import StreamingResponse
+import json
 import time
-import httpx
-import pynvml
+import asyncio
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import StreamingResponse, Response
+from starlette.background import BackgroundTask
 
-from ._internals import ContainerManager, model_config
+from ._internals import ContainerManager, CachedResponse, UpstreamBatchError, model_config, read_model_name, replay_body, embedding_key, key_params, split_embeddings, is_cacheable, response_key
 from logger import get_logger
 
 router = APIRouter()
 logger = get_logger()
 
+EMBEDDINGS_PATH = '/v1/embeddings'
+# names the model that answered, which differs from the requested one when a warm equivalent served it
+SERVED_MODEL_HEADER = 'X-Served-Model'
+COMPLETION_PATHS = ('/v1/completions', '/v1/chat/completions')
+
+
 @router.post('/v1/completions')
 @router.post('/v1/chat/completions')
 @router.post('/v1/embeddings')
@@ -20,42 +27,307 @@ async def chat_proxy_requests(req:Request):
         req (Request): FastAPI incoming request
 
     Returns:
-        dict: Model responses, usually in a format of OpenAI response. See `https://platform.openai.com/docs/api-reference/chat/create`
+        Response: Model responses passed through as-is from the model server, usually in a format of OpenAI response. See `https://platform.openai.com/docs/api-reference/chat/create`
 
     Yields:
         `fastapi.responses.StreamingResponse`: If request streaming response, then will yield FastAPI SSE generator
     """
     global model_config
+    received_at = time.perf_counter()
     CONTAINER_MANAGER:ContainerManager = req.app.state.container_manager
-    body = await req.json()
-    model_name = body.get('model')
+    # only read the body until `model` is found, the raw bytes are forwarded untouched
+    body_stream = req.stream()
+    model_name, consumed = await read_model_name(body_stream)
+    tenant = CONTAINER_MANAGER.tenant_of(req.headers)
+
+    if req.url.path == EMBEDDINGS_PATH and model_name in model_config['models'] and (
+            CONTAINER_MANAGER.embedding_cache is not None or CONTAINER_MANAGER.embedding_batcher is not None):
+        raw = b''.join(consumed) + b''.join([chunk async for chunk in body_stream])
+        if tenant is not None:
+            CONTAINER_MANAGER.check_rate_limit(tenant, CONTAINER_MANAGER.fairness.estimate_tokens(None, len(raw)))
+        return await _embeddings(CONTAINER_MANAGER, model_name, json.loads(raw))
+
+    body = None
+    if req.url.path in COMPLETION_PATHS and model_name in model_config['models'] and (
+            CONTAINER_MANAGER.response_cache is not None or CONTAINER_MANAGER.affinity is not None or CONTAINER_MANAGER.fairness is not None
+            or (CONTAINER_MANAGER.fallback is not None and CONTAINER_MANAGER.fallback.hedging)):
+        # response caching, affinity routing, fair scheduling and hedging need the decoded body, so these routes read it whole instead of streaming it through
+        consumed = [b''.join(consumed) + b''.join([chunk async for chunk in body_stream])]
+        body = json.loads(consumed[0])
+
+    response_cache = CONTAINER_MANAGER.response_cache
+    cache_key = None
+    if response_cache is not None and body is not None and is_cacheable(body) and 'no-cache' not in req.headers.get('cache-control', ''):
+        cache_key = response_key(model_name, CONTAINER_MANAGER.model_identity(model_name), req.url.path, body)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return _replay_response(cached, model_name)
+
+    tokens = 0
+    if tenant is not None:
+        tokens = CONTAINER_MANAGER.fairness.estimate_tokens(body, len(consumed[0]) if body is not None else int(req.headers.get('content-length') or 0))
+        CONTAINER_MANAGER.check_rate_limit(tenant, tokens)
 
     await CONTAINER_MANAGER.update_last_request_time(model_name)
-    
-    logger.info(f'Cold starting server for {model_name}')
-    _succ = await CONTAINER_MANAGER.start_container(model_name)
+    served_model = CONTAINER_MANAGER.substitute(model_name, req.headers)
+    wait_start = time.perf_counter()
+    await CONTAINER_MANAGER.ensure_running(served_model)
+    upstream = _Upstream(CONTAINER_MANAGER, served_model, req, body, consumed, body_stream, tenant, tokens, model_name)
+    upstream.overhead_from = received_at + time.perf_counter() - wait_start
+    hedge = CONTAINER_MANAGER.hedge_plan(served_model, req.headers, body) if body is not None else None
+    if hedge is None:
+        await upstream.open()
+    else:
+        hedge_model, delay = hedge
+        upstream = await _hedged(upstream, hedge_model, delay)
+    resp = upstream.resp
+    headers = {SERVED_MODEL_HEADER: upstream.model_name}
+    if upstream.model_name != model_name:
+        # answered by another model, not stored as an answer of the requested one
+        cache_key = None
+
+    if resp.headers.get('content-type', '').startswith('text/event-stream'):
+        async def stream_response():
+            # forward each chunk as soon as llama-server flushes it. Closing in `finally` also
+            # releases the upstream connection when the client disconnects mid generation
+            captured = [] if cache_key is not None and resp.status_code == 200 else None
+            try:
+                async for chunk in upstream.chunks():
+                    if captured is not None:
+                        captured.append(chunk)
+                    yield chunk
+                # only a stream that ran to the end is stored
+                if captured is not None:
+                    response_cache.put(cache_key, resp.status_code, 'text/event-stream', captured)
+            finally:
+                await upstream.close()
 
-    config = model_config['models'].get(model_name)
-    target_url = f'http://{model_config['server']['host']}:{config['port']}{req.url.path}'
+        return StreamingResponse(stream_response(), status_code=resp.status_code, media_type='text/event-stream', headers=headers, background=BackgroundTask(upstream.close))
 
     try:
-        async with httpx.AsyncClient() as http_client:
-            resp = await http_client.post(
-                url=target_url,
-                json=body,
-                timeout=300.0
+        content = b''.join([chunk async for chunk in upstream.chunks()])
+    finally:
+        await upstream.close()
+    if cache_key is not None and resp.status_code == 200:
+        response_cache.put(cache_key, resp.status_code, resp.headers.get('content-type'), [content])
+    return Response(content=content, status_code=resp.status_code, media_type=resp.headers.get('content-type'), headers=headers)
+
+
+class _Upstream:
+    """A request sent to the servers of one model. Holds its in-flight count, fair queue turn and replica lease until
+    `close`, which is idempotent so every exit path of the request can call it.
+    """
+    def __init__(self, manager:ContainerManager, model_name:str, req:Request, body:dict|None, consumed:list[bytes], body_stream, tenant:str|None, tokens:int, requested:str):
+        self.manager = manager
+        self.model_name = model_name
+        self.req = req
+        self.body = body
+        self.consumed = consumed
+        self.body_stream = body_stream
+        self.tenant = tenant
+        self.tokens = tokens
+        # start of the router's own time for `router_overhead`, only observed for the first attempt of a request
+        self.overhead_from:float|None = None
+        # counted from here, so a stop that begins after `ensure_running` returned waits for this request
+        self.tracked = manager.track_request(model_name)
+        self.requested = requested
+        # a member of the group answering for the requested model is kept from eviction until this is closed
+        self.lent = manager.lend_request(model_name, requested)
+        self.turn = self.lease = self.resp = None
+        self.sent_at:float|None = None
+        self.first:bytes|None = None
+        self._chunks = None
+        self._closed = False
+
+    async def open(self):
+        """Wait for a server slot, send the request and read the first chunk of the answer"""
+        manager = self.manager
+        metrics = manager.metrics
+        req = self.req
+        body = self.body
+        try:
+            turn_start = time.perf_counter()
+            self.turn = await manager.fair_turn(self.model_name, self.tenant, self.tokens)
+            turn_wait = time.perf_counter() - turn_start
+            consumed = self.consumed
+            if body is not None and manager.affinity is not None:
+                self.lease = manager.acquire_affine(self.model_name, req.url.path, body, req.headers.get(manager.session_header))
+                if self.lease.slot is not None and 'id_slot' not in body:
+                    # pin the llama-server slot that holds the prompt cache of this conversation
+                    consumed = [json.dumps({**body, 'id_slot': self.lease.slot, 'cache_prompt': body.get('cache_prompt', True)}).encode()]
+            else:
+                self.lease = manager.acquire(self.model_name)
+            headers = {'content-type': req.headers.get('content-type', 'application/json')}
+            if body is not None:
+                headers['content-length'] = str(len(consumed[0]))
+            elif 'content-length' in req.headers:
+                headers['content-length'] = req.headers['content-length']
+            upstream_req = self.lease.client.build_request(
+                'POST', req.url.path, content=replay_body(consumed, self.body_stream), headers=headers
             )
+            self.sent_at = time.perf_counter()
+            if self.overhead_from is not None:
+                metrics.router_overhead.observe(self.model_name, self.sent_at - self.overhead_from - turn_wait)
+            self.resp = await self.lease.client.send(upstream_req, stream=True)
+            # llama-server sends the headers of a non streaming response together with its body, the
+            # first chunk is the time to first token either way
+            self._chunks = self.resp.aiter_bytes()
+            self.first = await anext(self._chunks, b'')
+            ttft = time.perf_counter() - self.sent_at
+            metrics.upstream_ttft.observe(self.model_name, ttft)
+            manager.record_first_chunk(self.model_name, body, ttft)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def chunks(self):
+        if self.first:
+            yield self.first
+        async for chunk in self._chunks:
+            yield chunk
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        for part in (self.lease, self.turn, self.tracked, self.lent):
+            if part is not None:
+                part.release()
+        if self.resp is not None:
+            await self.resp.aclose()
+            self.manager.metrics.upstream_duration.observe(self.model_name, time.perf_counter() - self.sent_at)
+
+
+    def retarget(self, model_name:str) -> "_Upstream":
+        """The same request, to be sent to another model"""
+        return _Upstream(self.manager, model_name, self.req, self.body, self.consumed, self.body_stream, self.tenant, self.tokens, self.requested)
+
+
+async def _hedged(primary:_Upstream, hedge_model:str, delay:float) -> _Upstream:
+    """Send a request to `primary`, and to `hedge_model` too when no first chunk arrived within `delay` seconds. The
+    first to answer serves the request, the other one is cancelled and closed.
+    """
+    manager = primary.manager
+    tasks = {asyncio.create_task(primary.open()): primary}
+    backup = None
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            backup = primary.retarget(hedge_model)
+            tasks[asyncio.create_task(backup.open())] = backup
+        pending = set(tasks)
+        error = None
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if winner is None and task.exception() is None:
+                    winner = tasks[task]
+                elif error is None:
+                    error = task.exception()
+        if winner is None:
+            raise error
+        if len(tasks) > 1:
+            manager.record_hedge(primary.model_name, won=winner is backup)
+        return winner
+    finally:
+        for task, upstream in tasks.items():
+            if upstream is winner:
+                continue
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            if upstream.sent_at is not None and upstream.first is None:
+                # the slow answer still counts towards the latencies, at least as long as it was waited for
+                manager.record_first_chunk(upstream.model_name, upstream.body, time.perf_counter() - upstream.sent_at)
+            await upstream.close()
+
+
+def _replay_response(cached:CachedResponse, model_name:str) -> Response:
+    """Answer from the response cache without touching the model server, streaming responses replay their stored SSE chunks"""
+    headers = {'X-Cache': 'HIT', SERVED_MODEL_HEADER: model_name}
+    if cached.streaming:
+        async def replay():
+            for chunk in cached.chunks:
+                yield chunk
+        return StreamingResponse(replay(), status_code=cached.status_code, media_type=cached.media_type, headers=headers)
+    return Response(content=cached.chunks[0], status_code=cached.status_code, media_type=cached.media_type, headers=headers)
+
+
+def _json_response(resp) -> Response:
+    return Response(content=resp.content, status_code=resp.status_code, media_type=resp.headers.get('content-type'))
+
 
-            if resp.headers.get('content-type', '').startswith('text/event-stream'):
-                async def stream_response():
-                    async for chunk in resp.aiter_bytes():
-                        yield chunk
+async def _embeddings(manager:ContainerManager, model_name:str, body:dict) -> Response:
+    """Serve `/v1/embeddings` through the embedding cache and the micro-batcher, whichever are enabled.
 
-                return StreamingResponse(stream_response(), media_type='text/event-stream')
+    Cached inputs are answered directly, so a request where every input hits does not keep the model loaded. The
+    remaining inputs are coalesced with concurrent requests by the batcher, or sent upstream as one call.
+    """
+    cache = manager.embedding_cache
+    batcher = manager.embedding_batcher
+    items = body.get('input')
+    single = isinstance(items, str) or (isinstance(items, list) and bool(items) and isinstance(items[0], int))
+    items = [items] if single else items
+    if not items or not isinstance(items, list) or body.get('encoding_format', 'float') != 'float':
+        await manager.update_last_request_time(model_name)
+        await manager.ensure_running(model_name)
+        tracked = manager.track_request(model_name)
+        try:
+            return _json_response(await manager.post_json(model_name, EMBEDDINGS_PATH, body))
+        finally:
+            tracked.release()
+
+    params = key_params(body)
+    results = [None] * len(items)
+    if cache is not None:
+        identity = manager.model_identity(model_name)
+        keys = [embedding_key(model_name, identity, item, params) for item in items]
+        results = [cache.get(key) for key in keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+    # an input repeated within the request is fetched and stored once
+    duplicates:dict[int, int] = {}
+    if cache is not None:
+        first:dict[bytes, int] = {}
+        for i in missing:
+            if first.setdefault(keys[i], i) != i:
+                duplicates[i] = first[keys[i]]
+        missing = [i for i in missing if i not in duplicates]
+
+    if missing:
+        await manager.update_last_request_time(model_name)
+        await manager.ensure_running(model_name)
+        tracked = manager.track_request(model_name)
+        try:
+            if batcher is not None and len(missing) < batcher.max_batch:
+                try:
+                    fetched = await asyncio.gather(*(batcher.submit(model_name, params, body, items[i]) for i in missing))
+                except UpstreamBatchError as e:
+                    return _json_response(e.response)
             else:
-                return resp.json()
-    except Exception:
-        raise
+                resp = await manager.post_json(model_name, EMBEDDINGS_PATH, {**body, 'input': [items[i] for i in missing]})
+                if resp.status_code != 200:
+                    return _json_response(resp)
+                fetched = split_embeddings(resp.json(), [items[i] for i in missing])
+        finally:
+            tracked.release()
+        for i, (vector, tokens) in zip(missing, fetched):
+            if cache is not None:
+                cache.put(keys[i], vector, tokens)
+            results[i] = (vector, tokens)
+        for i, j in duplicates.items():
+            results[i] = results[j]
+
+    prompt_tokens = sum(tokens for _, tokens in results)
+    content = {
+        'object': 'list',
+        'model': model_name,
+        'data': [
+            {'object': 'embedding', 'index': i, 'embedding': list(vector)}
+            for i, (vector, _) in enumerate(results)
+        ],
+        'usage': {'prompt_tokens': prompt_tokens, 'total_tokens': prompt_tokens}
+    }
+    return Response(content=json.dumps(content), media_type='application/json')
 
 
 @router.get("/health")
@@ -69,36 +341,99 @@ async def health(request:Request):
         dict: Containing proxy server status and running model server status
     """
     manager:ContainerManager = request.app.state.container_manager
-    n_gpu = request.app.state.available_gpus
+    # read the sampler's cached snapshot, NVML is never called from the event loop
     gpu_det = []
-    if n_gpu:
-        for n in range(n_gpu):
-            handle = pynvml.nvmlDeviceGetHandleByIndex(n)
-            name = pynvml.nvmlDeviceGetName(handle)
-            info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-            used = info.used / 1024**3
-            total = info.total / 1024**3
-            gpu_det.append({
-                'gpu_name' : name,
-                'vram_usage': f'{used:.2f}/{total:.2f} GB'
-            })
+    for reading in manager.gpu_telemetry.snapshot():
+        used = reading['memory_used'] / 1024**3
+        total = reading['memory_total'] / 1024**3
+        gpu_det.append({
+            'gpu_name' : reading['name'],
+            'vram_usage': f'{used:.2f}/{total:.2f} GB',
+            'utilization': reading['utilization'],
+            'sampled_at': reading['timestamp']
+        })
+
+    return {
+        "status": "ok",
+        "active_models": [k for k, v in manager._server_status.items() if v['status']],
+        'gpus': gpu_det,
+        'queues': manager.queue_stats(),
+        'memory': manager.memory_stats(),
+        'replicas': manager.replica_stats(),
+        'embedding_cache': manager.embedding_cache.stats() if manager.embedding_cache is not None else None,
+        'embedding_batcher': manager.embedding_batcher.stats() if manager.embedding_batcher is not None else None,
+        'response_cache': manager.response_cache.stats() if manager.response_cache is not None else None,
+        'affinity': manager.affinity_stats(),
+        'parking': manager.parking.stats() if manager.parking is not None else None,
+        'prefetch': manager.prefetch_stats(),
+        'coordination': manager.coordination_stats(),
+        'fairness': manager.fairness_stats(),
+        'in_flight': manager.in_flight_stats(),
+        'fallback': manager.fallback_stats(),
+        'config': manager.config_stats()
+    }
+
+
+@router.get('/metrics')
+async def prometheus_metrics(request:Request):
+    """Latency histograms, lifecycle counters and in-flight gauges in the Prometheus text format
+
+    Args:
+        request (Request): FastAPI incoming request
+
+    Returns:
+        Response: Plain text metrics exposition
+    """
+    manager:ContainerManager = request.app.state.container_manager
+    return Response(content=manager.render_metrics(), media_type='text/plain; version=0.0.4')
+
+
+@router.post('/admin/reload')
+async def reload_config(request:Request, wait:bool=False):
+    """Load config.yaml again. Unchanged models keep running, changed ones are restarted one at a time after they
+    drain and removed ones drain and stop.
+
+    Args:
+        request (Request): FastAPI incoming request
+        wait (bool, optional): Answer once every restart and removal is done instead of right after the config is loaded. Defaults to False.
 
-    return {"status": "ok", "active_models": [k for k, v in manager._server_status.items() if v], 'gpus': gpu_det}
+    Returns:
+        dict: New config version and the models and server settings by kind of change
+    """
+    manager:ContainerManager = request.app.state.container_manager
+    result = await manager.reload_config()
+    if wait:
+        await manager.wait_for_rolls()
+        result['errors'] = manager.config_stats()['errors']
+    return result
+
+
+@router.get('/admin/config')
+async def config_status(request:Request):
+    """Version of the loaded config and the model restarts and removals still to apply"""
+    manager:ContainerManager = request.app.state.container_manager
+    return manager.config_stats()
 
 
 @router.get('/v1/models')
 async def list_models(request:Request):
     manager:ContainerManager = request.app.state.container_manager
     models = []
-    for model, dict_value in manager._server_status.items():
-        config = dict_value.get('config')
-        ctx_size = config.get('--ctx-size') or config.get('-c') or 4096 # llama.cpp default context is 4096
+    for model in manager._server_status:
+        info = manager.model_info(model)
         models.append(
             {
                 'id': model,
                 'object':'model',
                 'owned_by': 'user',
-                'n_ctx': int(ctx_size)
+                'n_ctx': manager.context_size(model),
+                'meta': {
+                    'architecture': info['architecture'],
+                    'quantization': info['quantization'],
+                    'n_params': info['parameters'],
+                    'n_ctx_train': info['context_length'],
+                    'size': info['tensor_bytes']
+                } if info is not None else None
             }
         )
     return {
@@ -0,0 +1,89 @@
+"""Micro-benchmark for routing on the `model` field: full `json` decode + re-encode vs the raw byte scanner.
+
+Run from the `app` directory:
+    python -m bench.body_scan
+    python -m bench.body_scan --corpus ../requests.jsonl
+"""
+import argparse
+import json
+import time
+
+from backend.model._internals.body import scan_model_name
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def build_chat_body(size:int, model_first:bool) -> bytes:
+    # openai-python sends `messages` before `model`, other clients put `model` first
+    turn = {'role': 'user', 'content': 'Summarise the {context} below, keep "quotes" intact. ' * 8}
+    n_turns = max(1, size // len(json.dumps(turn)))
+    body = {'model': 'Gemma3'} if model_first else {}
+    body['messages'] = [turn] * n_turns
+    # a nested `model` key must not be picked up by the scanner
+    body['tools'] = [{'type': 'function', 'function': {'name': 'pick', 'parameters': {'model': {'type': 'string'}}}}]
+    body['model'] = 'Gemma3'
+    body['stream'] = True
+    return json.dumps(body).encode()
+
+
+def build_embedding_body(size:int, model_first:bool) -> bytes:
+    chunk = 'retrieval chunk with some plain text content. ' * 4
+    n_inputs = max(1, size // (len(chunk) + 4))
+    body = {'model': 'Qwen3-Embedding'} if model_first else {}
+    body['input'] = [chunk] * n_inputs
+    body['model'] = 'Qwen3-Embedding'
+    return json.dumps(body).encode()
+
+
+def load_corpus(path:str) -> list[bytes]:
+    with open(path, 'rb') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def run_json(raw:bytes):
+    body = json.loads(raw)
+    json.dumps(body).encode()
+    return body.get('model')
+
+
+def run_scan(raw:bytes):
+    return scan_model_name(raw)
+
+
+def timeit(fn, bodies:list[bytes], min_time:float=0.2) -> float:
+    n = 0
+    start = time.perf_counter()
+    while True:
+        for raw in bodies:
+            fn(raw)
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / (n * len(bodies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', help='JSONL file, one request body per line')
+    args = parser.parse_args()
+
+    suites = []
+    if args.corpus:
+        suites.append(('corpus', load_corpus(args.corpus)))
+    for size in SIZES:
+        for model_first in (True, False):
+            placement = 'first' if model_first else 'last'
+            suites.append((f'chat {size // 1000}KB {placement}', [build_chat_body(size, model_first)]))
+            suites.append((f'embed {size // 1000}KB {placement}', [build_embedding_body(size, model_first)]))
+
+    print(f'{"payload":<24}{"json (us)":>14}{"scan (us)":>14}{"speedup":>10}')
+    for name, bodies in suites:
+        for raw in bodies:
+            assert run_scan(raw) == run_json(raw), f'scanner disagrees with json on {name}'
+        t_json = timeit(run_json, bodies)
+        t_scan = timeit(run_scan, bodies)
+        print(f'{name:<24}{t_json * 1e6:>14.1f}{t_scan * 1e6:>14.1f}{t_json / t_scan:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
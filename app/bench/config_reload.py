@@ -0,0 +1,146 @@
+"""Applying a config change by reload vs by restarting the router, against fake llama-server models.
+
+`--models` models with `--load-ms` load time are running. The change gives one model new flags and adds a new
+model. A restart stops every model and warms them all up again, each paying its cold start. A reload through the
+config watcher only rolls the changed model, while a client keeps sending requests to the unchanged ones. Run
+from the `app` directory:
+    CONFIG_PATH=.. python -m bench.config_reload --models 6 --load-ms 1500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+import yaml
+
+from bench.startup import write_fixture, write_gguf, free_port
+
+
+def change_config(root:str):
+    config_path = os.path.join(root, 'config.yaml')
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    write_gguf(os.path.join(root, 'models', 'added.gguf'), metadata={'general.architecture': 'fake'})
+    config['models']['added'] = {'model_path': 'added.gguf', 'port': free_port(), 'config': ['--fake-load-ms', '100']}
+    config['models']['fake-0']['config'] = config['models']['fake-0']['config'] + ['--fake-slots', '2', '--parallel', '2']
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+
+
+async def timed_restart(root:str) -> float:
+    from backend.model._internals.container import ContainerManager, model_config, load_config
+
+    manager = ContainerManager()
+    await manager.pre_start()
+    change_config(root)
+    start = time.perf_counter()
+    await manager.stop_all_container()
+    new_config = load_config(os.path.join(root, 'config.yaml'))
+    model_config['models'].update(new_config['models'])
+    manager = ContainerManager()
+    await manager.pre_start()
+    elapsed = time.perf_counter() - start
+    await manager.stop_all_container()
+    return elapsed
+
+
+async def timed_reload(root:str, args) -> dict:
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager, watch_config
+    from exceptions import error_handler, BaseError
+
+    manager = ContainerManager()
+    app = FastAPI()
+    app.include_router(router)
+    app.add_exception_handler(BaseError, error_handler)
+    app.state.container_manager = manager
+    await manager.pre_start()
+    watcher = asyncio.create_task(watch_config(manager))
+    latencies:list[float] = []
+    errors = 0
+    done = False
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=300) as client:
+        async def unchanged_traffic():
+            nonlocal errors
+            i = 0
+            while not done:
+                i += 1
+                start = time.perf_counter()
+                resp = await client.post('/v1/chat/completions', json={'model': f'fake-{1 + i % (args.models - 1)}', 'messages': []})
+                if resp.status_code != 200:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        traffic = asyncio.create_task(unchanged_traffic())
+        await asyncio.sleep(0.5)
+        pids = {name: [replica.proc.pid for replica in pool.replicas if replica.proc] for name, pool in manager._pools.items()}
+        start = time.perf_counter()
+        change_config(root)
+        while manager.config_stats()['version'] == 1:
+            await asyncio.sleep(0.01)
+        detected = time.perf_counter() - start
+        resp = await client.post('/v1/chat/completions', json={'model': 'added', 'messages': []})
+        added = time.perf_counter() - start
+        await manager.wait_for_rolls()
+        resp = await client.post('/v1/chat/completions', json={'model': 'fake-0', 'messages': []})
+        rolled = time.perf_counter() - start
+        done = True
+        await traffic
+    watcher.cancel()
+    kept = sum(
+        1 for name, pool in manager._pools.items() if name in pids and name != 'fake-0'
+        and [replica.proc.pid for replica in pool.replicas if replica.proc] == pids[name]
+    )
+    await manager.stop_all_container()
+    latencies.sort()
+    return {
+        'detected': detected, 'added': added, 'rolled': rolled, 'kept': kept, 'errors': errors,
+        'p99': latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] if latencies else float('nan'),
+        'requests': len(latencies)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', type=int, default=6)
+    parser.add_argument('--load-ms', type=float, default=1500)
+    parser.add_argument('--interval', type=float, default=0.5, help='config_reload.interval')
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ('restart', 'reload'):
+        with tempfile.TemporaryDirectory() as root:
+            write_fixture(root, [args.load_ms] * args.models)
+            config_path = os.path.join(root, 'config.yaml')
+            with open(config_path) as f:
+                config = yaml.safe_load(f)
+            config['server']['config_reload'] = {'interval': args.interval}
+            with open(config_path, 'w') as f:
+                yaml.safe_dump(config, f)
+            os.environ['CONFIG_PATH'] = root
+            os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+            from backend.model._internals import container
+            container.model_config.clear()
+            container.model_config.update(container.load_config(config_path))
+            container.config_yaml_path = root
+            container.state_dir_path = root
+            container.model_dir_path = os.environ['MODEL_PATH']
+            results[mode] = asyncio.run(timed_restart(root) if mode == 'restart' else timed_reload(root, args))
+
+    reload = results['reload']
+    print(f'{args.models} models, {args.load_ms:.0f} ms load time, one model changed and one added')
+    print(f'{"step":<40}{"s":>8}')
+    print(f'{"restart: stop all and warm up again":<40}{results["restart"]:>8.2f}')
+    print(f'{"reload: change detected":<40}{reload["detected"]:>8.2f}')
+    print(f'{"reload: added model answered":<40}{reload["added"]:>8.2f}')
+    print(f'{"reload: changed model rolled":<40}{reload["rolled"]:>8.2f}')
+    print(f'unchanged models kept running: {reload["kept"]}/{args.models - 1}, requests to them during the reload: '
+          f'{reload["requests"]}, errors {reload["errors"]}, p99 {reload["p99"] * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
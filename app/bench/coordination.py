@@ -0,0 +1,114 @@
+"""Shared router state between workers: per round cost of the local state backend, and a follower's cold start and
+leader takeover against fake llama-server processes.
+
+The first part fills the state file with `--workers` rows and measures what one sync round of a worker costs: its
+report, the scan of the other rows and the view read. The second part runs a leader and a follower router in two
+processes sharing one state directory, the follower cold starts a model through the leader, then the leader is
+killed with SIGKILL and the follower takes over. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.coordination --workers 8 --models 20
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.startup import write_fixture
+
+
+def bench_backend(args):
+    from backend.model._internals.coordination import LocalStateBackend
+
+    names = [f'model-{i}' for i in range(args.models)]
+    with tempfile.TemporaryDirectory() as path:
+        workers = [LocalStateBackend(path, names) for _ in range(args.workers)]
+        leader = workers[0]
+        leader.try_lead()
+        leader.publish({'models': {name: {'status': True, 'ready': [0], 'pids': [1000 + i]} for i, name in enumerate(names)}})
+        follower = workers[-1]
+        for worker in workers:
+            for i in range(len(names)):
+                worker.report(i, time.time(), [1, 0])
+
+        def timed(fn, rounds:int) -> float:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                fn()
+            return (time.perf_counter() - start) / rounds * 1e6
+
+        report = timed(lambda: [follower.report(i, time.time(), [1, 0]) for i in range(len(names))], 2000)
+        peers = timed(follower.peers, 2000)
+        view = timed(follower.view, 20000)
+        print(f'{args.workers} workers, {args.models} models')
+        print(f'{"step":<24}{"us":>10}')
+        print(f'{"report all models":<24}{report:>10.1f}')
+        print(f'{"scan other workers":<24}{peers:>10.1f}')
+        print(f'{"read unchanged view":<24}{view:>10.2f}')
+        for worker in workers:
+            worker.close()
+
+
+async def worker(role:str, leader_pid:int):
+    from backend.model._internals.container import ContainerManager
+
+    manager = ContainerManager()
+    await manager.start_coordination()
+    if role == 'leader':
+        await asyncio.sleep(3600)
+    start = time.perf_counter()
+    await manager.ensure_running('fake-0')
+    print(f'{"follower cold start":<24}{(time.perf_counter() - start) * 1000:>10.0f}', flush=True)
+    os.kill(leader_pid, signal.SIGKILL)
+    start = time.perf_counter()
+    while not manager.owns_processes:
+        await asyncio.sleep(0.01)
+    print(f'{"takeover":<24}{(time.perf_counter() - start) * 1000:>10.0f}', flush=True)
+    start = time.perf_counter()
+    await manager.ensure_running('fake-0')
+    print(f'{"restart as leader":<24}{(time.perf_counter() - start) * 1000:>10.0f}', flush=True)
+    await manager.stop_all_container()
+
+
+def bench_takeover(args):
+    import yaml
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, [args.load_ms])
+        config_path = os.path.join(root, 'config.yaml')
+        with open(config_path) as f:
+            config = yaml.safe_load(f)
+        config['server']['coordination'] = {'path': os.path.join(root, 'state')}
+        with open(config_path, 'w') as f:
+            yaml.safe_dump(config, f)
+        env = {**os.environ, 'CONFIG_PATH': root, 'MODEL_PATH': os.path.join(root, 'models')}
+        command = [sys.executable, '-m', 'bench.coordination', '--worker']
+        leader = subprocess.Popen([*command, 'leader'], env=env, stderr=subprocess.DEVNULL)
+        # the first worker to open the state becomes the leader
+        time.sleep(2)
+        print(f'\n{"step":<24}{"ms":>10}')
+        follower = subprocess.Popen([*command, 'follower', '--leader-pid', str(leader.pid)], env=env, stderr=subprocess.DEVNULL)
+        follower.wait(timeout=120)
+        leader.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--models', type=int, default=20)
+    parser.add_argument('--load-ms', type=float, default=500)
+    parser.add_argument('--worker', choices=['leader', 'follower'], help=argparse.SUPPRESS)
+    parser.add_argument('--leader-pid', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        asyncio.run(worker(args.worker, args.leader_pid))
+        return
+    bench_backend(args)
+    bench_takeover(args)
+
+
+if __name__ == '__main__':
+    main()
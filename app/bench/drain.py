@@ -0,0 +1,198 @@
+"""Idle reaping and shutdown with draining stops vs the old immediate SIGTERM, against fake llama-server models.
+
+Generation: one model streams a `--tokens` long generation at `--token-ms` per token while the idle reaper runs
+with an `idle_timeout` shorter than the generation. The legacy reaper counts idleness from the request start and
+terminates the model mid stream, the current one waits until nothing is in flight for the whole window.
+
+Shutdown: `--models` running models whose servers take `--stop-ms` to exit after SIGTERM are stopped one after
+another, as the old shutdown did, and all at once by `stop_all_container`.
+
+Eviction: while one model streams the same generation, a request for a second model that only fits in the memory
+budget without the first one evicts it. The cold start waits for the evicted model to drain, for the whole
+`drain_timeout` as before or for the shorter `eviction_drain_timeout`. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.drain --models 6 --stop-ms 1000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+import yaml
+
+from bench.gguf_index import write_gguf
+from bench.startup import write_fixture
+
+
+async def legacy_reaper(manager, idle_time:float, interval:float):
+    """The reaper before in-flight tracking: idle time counted from the last request start, SIGTERM right away"""
+    while True:
+        await asyncio.sleep(interval)
+        for model_name, last_time in list(manager._last_request_time.items()):
+            if time.time() - last_time > idle_time and manager.is_running(model_name):
+                await manager.stop_container(model_name)
+
+
+async def generation(args, legacy:bool) -> dict:
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager, check_stop_idle_containers, model_config
+    from exceptions import error_handler, BaseError
+
+    model_config['server']['drain_timeout'] = 0 if legacy else 60
+    manager = ContainerManager()
+    app = FastAPI()
+    app.include_router(router)
+    app.add_exception_handler(BaseError, error_handler)
+    app.state.container_manager = manager
+    await manager.start_container('fake-0')
+    if legacy:
+        reaper = asyncio.create_task(legacy_reaper(manager, args.idle_timeout, args.interval))
+    else:
+        reaper = asyncio.create_task(check_stop_idle_containers(manager, idle_time=args.idle_timeout))
+
+    chunks = 0
+    done = False
+    start = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=300) as client:
+        body = {'model': 'fake-0', 'messages': [], 'stream': True, 'max_tokens': args.tokens}
+        try:
+            async with client.stream('POST', '/v1/chat/completions', json=body) as resp:
+                async for line in resp.aiter_lines():
+                    if line.startswith('data: {'):
+                        chunks += 1
+                    elif line == 'data: [DONE]':
+                        done = True
+        except httpx.HTTPError:
+            pass
+    streamed = time.perf_counter() - start
+    running_after = manager.is_running('fake-0')
+    while manager.is_running('fake-0'):
+        await asyncio.sleep(0.05)
+    stopped_after = time.perf_counter() - start
+    reaper.cancel()
+    await manager.stop_all_container()
+    return {'chunks': chunks, 'done': done, 'streamed': streamed, 'running_after': running_after, 'stopped_after': stopped_after}
+
+
+async def shutdown(args, concurrent:bool) -> float:
+    from backend.model._internals.container import ContainerManager, model_config
+
+    manager = ContainerManager()
+    await asyncio.gather(*(manager.start_container(model_name) for model_name in model_config['models']))
+    start = time.perf_counter()
+    if concurrent:
+        await manager.stop_all_container()
+    else:
+        for model_name in model_config['models']:
+            await manager.stop_container(model_name)
+    return time.perf_counter() - start
+
+
+async def eviction(args) -> dict:
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager
+    from exceptions import error_handler, BaseError
+
+    manager = ContainerManager()
+    app = FastAPI()
+    app.include_router(router)
+    app.add_exception_handler(BaseError, error_handler)
+    app.state.container_manager = manager
+    await manager.ensure_running('fake-0')
+
+    chunks = 0
+    done = False
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=300) as client:
+        async def stream():
+            nonlocal chunks, done
+            body = {'model': 'fake-0', 'messages': [], 'stream': True, 'max_tokens': args.tokens}
+            try:
+                async with client.stream('POST', '/v1/chat/completions', json=body) as resp:
+                    async for line in resp.aiter_lines():
+                        if line.startswith('data: {'):
+                            chunks += 1
+                        elif line == 'data: [DONE]':
+                            done = True
+            except httpx.HTTPError:
+                pass
+
+        streaming = asyncio.create_task(stream())
+        await asyncio.sleep(0.2)
+        start = time.perf_counter()
+        resp = await client.post('/v1/chat/completions', json={'model': 'fake-1', 'messages': []})
+        cold_start = time.perf_counter() - start
+        await streaming
+    await manager.stop_all_container()
+    return {'cold_start': cold_start, 'status': resp.status_code, 'chunks': chunks, 'done': done}
+
+
+def prepare(root:str, models:int, flags:list[str], server:dict, model_size:int=0):
+    write_fixture(root, [100] * models)
+    if model_size:
+        for i in range(models):
+            write_gguf(os.path.join(root, 'models', f'fake-{i}.gguf'), size=model_size, metadata={'general.architecture': 'fake'})
+    config_path = os.path.join(root, 'config.yaml')
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    config['server'].update(server)
+    for model in config['models'].values():
+        model['config'] += flags
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+    os.environ['CONFIG_PATH'] = root
+    os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+    from backend.model._internals import container
+    container.model_config.clear()
+    container.model_config.update(container.load_config(config_path))
+    container.config_yaml_path = root
+    container.state_dir_path = root
+    container.model_dir_path = os.environ['MODEL_PATH']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=60)
+    parser.add_argument('--token-ms', type=float, default=50)
+    parser.add_argument('--idle-timeout', type=float, default=1.0)
+    parser.add_argument('--interval', type=float, default=0.25, help='server.idle_check_interval')
+    parser.add_argument('--models', type=int, default=6)
+    parser.add_argument('--stop-ms', type=float, default=1000)
+    parser.add_argument('--eviction-drain-timeout', type=float, default=1.0, help='server.eviction_drain_timeout')
+    args = parser.parse_args()
+
+    print(f'generation of {args.tokens} tokens at {args.token_ms:.0f} ms/token, idle_timeout {args.idle_timeout}s')
+    print(f'{"reaper":<10}{"chunks":>8}{"complete":>10}{"stream s":>10}{"running at end":>16}{"stopped at s":>14}')
+    for legacy in (True, False):
+        with tempfile.TemporaryDirectory() as root:
+            prepare(root, 1, ['--fake-token-ms', str(args.token_ms)], {'idle_check_interval': args.interval})
+            result = asyncio.run(generation(args, legacy))
+        print(f'{"legacy" if legacy else "draining":<10}{result["chunks"]:>8}{str(result["done"]):>10}{result["streamed"]:>10.2f}'
+              f'{str(result["running_after"]):>16}{result["stopped_after"]:>14.2f}')
+
+    print(f'\nshutdown of {args.models} models, {args.stop_ms:.0f} ms to exit after SIGTERM')
+    print(f'{"mode":<14}{"s":>8}')
+    for concurrent in (False, True):
+        with tempfile.TemporaryDirectory() as root:
+            prepare(root, args.models, ['--fake-stop-ms', str(args.stop_ms)], {})
+            elapsed = asyncio.run(shutdown(args, concurrent))
+        print(f'{"concurrent" if concurrent else "sequential":<14}{elapsed:>8.2f}')
+
+    generation_s = args.tokens * args.token_ms / 1000
+    print(f'\neviction of a model streaming a {generation_s:.1f}s generation, drain_timeout 60s')
+    print(f'{"eviction drain":<16}{"cold start s":>14}{"chunks":>8}{"complete":>10}')
+    for drain in (60, args.eviction_drain_timeout):
+        with tempfile.TemporaryDirectory() as root:
+            server = {'memory_budget': '15GB', 'drain_timeout': 60, 'eviction_drain_timeout': drain}
+            prepare(root, 2, ['--fake-token-ms', str(args.token_ms)], server, model_size=10 * 1024**3)
+            result = asyncio.run(eviction(args))
+        assert result['status'] == 200, result
+        print(f'{f"{drain:g}s":<16}{result["cold_start"]:>14.2f}{result["chunks"]:>8}{str(result["done"]):>10}')
+
+
+if __name__ == '__main__':
+    main()
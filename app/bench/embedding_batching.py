@@ -0,0 +1,89 @@
+"""Throughput vs latency of `/v1/embeddings` micro-batching.
+
+Concurrent clients each send single-input embedding requests. The fake llama-server charges a fixed overhead per
+call (`--call-ms`) plus a small cost per input (`--item-ms`) and processes one call at a time, so unbatched throughput
+is capped by the per-call overhead. Each row is one batching setting. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.embedding_batching --concurrency 64 --max-wait-ms 1 5 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from bench.startup import write_fixture, free_port
+
+
+async def run_load(app, concurrency:int, duration:float) -> tuple[list[float], float]:
+    samples = []
+    deadline = time.perf_counter() + duration
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=60) as client:
+        async def worker(worker_id:int):
+            n = 0
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                resp = await client.post('/v1/embeddings', json={'model': 'fake-0', 'input': f'chunk {worker_id} {n}'})
+                resp.raise_for_status()
+                samples.append(time.perf_counter() - start)
+                n += 1
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        return samples, time.perf_counter() - start
+
+
+async def run(args):
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager, model_config
+    from exceptions import error_handler, BaseError
+
+    print(f'{args.call_ms} ms per call, {args.item_ms} ms per input, {args.concurrency} concurrent clients, max_batch {args.max_batch}')
+    print(f'{"max_wait_ms":>12}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"avg batch":>11}')
+    for max_wait_ms in [None, *args.max_wait_ms]:
+        config = model_config['models']['fake-0']
+        config['port'] = free_port()
+        config['config'] = ['--fake-service-ms', str(args.call_ms), '--fake-item-ms', str(args.item_ms)]
+        model_config['server']['embedding_batching'] = None if max_wait_ms is None else {'max_batch': args.max_batch, 'max_wait_ms': max_wait_ms}
+
+        manager = ContainerManager()
+        app = FastAPI()
+        app.include_router(router)
+        app.add_exception_handler(BaseError, error_handler)
+        app.state.container_manager = manager
+        await manager.ensure_running('fake-0')
+        try:
+            samples, elapsed = await run_load(app, args.concurrency, args.duration)
+        finally:
+            await manager.stop_all_container()
+
+        samples.sort()
+        batcher = manager.embedding_batcher
+        avg_batch = batcher.items / batcher.batches if batcher and batcher.batches else 1.0
+        label = 'off' if max_wait_ms is None else f'{max_wait_ms:g}'
+        print(f'{label:>12}{len(samples) / elapsed:>10.1f}{statistics.median(samples) * 1000:>10.1f}'
+              f'{samples[int(len(samples) * 0.99) - 1] * 1000:>10.1f}{avg_batch:>11.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--call-ms', type=float, default=10.0)
+    parser.add_argument('--item-ms', type=float, default=0.2)
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, nargs='+', default=[1, 5, 10])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, [0])
+        os.environ['CONFIG_PATH'] = root
+        os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Deterministic replay of a request trace against the eviction policies, next to the legacy idle timer.
+
+The trace is a JSONL file with a `model` field per line and an optional `timestamp` (see `load_trace`), when
+no trace is given a seeded synthetic one is generated. Run from the `app` directory:
+    python -m bench.eviction_sim --budget 16GB
+    python -m bench.eviction_sim --trace trace.jsonl --budget 24GB --model Gemma3:4GB:8 --model Qwen2.5:5GB:12
+"""
+import argparse
+import random
+
+from backend.model._internals.config import parse_size
+from backend.model._internals.eviction import POLICIES, load_trace, simulate
+
+# name: (memory, load seconds)
+DEFAULT_MODELS = {
+    'chat-small': ('3GB', 4.0),
+    'chat-large': ('9GB', 20.0),
+    'coder': ('6GB', 10.0),
+    'embedding': ('1GB', 1.5),
+    'reranker': ('1.5GB', 2.0),
+}
+
+
+def synthetic_trace(models:list[str], n:int, seed:int) -> list[tuple[float, str]]:
+    """Zipf-like popularity with sessions, a model tends to receive a few requests in a row"""
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(models))]
+    trace = []
+    now = 0.0
+    while len(trace) < n:
+        model_name = rng.choices(models, weights)[0]
+        for _ in range(rng.randint(1, 8)):
+            now += rng.expovariate(1 / 20)
+            trace.append((now, model_name))
+    return trace[:n]
+
+
+def simulate_idle_timer(trace:list[tuple[float, str]], models:dict[str, tuple[int, float]], idle_time:float=180, interval:float=120) -> dict:
+    """Legacy behaviour: no budget, a reaper wakes every `interval` seconds and stops models idle for `idle_time`"""
+    running:dict[str, float] = {}
+    cold_starts = hits = 0
+    load_seconds = 0.0
+    peak = 0
+    next_check = interval
+    for now, model_name in trace:
+        while next_check <= now:
+            running = {name: last for name, last in running.items() if next_check - last <= idle_time}
+            next_check += interval
+        if model_name in running:
+            hits += 1
+        else:
+            cold_starts += 1
+            load_seconds += models[model_name][1]
+        running[model_name] = now
+        peak = max(peak, sum(models[name][0] for name in running))
+    return {
+        'policy': 'idle-timer',
+        'requests': len(trace),
+        'hits': hits,
+        'cold_starts': cold_starts,
+        'evictions': 0,
+        'load_seconds': round(load_seconds, 3),
+        'hit_ratio': round(hits / len(trace), 4) if trace else 0.0,
+        'peak_memory': peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace', help='JSONL request trace')
+    parser.add_argument('--budget', default='16GB')
+    parser.add_argument('--model', action='append', default=[], help='name:memory:load_seconds, repeatable')
+    parser.add_argument('--requests', type=int, default=5000, help='Length of the synthetic trace')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    raw_models = DEFAULT_MODELS
+    if args.model:
+        raw_models = {}
+        for spec in args.model:
+            name, memory, load = spec.rsplit(':', 2)
+            raw_models[name] = (memory, float(load))
+    models = {name: (parse_size(memory), load) for name, (memory, load) in raw_models.items()}
+    budget = parse_size(args.budget)
+
+    if args.trace:
+        trace = [(ts, name) for ts, name in load_trace(args.trace) if name in models]
+    else:
+        trace = synthetic_trace(list(models), args.requests, args.seed)
+
+    results = [simulate_idle_timer(trace, models)]
+    results += [simulate(trace, models, budget, policy()) for policy in POLICIES.values()]
+
+    print(f'requests: {len(trace)}, budget: {budget / 1024**3:.1f} GiB')
+    print(f'{"policy":<12}{"hit ratio":>10}{"cold starts":>13}{"evictions":>11}{"load (s)":>11}{"peak (GiB)":>12}')
+    for r in results:
+        print(f'{r["policy"]:<12}{r["hit_ratio"]:>10.3f}{r["cold_starts"]:>13}{r["evictions"]:>11}{r["load_seconds"]:>11.1f}{r["peak_memory"] / 1024**3:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Tail latency of light tenants next to a noisy one, with and without fair scheduling.
+
+One fake llama-server model with `--slots` slots generates `max_tokens` tokens at `--token-ms` each. The noisy
+tenant keeps `--noisy-clients` long requests in flight at all times, the quiet tenants send short requests at a
+Poisson rate (open loop, a slow response does not delay the next request). Without fair scheduling every request
+goes straight to the model server and queues behind the noisy backlog in its slots; with it the router keeps
+the backlog and hands each free slot to the tenant with the smallest weighted finish tag. The router is driven
+in-process through `httpx.ASGITransport`. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.fair_share --duration 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from bench.startup import write_fixture, free_port
+
+
+def percentile(samples:list[float], q:float) -> float:
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def run_load(app, args) -> dict[str, list[float]]:
+    latencies:dict[str, list[float]] = {}
+    errors = 0
+    deadline = time.perf_counter() + args.duration
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=300) as client:
+        async def send(tenant:str, max_tokens:int):
+            nonlocal errors
+            start = time.perf_counter()
+            resp = await client.post(
+                '/v1/chat/completions',
+                json={'model': 'fake-0', 'max_tokens': max_tokens, 'messages': [{'role': 'user', 'content': 'hi'}]},
+                headers={'Authorization': f'Bearer sk-{tenant}'}
+            )
+            if resp.status_code != 200:
+                errors += 1
+                return
+            latencies.setdefault(tenant, []).append(time.perf_counter() - start)
+
+        rng = random.Random(args.seed)
+
+        async def noisy():
+            # staggered, so slots free up one at a time rather than all together
+            await asyncio.sleep(rng.uniform(0, args.noisy_tokens * args.token_ms / 1000))
+            while time.perf_counter() < deadline:
+                await send('noisy', args.noisy_tokens)
+
+        async def quiet(tenant:str):
+            tasks = []
+            while time.perf_counter() < deadline:
+                tasks.append(asyncio.create_task(send(tenant, args.quiet_tokens)))
+                await asyncio.sleep(rng.expovariate(args.quiet_rate))
+            await asyncio.gather(*tasks)
+
+        await asyncio.gather(
+            *(noisy() for _ in range(args.noisy_clients)),
+            *(quiet(f'quiet-{i}') for i in range(args.quiet_tenants))
+        )
+    latencies['errors'] = [errors]
+    return latencies
+
+
+async def run(args):
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager, model_config
+    from exceptions import error_handler, BaseError
+
+    config = model_config['models']['fake-0']
+    config['port'] = free_port()
+    config['config'] = ['--parallel', str(args.slots), '--fake-slots', str(args.slots), '--fake-service-ms', '5', '--fake-token-ms', str(args.token_ms)]
+    print(f'{args.slots} slots, {args.token_ms} ms/token, noisy: {args.noisy_clients} clients x {args.noisy_tokens} tokens, '
+          f'quiet: {args.quiet_tenants} tenants x {args.quiet_rate} req/s x {args.quiet_tokens} tokens')
+    print(f'{"scheduling":<12}{"quiet p50":>11}{"quiet p99":>11}{"quiet max":>11}{"noisy p50":>11}{"noisy req/s":>13}{"errors":>8}')
+    for fair in (False, True):
+        model_config['server']['fair_scheduling'] = {'tenants': {'noisy': {'keys': ['sk-noisy']}}} if fair else None
+        manager = ContainerManager()
+        app = FastAPI()
+        app.include_router(router)
+        app.add_exception_handler(BaseError, error_handler)
+        app.state.container_manager = manager
+        await manager.ensure_running('fake-0')
+        try:
+            latencies = await run_load(app, args)
+        finally:
+            await manager.stop_all_container()
+        quiet = [value for tenant, values in latencies.items() if tenant.startswith('quiet') for value in values]
+        noisy = latencies.get('noisy', [])
+        print(f'{"fair" if fair else "fifo":<12}{percentile(quiet, 0.5) * 1000:>9.0f}ms{percentile(quiet, 0.99) * 1000:>9.0f}ms'
+              f'{max(quiet, default=0) * 1000:>9.0f}ms{statistics.median(noisy) * 1000 if noisy else 0:>9.0f}ms'
+              f'{len(noisy) / args.duration:>13.1f}{latencies["errors"][0]:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--slots', type=int, default=4)
+    parser.add_argument('--token-ms', type=float, default=2)
+    parser.add_argument('--noisy-clients', type=int, default=32)
+    parser.add_argument('--noisy-tokens', type=int, default=256)
+    parser.add_argument('--quiet-tenants', type=int, default=3)
+    parser.add_argument('--quiet-rate', type=float, default=2)
+    parser.add_argument('--quiet-tokens', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, [0])
+        os.environ['CONFIG_PATH'] = root
+        os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""Minimal stand-in for `llama-server` used by the benchmarks. Only needs the standard library.
+
+It accepts the same `-m/--host/--port` arguments the router passes, ignores unknown llama.cpp flags and
+reads its behaviour from extra `--fake-*` flags that can be put in the model `config` list, e.g.
+    config: ["--fake-load-ms", "400"]
+
+Like llama-server it logs to stderr, including the "server is listening on" line once the model is loaded.
+"""
+import argparse
+import ctypes
+import json
+import mmap
+import os
+import signal
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-m', '--model', default='fake.gguf')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--fake-load-ms', type=float, default=0.0, help='Time spent "loading" the model before /health reports ok')
+    parser.add_argument('--fake-service-ms', '--fake-ttft-ms', dest='fake_service_ms', type=float, default=50.0, help='Time spent on each request before the first token, the TTFT of a completion')
+    parser.add_argument('--fake-slots', type=int, default=1, help='Requests processed concurrently, like llama-server --parallel')
+    parser.add_argument('--fake-tokens', type=int, default=8, help='Chunks sent by a streaming completion')
+    parser.add_argument('--fake-token-ms', type=float, default=0.0, help='Time per generated token, a completion generates `max_tokens` tokens if set, else --fake-tokens')
+    parser.add_argument('--fake-tokens-per-sec', type=float, default=None, help='Generation speed, sets --fake-token-ms to 1000 / tokens per second')
+    parser.add_argument('--fake-item-ms', type=float, default=0.0, help='Extra time per input of an embeddings request, on top of the service time')
+    parser.add_argument('--fake-crash-after-ms', type=float, default=None, help='Exit this long after the model is loaded, to simulate a crash')
+    parser.add_argument('--fake-crash-after-requests', type=int, default=None, help='Exit after answering this many requests, to simulate a crash under load')
+    parser.add_argument('--fake-stop-ms', type=float, default=0.0, help='Time spent shutting down after SIGTERM, like freeing a large model')
+    parser.add_argument('--fake-exit-code', type=int, default=1, help='Return code of a simulated crash')
+    parser.add_argument('--fake-quiet', action='store_true', help='Do not print the readiness line, readiness is only visible on /health')
+    parser.add_argument('--fake-disk-mbps', type=float, default=None, help='Also "read" the model file: add the time to load its pages missing from the page cache at this bandwidth, then cache them')
+    parser.add_argument('--fake-embedding-dim', type=int, default=16, help='Size of the returned embedding vectors')
+    args, _ = parser.parse_known_args(argv)
+    if args.fake_tokens_per_sec:
+        args.fake_token_ms = 1000 / args.fake_tokens_per_sec
+    return args
+
+
+class FakeLlamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without this delayed ACKs add ~40ms to every response
+    disable_nagle_algorithm = True
+    server:"FakeLlamaServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status:int, payload:dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_json(404, {'error': {'code': 404, 'message': 'File Not Found'}})
+        elif not self.server.loaded.is_set():
+            # llama-server answers 503 while the model is still loading
+            self.send_json(503, {'error': {'code': 503, 'message': 'Loading model'}})
+        else:
+            self.send_json(200, {'status': 'ok'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not self.server.loaded.is_set():
+            self.send_json(503, {'error': {'code': 503, 'message': 'Loading model'}})
+            return
+        try:
+            if self.path == '/v1/embeddings':
+                self.embeddings(body)
+            elif body.get('stream'):
+                self.stream_completion(body)
+            else:
+                self.completion(body)
+        finally:
+            self.server.answered()
+
+    def completion(self, body:dict):
+        args = self.server.args
+        tokens = self.generated_tokens(body)
+        with self.server.slots:
+            time.sleep((args.fake_service_ms + args.fake_token_ms * tokens) / 1000)
+        self.send_json(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'model': body.get('model', self.server.args.model),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'ok'}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': tokens, 'total_tokens': tokens + 1},
+        })
+
+    def generated_tokens(self, body:dict) -> int:
+        if self.server.args.fake_token_ms and body.get('max_tokens'):
+            return int(body['max_tokens'])
+        return self.server.args.fake_tokens
+
+    def write_chunk(self, data:bytes):
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+
+    def stream_completion(self, body:dict):
+        args = self.server.args
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        with self.server.slots:
+            time.sleep(args.fake_service_ms / 1000)
+            tokens = self.generated_tokens(body)
+            for i in range(tokens):
+                if args.fake_token_ms:
+                    time.sleep(args.fake_token_ms / 1000)
+                chunk = {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion.chunk',
+                    'model': body.get('model', args.model),
+                    'choices': [{'index': 0, 'delta': {'content': f'tok{i} '}, 'finish_reason': 'stop' if i == tokens - 1 else None}],
+                }
+                self.write_chunk(b'data: ' + json.dumps(chunk).encode() + b'\n\n')
+        self.write_chunk(b'data: [DONE]\n\n')
+        self.write_chunk(b'')
+
+    def embeddings(self, body:dict):
+        args = self.server.args
+        items = body.get('input', '')
+        items = [items] if isinstance(items, str) or (items and isinstance(items[0], int)) else items
+        # the service time is charged once per call, like the fixed overhead of a real round-trip and batch setup
+        with self.server.slots:
+            time.sleep((args.fake_service_ms + args.fake_item_ms * len(items)) / 1000)
+        data = []
+        for i, item in enumerate(items):
+            seed = zlib.crc32(json.dumps(item).encode())
+            data.append({'object': 'embedding', 'index': i, 'embedding': [((seed >> j) & 0xff) / 255 for j in range(args.fake_embedding_dim)]})
+        tokens = sum(len(item) for item in items)
+        self.send_json(200, {
+            'object': 'list',
+            'model': body.get('model', args.model),
+            'data': data,
+            'usage': {'prompt_tokens': tokens, 'total_tokens': tokens},
+        })
+
+
+class FakeLlamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 resets connections when a burst of clients arrives right after startup
+    request_queue_size = 128
+
+    def __init__(self, args):
+        super().__init__((args.host, args.port), FakeLlamaHandler)
+        self.args = args
+        self.loaded = threading.Event()
+        self.slots = threading.BoundedSemaphore(args.fake_slots)
+        self._answered = 0
+        self._answered_lock = threading.Lock()
+
+    def answered(self):
+        limit = self.args.fake_crash_after_requests
+        if limit is None:
+            return
+        with self._answered_lock:
+            self._answered += 1
+            if self._answered >= limit:
+                self.crash()
+
+    def crash(self):
+        log('GGML_ASSERT: simulated crash')
+        os._exit(self.args.fake_exit_code)
+
+    def stop(self):
+        log('srv    operator(): cleaning up before exit...')
+        time.sleep(self.args.fake_stop_ms / 1000)
+        os._exit(0)
+
+    def load_model(self):
+        args = self.args
+        log(f'main: HTTP server is listening, hostname: {args.host}, port: {args.port}, http threads: 4')
+        log('main: loading model')
+        if args.fake_disk_mbps and os.path.exists(args.model):
+            read_model(args.model, args.fake_disk_mbps)
+        time.sleep(args.fake_load_ms / 1000)
+        self.loaded.set()
+        log('main: model loaded')
+        if not args.fake_quiet:
+            log(f'main: server is listening on http://{args.host}:{args.port} - starting the main loop')
+        if args.fake_crash_after_ms is not None:
+            time.sleep(args.fake_crash_after_ms / 1000)
+            self.crash()
+
+
+def uncached_bytes(path:str) -> int:
+    """Bytes of `path` not in the page cache, from mincore on Linux. Counts the whole file where mincore is missing."""
+    size = os.path.getsize(path)
+    if size == 0:
+        return 0
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    except (OSError, AttributeError):
+        return size
+    page = mmap.PAGESIZE
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        addr = libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            return size
+        try:
+            vec = ctypes.create_string_buffer((size + page - 1) // page)
+            if libc.mincore(addr, size, vec) != 0:
+                return size
+            return max(size - sum(byte & 1 for byte in vec.raw) * page, 0)
+        finally:
+            libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+
+
+def read_model(path:str, mbps:float):
+    """Simulate loading weights from a slow disk: pay for the uncached bytes, then read the file so it is cached"""
+    missing = uncached_bytes(path)
+    log(f'llama_model_loader: {missing} bytes of {path} not in the page cache')
+    time.sleep(missing / (mbps * 1e6))
+    with open(path, 'rb') as f:
+        while f.read(8 * 1024 * 1024):
+            pass
+
+
+def log(line:str):
+    print(line, file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = FakeLlamaServer(args)
+    threading.Thread(target=server.load_model, daemon=True).start()
+    if args.fake_stop_ms:
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.stop, daemon=True).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Latency of requests for a cold model with and without fallback to a warm equivalent, and tail latency of a busy
+model with and without hedging, against fake llama-server models.
+
+Cold: `--requests` interactive requests arrive at `--rate` per second for `fake-0`, which is stopped and takes
+`--load-ms` to start, while `fake-1` of the same group is warm. Without fallback they all wait for the cold start,
+with it they are served by `fake-1` until `fake-0` is ready.
+
+Hedge: the same arrivals go to a warm `fake-1` with a single slot, so bursts queue behind each other. With hedging,
+a request without a first chunk after the p95 of the recent latencies is also sent to `fake-2`. Run from the `app`
+directory:
+    CONFIG_PATH=.. python -m bench.fallback --load-ms 5000 --requests 200 --rate 20
+"""
+import argparse
+import asyncio
+import collections
+import os
+import random
+import tempfile
+import time
+
+import httpx
+import yaml
+
+from bench.startup import write_fixture
+
+
+async def run(args, model_name:str, warm:list[str]) -> tuple[list[float], collections.Counter]:
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager
+    from exceptions import error_handler, BaseError
+
+    manager = ContainerManager()
+    app = FastAPI()
+    app.include_router(router)
+    app.add_exception_handler(BaseError, error_handler)
+    app.state.container_manager = manager
+    await asyncio.gather(*(manager.start_container(name) for name in warm))
+    latencies:list[float] = []
+    served = collections.Counter()
+    rng = random.Random(0)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=300) as client:
+        async def send():
+            start = time.perf_counter()
+            resp = await client.post(
+                '/v1/chat/completions', json={'model': model_name, 'messages': []}, headers={'X-Request-Tags': 'interactive'}
+            )
+            latencies.append(time.perf_counter() - start)
+            served[resp.headers.get('x-served-model') if resp.status_code == 200 else f'error {resp.status_code}'] += 1
+
+        tasks = []
+        for _ in range(args.requests):
+            tasks.append(asyncio.create_task(send()))
+            await asyncio.sleep(rng.expovariate(args.rate))
+        await asyncio.gather(*tasks)
+    await manager.stop_all_container()
+    latencies.sort()
+    return latencies, served
+
+
+def prepare(root:str, args, fallback:dict|None):
+    write_fixture(root, [args.load_ms, 100, 100])
+    config_path = os.path.join(root, 'config.yaml')
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    config['models']['fake-2']['config'] += ['--fake-slots', '4']
+    if fallback is not None:
+        config['server']['fallback'] = {
+            'slo': args.slo, **fallback,
+            'groups': [{'models': ['fake-0', 'fake-1'], 'tags': ['interactive']}, {'models': ['fake-1', 'fake-2']}]
+        }
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+    os.environ['CONFIG_PATH'] = root
+    os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+    from backend.model._internals import container
+    container.model_config.clear()
+    container.model_config.update(container.load_config(config_path))
+    container.config_yaml_path = root
+    container.state_dir_path = root
+    container.model_dir_path = os.environ['MODEL_PATH']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--load-ms', type=float, default=5000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=15)
+    parser.add_argument('--slo', type=float, default=1.0, help='server.fallback.slo')
+    args = parser.parse_args()
+
+    scenarios = [
+        ('cold, wait', 'fake-0', ['fake-1'], None),
+        ('cold, fallback', 'fake-0', ['fake-1'], {}),
+        ('busy, no hedge', 'fake-1', ['fake-1', 'fake-2'], None),
+        ('busy, hedge', 'fake-1', ['fake-1', 'fake-2'], {'hedge': {'min_samples': 20}}),
+    ]
+    print(f'{args.requests} requests at {args.rate}/s, cold start {args.load_ms:.0f} ms, slo {args.slo}s')
+    print(f'{"scenario":<18}{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}  served by')
+    for name, model_name, warm, fallback in scenarios:
+        with tempfile.TemporaryDirectory() as root:
+            prepare(root, args, fallback)
+            latencies, served = asyncio.run(run(args, model_name, warm))
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1000
+        print(f'{name:<18}{p50:>10.0f}{p99:>10.0f}{latencies[-1] * 1000:>10.0f}  {dict(served)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""GGUF index benchmark: header parsing and index lookups over a directory of large, sparse model shards.
+
+Every file carries a realistic header (a 150k token vocabulary and merges, a few hundred tensor infos) followed by
+a hole up to its full size, so multi-GB shards cost no disk space and reading any tensor data would show up as a
+large slowdown. Reports the cold scan (no index), the warm scan from the persisted index and the per model lookup
+done at startup and by `/v1/models`. Run from the `app` directory:
+    python -m bench.gguf_index --models 4 --shards 3 --shard-gb 8
+"""
+import argparse
+import os
+import statistics
+import struct
+import tempfile
+import time
+
+_STRING, _ARRAY, _UINT32 = 8, 9, 4
+
+
+def _string(value:str) -> bytes:
+    data = value.encode()
+    return struct.pack('<Q', len(data)) + data
+
+
+def _kv(key:str, value) -> bytes:
+    if isinstance(value, str):
+        return _string(key) + struct.pack('<I', _STRING) + _string(value)
+    if isinstance(value, list):
+        return _string(key) + struct.pack('<IIQ', _ARRAY, _STRING, len(value)) + b''.join(_string(item) for item in value)
+    return _string(key) + struct.pack('<II', _UINT32, value)
+
+
+def write_gguf(path:str, size:int=0, metadata:dict|None=None, tensors:list[tuple[str, tuple[int, ...]]]|None=None) -> None:
+    """Write a GGUF v3 header and extend the file to `size` bytes, at least to the aligned tensor data start, with a hole
+
+    Args:
+        path (str): Output file
+        size (int, optional): Total file size, at least the header size. Defaults to 0.
+        metadata (dict | None, optional): String, uint32 or list of string values. Defaults to None.
+        tensors (list[tuple[str, tuple[int, ...]]] | None, optional): Tensor names and shapes. Defaults to None.
+    """
+    metadata = metadata or {}
+    tensors = tensors or []
+    header = bytearray(b'GGUF' + struct.pack('<IQQ', 3, len(tensors), len(metadata)))
+    for key, value in metadata.items():
+        header += _kv(key, value)
+    for name, shape in tensors:
+        # type 12 is Q4_K, offsets are not checked by the reader
+        header += _string(name) + struct.pack('<I', len(shape)) + struct.pack(f'<{len(shape)}Q', *shape) + struct.pack('<IQ', 12, 0)
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.truncate(max(size, -(-len(header) // 32) * 32))
+
+
+def write_model(model_dir:str, name:str, shards:int, shard_size:int, vocab:int, layers:int) -> int:
+    """Write one model in the llama-style layout, split in `shards` files. Returns the parameter count."""
+    tensors = [('token_embd.weight', (4096, vocab))]
+    for layer in range(layers):
+        tensors += [(f'blk.{layer}.{part}.weight', shape) for part, shape in (
+            ('attn_q', (4096, 4096)), ('attn_k', (4096, 1024)), ('attn_v', (4096, 1024)), ('attn_output', (4096, 4096)),
+            ('ffn_gate', (4096, 14336)), ('ffn_up', (4096, 14336)), ('ffn_down', (14336, 4096)),
+            ('attn_norm', (4096,)), ('ffn_norm', (4096,)))]
+    tensors += [('output_norm.weight', (4096,)), ('output.weight', (4096, vocab))]
+
+    tokens = [f'tok{i}' for i in range(vocab)]
+    merges = [f'tok{i} tok{i + 1}' for i in range(vocab)]
+    per_shard = -(-len(tensors) // shards)
+    for shard in range(shards):
+        metadata = {'split.no': shard, 'split.count': shards}
+        if shard == 0:
+            metadata.update({
+                'general.architecture': 'llama', 'general.name': name, 'general.file_type': 15,
+                'llama.context_length': 131072, 'llama.block_count': layers, 'llama.embedding_length': 4096,
+                'llama.attention.head_count': 32, 'llama.attention.head_count_kv': 8,
+                'tokenizer.ggml.tokens': tokens, 'tokenizer.ggml.merges': merges,
+            })
+        suffix = f'-{shard + 1:05d}-of-{shards:05d}' if shards > 1 else ''
+        write_gguf(os.path.join(model_dir, f'{name}{suffix}.gguf'), shard_size, metadata, tensors[shard * per_shard:(shard + 1) * per_shard])
+
+    total = 0
+    for _, shape in tensors:
+        count = 1
+        for dim in shape:
+            count *= dim
+        total += count
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', type=int, default=4)
+    parser.add_argument('--shards', type=int, default=3)
+    parser.add_argument('--shard-gb', type=float, default=8)
+    parser.add_argument('--vocab', type=int, default=150_000)
+    parser.add_argument('--layers', type=int, default=32)
+    parser.add_argument('--lookups', type=int, default=1000)
+    args = parser.parse_args()
+
+    from backend.model._internals.gguf import GgufIndex
+
+    with tempfile.TemporaryDirectory() as root:
+        model_dir = os.path.join(root, 'models')
+        os.makedirs(model_dir)
+        expected = {}
+        for i in range(args.models):
+            params = write_model(model_dir, f'model-{i}', args.shards, int(args.shard_gb * 1024 ** 3), args.vocab, args.layers)
+            first = f'model-{i}-00001-of-{args.shards:05d}.gguf' if args.shards > 1 else f'model-{i}.gguf'
+            expected[os.path.join(model_dir, first)] = params
+        files = args.models * args.shards
+        print(f'{args.models} models x {args.shards} shards x {args.shard_gb:g} GB ({files * args.shard_gb:g} GB apparent)')
+
+        index_path = os.path.join(root, 'index.json')
+        start = time.perf_counter()
+        parsed = GgufIndex(index_path).scan(model_dir)
+        cold = time.perf_counter() - start
+        print(f'cold scan:  {cold * 1000:8.1f} ms  ({parsed} headers read, {cold / files * 1000:.1f} ms per file)')
+
+        start = time.perf_counter()
+        index = GgufIndex(index_path)
+        parsed = index.scan(model_dir)
+        warm = time.perf_counter() - start
+        print(f'warm scan:  {warm * 1000:8.1f} ms  ({parsed} headers read)')
+
+        samples = []
+        paths = list(expected)
+        for i in range(args.lookups):
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            info = index.get(path)
+            samples.append(time.perf_counter() - start)
+            assert info is not None and info['complete'] and info['parameters'] == expected[path], info
+        print(f'lookup:     {statistics.median(samples) * 1e6:8.1f} us median per model')
+        print(f'example:    {info["architecture"]} {info["quantization"]} {info["parameters"] / 1e9:.2f}B params, '
+              f'{info["tensor_bytes"] / 1024 ** 3:.1f} GiB tensors, trained context {info["context_length"]}')
+
+        os.remove(os.path.join(model_dir, f'model-0-{args.shards:05d}-of-{args.shards:05d}.gguf') if args.shards > 1 else paths[0])
+        info = index.get(paths[0])
+        print(f'after removing a shard of model-0: {"complete" if info and info["complete"] else "rejected"}')
+
+
+if __name__ == '__main__':
+    main()
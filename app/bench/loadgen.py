@@ -0,0 +1,327 @@
+"""Open-loop load generator: replays a JSONL request trace against the router and writes a comparable report.
+
+Each trace line is one request:
+    {"timestamp": 0.5, "model": "fake-0", "messages": [...], "max_tokens": 64, "stream": true, "tenant": "sk-a"}
+`timestamp` is the arrival in seconds (`ts`/`created` work too), `path` defaults to `/v1/embeddings` for lines
+with `input`, `/v1/completions` for lines with `prompt` and `/v1/chat/completions` otherwise. `body` gives the full
+request body instead, `tenant` is sent as the bearer token. Lines without a timestamp, or every line with `--rate`,
+get Poisson arrivals at `--rate` requests per second. Requests are sent at their arrival time whether or not earlier
+ones finished, so a slow router builds a backlog instead of slowing the load down.
+
+Without `--url`, a router is started with fake llama-server models (`bench/fake_llama_server.py`) configured from the
+`--fake-*` arguments: as a `uvicorn main:app` process when uvicorn is installed, its CPU time read from `/proc`,
+else in this process, where the CPU time also covers the load generator. Without `--trace` a seeded synthetic
+trace is generated. The report (see `bench/report.py`) is printed and written to `--output`; `--compare` prints
+the change against an earlier report. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.loadgen --requests 2000 --rate 50 --output run.json
+    CONFIG_PATH=.. python -m bench.loadgen --trace trace.jsonl --speed 4 --compare base.json
+    CONFIG_PATH=.. python -m bench.loadgen --url http://localhost:8000 --router-pid 1234 --trace trace.jsonl
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import NamedTuple
+
+import httpx
+import yaml
+
+from bench.startup import write_fixture, free_port
+from bench.report import build_report, compare_reports, format_report, load_report, save_report
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COUNTERS = ('llama_router_model_starts_total', 'llama_router_model_crashes_total')
+
+
+class TraceRequest(NamedTuple):
+    at:float|None
+    model:str
+    path:str
+    body:dict
+    tenant:str|None
+
+
+def parse_line(record:dict) -> TraceRequest|None:
+    model_name = record.get('model') or (record.get('body') or {}).get('model')
+    if not model_name:
+        return None
+    at = record.get('timestamp', record.get('ts', record.get('created')))
+    body = record.get('body')
+    if body is None:
+        body = {key: record[key] for key in ('messages', 'prompt', 'input', 'max_tokens', 'stream', 'temperature') if key in record}
+        if not any(key in body for key in ('messages', 'prompt', 'input')):
+            body['messages'] = [{'role': 'user', 'content': 'hi'}]
+    body = {**body, 'model': model_name}
+    path = record.get('path')
+    if path is None:
+        path = '/v1/embeddings' if 'input' in body else '/v1/completions' if 'prompt' in body else '/v1/chat/completions'
+    return TraceRequest(None if at is None else float(at), model_name, path, body, record.get('tenant'))
+
+
+def load_requests(path:str) -> list[TraceRequest]:
+    requests = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                request = parse_line(json.loads(line))
+                if request is not None:
+                    requests.append(request)
+    return requests
+
+
+def synthetic_requests(models:list[str], count:int, seed:int, stream_ratio:float, embedding_ratio:float, max_tokens:int) -> list[TraceRequest]:
+    """Chat requests spread over `models` with a skew towards the first ones, plus embedding requests"""
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(models))]
+    requests = []
+    for i in range(count):
+        model_name = rng.choices(models, weights)[0]
+        if rng.random() < embedding_ratio:
+            body = {'input': [f'document {i} part {j}' for j in range(rng.randint(1, 8))]}
+        else:
+            body = {
+                'messages': [{'role': 'user', 'content': f'question {i} ' + 'lorem ipsum ' * rng.randint(1, 50)}],
+                'max_tokens': rng.randint(max(1, max_tokens // 4), max_tokens),
+                'stream': rng.random() < stream_ratio,
+            }
+        requests.append(parse_line({'model': model_name, **body}))
+    return requests
+
+
+def schedule(requests:list[TraceRequest], rate:float|None, speed:float, seed:int) -> list[tuple[float, TraceRequest]]:
+    """Arrival offsets from the start of the run, Poisson at `rate` where the trace has no timestamps or `rate` is given"""
+    rng = random.Random(seed)
+    timed = all(request.at is not None for request in requests) and rate is None
+    if timed:
+        first = min(request.at for request in requests)
+        return sorted(((request.at - first) / speed, request) for request in requests)
+    rate = rate or 10.0
+    arrivals = []
+    now = 0.0
+    for request in requests:
+        arrivals.append((now, request))
+        now += rng.expovariate(rate)
+    return arrivals
+
+
+def trace_digest(arrivals:list[tuple[float, TraceRequest]]) -> str:
+    digest = hashlib.sha256()
+    for at, request in arrivals:
+        digest.update(json.dumps([round(at, 6), request.path, request.body, request.tenant], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+async def send(client:httpx.AsyncClient, request:TraceRequest) -> dict:
+    headers = {'Authorization': f'Bearer {request.tenant}'} if request.tenant else {}
+    start = time.perf_counter()
+    ttft = None
+    status = 0
+    try:
+        async with client.stream('POST', request.path, json=request.body, headers=headers) as resp:
+            status = resp.status_code
+            streamed = resp.headers.get('content-type', '').startswith('text/event-stream')
+            async for chunk in resp.aiter_raw():
+                if streamed and ttft is None and chunk:
+                    ttft = time.perf_counter() - start
+    except httpx.HTTPError:
+        status = 0
+    return {'model': request.model, 'path': request.path, 'status': status, 'latency': time.perf_counter() - start, 'ttft': ttft}
+
+
+async def generate(client:httpx.AsyncClient, arrivals:list[tuple[float, TraceRequest]]) -> tuple[list[dict], float, float]:
+    """Send every request at its arrival offset
+
+    Returns:
+        tuple[list[dict], float, float]: Results, seconds from the first arrival to the last response, and the
+            largest delay of a send behind its arrival time (a large one means the generator itself was saturated)
+    """
+    tasks = []
+    late = 0.0
+    start = time.perf_counter()
+    for at, request in arrivals:
+        delay = start + at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            late = max(late, -delay)
+        tasks.append(asyncio.create_task(send(client, request)))
+    results = await asyncio.gather(*tasks)
+    return list(results), time.perf_counter() - start, late
+
+
+def scrape_counters(text:str) -> dict[str, dict[str, float]]:
+    counters:dict[str, dict[str, float]] = {}
+    for line in text.splitlines():
+        name, _, rest = line.partition('{')
+        if name not in COUNTERS:
+            continue
+        label, _, value = rest.partition('} ')
+        model_name = label.partition('="')[2].rstrip('"')
+        counters.setdefault(name, {})[model_name] = float(value)
+    return counters
+
+
+def counter_increase(before:dict, after:dict) -> dict[str, dict[str, float]]:
+    return {
+        name: {model_name: value - before.get(name, {}).get(model_name, 0.0) for model_name, value in values.items()}
+        for name, values in after.items()
+    }
+
+
+def process_cpu_seconds(pid:int) -> float|None:
+    """User plus system CPU time of a process from `/proc`, None where it is not available"""
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            fields = f.read().rsplit(b')', 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime are fields 14 and 15 of stat, counted from after the command name
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def write_bench_config(root:str, args) -> list[str]:
+    write_fixture(root, [args.fake_load_ms] * args.models)
+    config_path = os.path.join(root, 'config.yaml')
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    flags = ['--parallel', str(args.fake_slots), '--fake-slots', str(args.fake_slots), '--fake-load-ms', str(args.fake_load_ms),
+             '--fake-ttft-ms', str(args.fake_ttft_ms), '--fake-tokens-per-sec', str(args.fake_tokens_per_sec),
+             '--fake-item-ms', str(args.fake_item_ms)]
+    if args.fake_crash_after_requests:
+        flags += ['--fake-crash-after-requests', str(args.fake_crash_after_requests)]
+    for model in config['models'].values():
+        model['config'] = flags
+        if args.model_memory:
+            model['memory'] = args.model_memory
+    for setting in args.set:
+        key, _, value = setting.partition('=')
+        config['server'][key] = yaml.safe_load(value)
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+    return list(config['models'])
+
+
+async def wait_healthy(client:httpx.AsyncClient, timeout:float=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get('/health')).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError('The router did not become healthy')
+        await asyncio.sleep(0.1)
+
+
+async def run_against(client:httpx.AsyncClient, arrivals, cpu) -> tuple[list[dict], float, float, dict, float|None]:
+    before = scrape_counters((await client.get('/metrics')).text)
+    cpu_before = cpu()
+    results, duration, late = await generate(client, arrivals)
+    cpu_after = cpu()
+    counters = counter_increase(before, scrape_counters((await client.get('/metrics')).text))
+    cpu_seconds = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return results, duration, late, counters, cpu_seconds
+
+
+async def run(args, arrivals) -> tuple[tuple, str]:
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+            cpu = (lambda: process_cpu_seconds(args.router_pid)) if args.router_pid else (lambda: None)
+            return await run_against(client, arrivals, cpu), 'router' if args.router_pid else 'none'
+
+    if importlib.util.find_spec('uvicorn') is not None and not args.in_process:
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+            cwd=APP_DIR, env=os.environ.copy(), stderr=None if args.verbose else subprocess.DEVNULL
+        )
+        try:
+            async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=timeout, limits=limits) as client:
+                await wait_healthy(client)
+                return await run_against(client, arrivals, lambda: process_cpu_seconds(proc.pid)), 'router'
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    # the real app with its lifespan, in this process
+    import main
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=timeout) as client:
+            return await run_against(client, arrivals, time.process_time), 'router+loadgen'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace', help='JSONL request trace, synthetic when left out')
+    parser.add_argument('--rate', type=float, help='Poisson arrival rate in requests per second, overrides the trace timestamps')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed of trace timestamps')
+    parser.add_argument('--requests', type=int, default=1000, help='Size of the synthetic trace')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stream-ratio', type=float, default=0.5)
+    parser.add_argument('--embedding-ratio', type=float, default=0.1)
+    parser.add_argument('--max-tokens', type=int, default=64)
+    parser.add_argument('--url', help='Router to load instead of starting one with fake models')
+    parser.add_argument('--router-pid', type=int, help='Pid of the router at --url, for its CPU time')
+    parser.add_argument('--in-process', action='store_true', help='Run the router in this process even if uvicorn is installed')
+    parser.add_argument('--models', type=int, default=2, help='Fake models of the started router')
+    parser.add_argument('--model-memory', help='Memory hint of every fake model, with --set memory_budget=... to force evictions')
+    parser.add_argument('--fake-load-ms', type=float, default=500)
+    parser.add_argument('--fake-ttft-ms', type=float, default=20)
+    parser.add_argument('--fake-tokens-per-sec', type=float, default=500)
+    parser.add_argument('--fake-item-ms', type=float, default=1)
+    parser.add_argument('--fake-slots', type=int, default=4)
+    parser.add_argument('--fake-crash-after-requests', type=int)
+    parser.add_argument('--set', action='append', default=[], help='Server setting of the started router as key=yaml value, repeatable')
+    parser.add_argument('--max-connections', type=int, default=512)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    parser.add_argument('--compare', help='Earlier report to compare with')
+    parser.add_argument('--verbose', action='store_true', help='Show the router log')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        if not args.url:
+            model_names = write_bench_config(root, args)
+            os.environ['CONFIG_PATH'] = root
+            os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+            os.environ.setdefault('PRE_START', 'n')
+        if args.trace:
+            requests = load_requests(args.trace)
+        else:
+            if args.url:
+                parser.error('--url needs a --trace naming its models')
+            requests = synthetic_requests(model_names, args.requests, args.seed, args.stream_ratio, args.embedding_ratio, args.max_tokens)
+        arrivals = schedule(requests, args.rate, args.speed, args.seed)
+        (results, duration, late, counters, cpu_seconds), cpu_scope = asyncio.run(run(args, arrivals))
+
+    meta = {
+        'trace': args.trace or f'synthetic:{args.requests}:{args.seed}',
+        'trace_sha256': trace_digest(arrivals),
+        'generator_late_max': round(late, 4),
+        'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'verbose')},
+    }
+    report = build_report(results, duration, counters, cpu_seconds, cpu_scope, meta)
+    print(format_report(report))
+    if late > 0.05:
+        print(f'warning: requests were sent up to {late * 1000:.0f} ms after their arrival time, the generator was saturated')
+    if args.output:
+        save_report(report, args.output)
+    if args.compare:
+        print()
+        print(compare_reports(load_report(args.compare), report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Overhead of the `/metrics` instrumentation on the proxy hot path.
+
+First times the instrumentation a proxied request records (clock reads and histogram observations) in isolation,
+then drives the router in-process against a zero service time fake llama-server with the metrics enabled and
+replaced by no-ops, alternating rounds so both see the same noise. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.metrics_overhead --requests 4000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import timeit
+
+import httpx
+
+from bench.startup import write_fixture, free_port
+
+
+class NullMetric:
+    def observe(self, label_value, value):
+        pass
+
+    def inc(self, label_value, amount=1):
+        pass
+
+    def set(self, label_value, value):
+        pass
+
+
+class NullMetrics:
+    def __getattr__(self, name):
+        return NullMetric()
+
+
+def instrumentation_ns(number:int) -> float:
+    """Nanoseconds of instrumentation recorded by one non streaming proxied request"""
+    from backend.model._internals import RouterMetrics
+
+    metrics = RouterMetrics()
+    perf_counter = time.perf_counter
+
+    def one_request():
+        received_at = perf_counter()
+        wait_start = perf_counter()
+        waited = perf_counter() - wait_start
+        sent_at = perf_counter()
+        metrics.router_overhead.observe('fake-0', sent_at - received_at - waited)
+        metrics.upstream_ttft.observe('fake-0', perf_counter() - sent_at)
+        metrics.upstream_duration.observe('fake-0', perf_counter() - sent_at)
+
+    return timeit.timeit(one_request, number=number) / number * 1e9
+
+
+async def latencies(client:httpx.AsyncClient, requests:int) -> list[float]:
+    samples = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        resp = await client.post('/v1/chat/completions', json={'model': 'fake-0', 'messages': [{'role': 'user', 'content': 'hi'}]})
+        resp.raise_for_status()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def run(args):
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager, model_config
+    from exceptions import error_handler, BaseError
+
+    print(f'instrumentation per request: {instrumentation_ns(200_000):.0f} ns')
+
+    config = model_config['models']['fake-0']
+    config['port'] = free_port()
+    config['config'] = ['--fake-service-ms', '0']
+    manager = ContainerManager()
+    app = FastAPI()
+    app.include_router(router)
+    app.add_exception_handler(BaseError, error_handler)
+    app.state.container_manager = manager
+    await manager.ensure_running('fake-0')
+
+    metrics = manager.metrics
+    results = {'enabled': [], 'disabled': []}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=60) as client:
+            await latencies(client, 100)
+            for _ in range(args.rounds):
+                for mode in results:
+                    manager.metrics = metrics if mode == 'enabled' else NullMetrics()
+                    results[mode].extend(await latencies(client, args.requests // args.rounds))
+    finally:
+        manager.metrics = metrics
+        await manager.stop_all_container()
+
+    print(f'{"metrics":>9}{"p50 ms":>10}{"mean ms":>10}')
+    for mode, samples in results.items():
+        print(f'{mode:>9}{statistics.median(samples) * 1000:>10.3f}{statistics.fmean(samples) * 1000:>10.3f}')
+    delta = statistics.median(results['enabled']) - statistics.median(results['disabled'])
+    print(f'p50 difference: {delta * 1e6:+.1f} us per request')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--rounds', type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, [0])
+        os.environ['CONFIG_PATH'] = root
+        os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
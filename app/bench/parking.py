@@ -0,0 +1,85 @@
+"""Cold start of a stopped model versus a parked one, against the fake llama-server reading a real model file.
+
+The fake server is started with `--fake-disk-mbps`, so its load time grows with the bytes of the model file that
+are missing from the page cache. Between two starts the page cache of the model is dropped with
+`POSIX_FADV_DONTNEED`, as memory pressure would while the model sits idle. A parked model has its files warmed
+again by the park refresh before the next request arrives. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.parking --size-mb 512 --disk-mbps 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from bench.startup import write_fixture, free_port
+from bench.gguf_index import write_gguf
+from bench.fake_llama_server import uncached_bytes
+
+
+def write_model_file(path:str, size_mb:int):
+    write_gguf(path, metadata={'general.architecture': 'fake'})
+    chunk = os.urandom(1024 * 1024)
+    with open(path, 'ab') as f:
+        for _ in range(size_mb):
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def run(args):
+    from backend.model._internals.container import ContainerManager, model_config
+    from backend.model._internals.park import drop_files
+
+    model_config['server']['park'] = {'method': args.method, 'refresh_interval': 3600}
+    config = model_config['models']['fake-0']
+    config['port'] = free_port()
+    config['config'] = ['--fake-load-ms', str(args.load_ms), '--fake-disk-mbps', str(args.disk_mbps)]
+    manager = ContainerManager()
+    files = manager.model_files('fake-0')
+    await manager.start_container('fake-0')
+
+    results = {}
+    for scenario in ('stopped', 'parked'):
+        samples = []
+        missing = []
+        for _ in range(args.repeats):
+            await manager.stop_container('fake-0', park=scenario == 'parked')
+            await asyncio.gather(*manager.parking._warming)
+            # memory pressure while the model is idle
+            drop_files(files)
+            if scenario == 'parked':
+                await manager.parking.refresh()
+            missing.append(sum(uncached_bytes(path) for path in files))
+            start = time.perf_counter()
+            await manager.ensure_running('fake-0')
+            samples.append(time.perf_counter() - start)
+        results[scenario] = (statistics.median(samples), statistics.median(missing))
+    await manager.stop_all_container()
+
+    print(f'{"state":>8}{"uncached MB":>14}{"ready ms":>10}')
+    for scenario, (seconds, missing) in results.items():
+        print(f'{scenario:>8}{missing / 1024 ** 2:>14.0f}{seconds * 1000:>10.0f}')
+    print(f'parking stats: {manager.parking.stats()["parks"]} parks, {manager.parking.stats()["parked_starts"]} parked starts')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=512)
+    parser.add_argument('--disk-mbps', type=float, default=200)
+    parser.add_argument('--load-ms', type=float, default=200)
+    parser.add_argument('--method', choices=['read', 'advise'], default='read')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, [args.load_ms])
+        write_model_file(os.path.join(root, 'models', 'fake-0.gguf'), args.size_mb)
+        os.environ['CONFIG_PATH'] = root
+        os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
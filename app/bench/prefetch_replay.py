@@ -0,0 +1,161 @@
+"""Offline evaluation of the predictive prefetch scheduler by replaying a request trace.
+
+The trace is a JSONL file with a `model` field per line and an optional `timestamp` (see `load_trace`). Without
+one, a seeded synthetic trace is generated: pipelines that call a fixed sequence of models (embedding, then
+reranker, then a chat model) plus random single requests, with idle gaps longer than the idle timeout between
+sessions and a busier daytime.
+
+Both runs replay the same trace through the same idle reaper and memory budget (LRU eviction). The reactive run
+only loads models on request; the predictive run also feeds `DemandPredictor` and applies `plan_prefetch` every
+`--interval` seconds and whenever the requested model changes, starting models only when they fit without
+evicting anything. Loads take the model's load time, a request for a model still loading waits for the rest.
+Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.prefetch_replay
+    CONFIG_PATH=.. python -m bench.prefetch_replay --trace trace.jsonl --model Gemma3:4GB:8 --model Qwen2.5:5GB:12
+"""
+import argparse
+import random
+
+from backend.model._internals.config import parse_size
+from backend.model._internals.eviction import EvictionEngine, LRUPolicy, load_trace
+from backend.model._internals.predictor import DemandPredictor, plan_prefetch
+
+# name: (memory, load seconds)
+DEFAULT_MODELS = {
+    'embedding': ('1GB', 3.0),
+    'reranker': ('1.5GB', 4.0),
+    'chat-small': ('3GB', 8.0),
+    'chat-large': ('9GB', 25.0),
+    'coder': ('6GB', 15.0),
+}
+PIPELINES = [
+    ['embedding', 'reranker', 'chat-large'],
+    ['embedding', 'reranker', 'chat-small'],
+    ['coder', 'chat-small'],
+]
+
+
+def synthetic_trace(models:list[str], days:int, seed:int) -> list[tuple[float, str]]:
+    rng = random.Random(seed)
+    trace = []
+    now = 0.0
+    end = days * 86400.0
+    while now < end:
+        hour = (now % 86400) / 3600
+        # sessions every ~15 minutes during the day, every ~2 hours at night
+        now += rng.expovariate(1 / (900 if 8 <= hour < 20 else 7200))
+        if rng.random() < 0.8:
+            for model_name in rng.choice(PIPELINES):
+                for _ in range(rng.randint(1, 4)):
+                    now += rng.expovariate(1 / 3)
+                    trace.append((now, model_name))
+                now += rng.uniform(2, 20)
+        else:
+            trace.append((now, rng.choice(models)))
+    return trace
+
+
+def replay(trace:list[tuple[float, str]], models:dict[str, tuple[int, float]], budget:int, args, predictive:bool) -> dict:
+    engine = EvictionEngine(budget, LRUPolicy(), estimator=lambda name: models[name][0], clock=lambda: 0.0)
+    predictor = DemandPredictor(window=args.window) if predictive else None
+    ready_at:dict[str, float] = {}
+    last_used:dict[str, float] = {}
+    unused_prestarts:set[str] = set()
+    keep:set[str] = set()
+    stats = {'requests': 0, 'cold_starts': 0, 'partial_waits': 0, 'wait_seconds': 0.0, 'prestarts': 0, 'wasted_prestarts': 0}
+
+    def stop(model_name:str):
+        del ready_at[model_name]
+        engine.record_stop(model_name)
+        if model_name in unused_prestarts:
+            unused_prestarts.discard(model_name)
+            stats['wasted_prestarts'] += 1
+
+    def tick(now:float):
+        for model_name in list(ready_at):
+            if now - last_used.get(model_name, 0.0) > args.idle_timeout and model_name not in keep:
+                stop(model_name)
+        if predictor is not None:
+            prefetch(now)
+
+    def prefetch(now:float):
+        nonlocal keep
+        plan = plan_prefetch(predictor, models, set(ready_at), args.horizon, args.start_threshold, 1.1, args.keep_threshold, now=now)
+        keep = set(plan['keep'])
+        for model_name in plan['start']:
+            if engine.fits(models[model_name][0]):
+                engine.record_start(model_name, models[model_name][1], models[model_name][0])
+                ready_at[model_name] = now + models[model_name][1]
+                last_used[model_name] = now
+                unused_prestarts.add(model_name)
+                stats['prestarts'] += 1
+
+    next_tick = trace[0][0] if trace else 0.0
+    for now, model_name in trace:
+        if model_name not in models:
+            continue
+        while next_tick <= now:
+            tick(next_tick)
+            next_tick += args.interval
+        stats['requests'] += 1
+        engine.record_request(model_name, now=now)
+        if predictor is not None:
+            switched = predictor.last_model != model_name
+            predictor.record(model_name, now)
+            if switched:
+                # like the router, a switch to another model triggers a round right away
+                prefetch(now)
+        unused_prestarts.discard(model_name)
+        last_used[model_name] = now
+        if model_name in ready_at:
+            if ready_at[model_name] > now:
+                stats['partial_waits'] += 1
+                stats['wait_seconds'] += ready_at[model_name] - now
+            continue
+        for victim in engine.plan(model_name, now=now):
+            stop(victim)
+        engine.record_start(model_name, models[model_name][1], models[model_name][0])
+        ready_at[model_name] = now + models[model_name][1]
+        stats['cold_starts'] += 1
+        stats['wait_seconds'] += models[model_name][1]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trace', help='JSONL request trace')
+    parser.add_argument('--budget', default='16GB')
+    parser.add_argument('--model', action='append', default=[], help='name:memory:load_seconds, repeatable')
+    parser.add_argument('--days', type=int, default=7, help='Length of the synthetic trace')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--idle-timeout', type=float, default=180)
+    parser.add_argument('--interval', type=float, default=15, help='Scheduler period in seconds')
+    parser.add_argument('--horizon', type=float, default=60)
+    parser.add_argument('--window', type=float, default=120)
+    parser.add_argument('--start-threshold', type=float, default=0.7)
+    parser.add_argument('--keep-threshold', type=float, default=0.5)
+    args = parser.parse_args()
+
+    raw_models = DEFAULT_MODELS
+    if args.model:
+        raw_models = {}
+        for spec in args.model:
+            name, memory, load = spec.rsplit(':', 2)
+            raw_models[name] = (memory, float(load))
+    models = {name: (parse_size(memory), load) for name, (memory, load) in raw_models.items()}
+    budget = parse_size(args.budget)
+
+    if args.trace:
+        trace = [(ts, name) for ts, name in load_trace(args.trace) if name in models]
+    else:
+        trace = synthetic_trace(list(models), args.days, args.seed)
+
+    print(f'requests: {len(trace)}, budget: {budget / 1024**3:.1f} GiB, idle timeout: {args.idle_timeout:g}s')
+    print(f'{"run":<12}{"cold starts":>12}{"partial":>9}{"wait (s)":>10}{"prestarts":>11}{"wasted":>8}')
+    for name, predictive in (('reactive', False), ('predictive', True)):
+        r = replay(trace, models, budget, args, predictive)
+        print(f'{name:<12}{r["cold_starts"]:>12}{r["partial_waits"]:>9}{r["wait_seconds"]:>10.0f}{r["prestarts"]:>11}{r["wasted_prestarts"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Load test of multi-replica dispatch against fake llama-server processes.
+
+Each fake server processes `--slots` requests at a time with a fixed service time, so a single replica caps
+throughput at slots / service time. The router is driven in-process through `httpx.ASGITransport`.
+Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.replica_scaling --replicas 1 2 4 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from bench.startup import write_fixture, free_port
+
+
+async def run_load(app, model_name:str, concurrency:int, duration:float) -> tuple[int, float]:
+    done = 0
+    deadline = time.perf_counter() + duration
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=60) as client:
+        async def worker():
+            nonlocal done
+            while time.perf_counter() < deadline:
+                resp = await client.post('/v1/chat/completions', json={'model': model_name, 'messages': [{'role': 'user', 'content': 'hi'}]})
+                resp.raise_for_status()
+                done += 1
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return done, time.perf_counter() - start
+
+
+async def run(args):
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager, model_config
+    from exceptions import error_handler, BaseError
+
+    print(f'service time {args.service_ms} ms, {args.slots} slot(s) per replica, {args.concurrency} concurrent clients, balancer {args.balancer}')
+    print(f'{"replicas":>9}{"req/s":>10}{"scaling":>10}')
+    baseline = None
+    for replicas in args.replicas:
+        config = model_config['models']['fake-0']
+        config['replicas'] = replicas
+        config['ports'] = [free_port() for _ in range(replicas)]
+        config['balancer'] = args.balancer
+        config['config'] = ['--fake-service-ms', str(args.service_ms), '--fake-slots', str(args.slots)]
+
+        manager = ContainerManager()
+        app = FastAPI()
+        app.include_router(router)
+        app.add_exception_handler(BaseError, error_handler)
+        app.state.container_manager = manager
+        await manager.ensure_running('fake-0')
+        try:
+            done, elapsed = await run_load(app, 'fake-0', args.concurrency, args.duration)
+        finally:
+            await manager.stop_all_container()
+        rps = done / elapsed
+        baseline = baseline or rps / replicas
+        print(f'{replicas:>9}{rps:>10.1f}{rps / (baseline * replicas):>9.0%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--replicas', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--service-ms', type=float, default=50.0)
+    parser.add_argument('--slots', type=int, default=1)
+    parser.add_argument('--balancer', default='least_outstanding', choices=['least_outstanding', 'p2c'])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, [0])
+        os.environ['CONFIG_PATH'] = root
+        os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
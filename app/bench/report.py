@@ -0,0 +1,199 @@
+"""Summary of a load generator run, saved as JSON so runs can be compared across commits.
+
+A report holds the throughput, latency and TTFT percentiles, error and cold start counts and the router CPU time
+per request, in total and per model, next to the commit, the trace digest and the run arguments. Compare two saved
+reports with:
+    python -m bench.report base.json new.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+
+# metric, unit, whether lower is better
+COMPARED = [
+    ('throughput', 'req/s', False),
+    ('latency_p50', 'ms', True),
+    ('latency_p99', 'ms', True),
+    ('ttft_p50', 'ms', True),
+    ('ttft_p99', 'ms', True),
+    ('errors', '', True),
+    ('cold_starts', '', True),
+    ('cpu_per_request', 'ms', True),
+]
+
+
+def percentile(values:list[float], q:float) -> float|None:
+    """Nearest-rank percentile, None without samples"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+def _ms(value:float|None) -> float|None:
+    return None if value is None else round(value * 1000, 2)
+
+
+def summarize_results(results:list[dict], duration:float) -> dict:
+    """Throughput, latency and TTFT of a list of request results
+
+    Args:
+        results (list[dict]): One dict per request with `status`, `latency` and `ttft` (None when not streamed) in seconds
+        duration (float): Seconds from the first arrival until the last response
+
+    Returns:
+        dict: Summary, times in milliseconds
+    """
+    ok = [result for result in results if result['status'] == 200]
+    latencies = [result['latency'] for result in ok]
+    ttfts = [result['ttft'] for result in ok if result['ttft'] is not None]
+    statuses:dict[str, int] = {}
+    for result in results:
+        if result['status'] != 200:
+            statuses[str(result['status'])] = statuses.get(str(result['status']), 0) + 1
+    return {
+        'requests': len(results),
+        'completed': len(ok),
+        'errors': len(results) - len(ok),
+        'statuses': statuses,
+        'throughput': round(len(ok) / duration, 2) if duration > 0 else 0.0,
+        'latency_p50': _ms(percentile(latencies, 0.5)),
+        'latency_p90': _ms(percentile(latencies, 0.9)),
+        'latency_p99': _ms(percentile(latencies, 0.99)),
+        'latency_max': _ms(max(latencies, default=None)),
+        'ttft_p50': _ms(percentile(ttfts, 0.5)),
+        'ttft_p99': _ms(percentile(ttfts, 0.99)),
+    }
+
+
+def git_revision(path:str) -> dict:
+    def git(*args) -> str|None:
+        try:
+            return subprocess.run(['git', *args], cwd=path, capture_output=True, text=True, timeout=10, check=True).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {'commit': git('rev-parse', '--short', 'HEAD'), 'dirty': bool(status) if status is not None else None}
+
+
+def build_report(results:list[dict], duration:float, counters:dict[str, dict[str, float]], cpu_seconds:float|None,
+                 cpu_scope:str, meta:dict) -> dict:
+    """Assemble the report of a run
+
+    Args:
+        results (list[dict]): Request results, with `model` besides the fields of `summarize_results`
+        duration (float): Seconds of the run
+        counters (dict[str, dict[str, float]]): Router counter increases during the run by metric name and model
+        cpu_seconds (float | None): CPU time of the router during the run, None when it could not be measured
+        cpu_scope (str): What `cpu_seconds` covers, `router` or `router+loadgen` for an in-process router
+        meta (dict): Run arguments and trace description
+
+    Returns:
+        dict: The report
+    """
+    starts = counters.get('llama_router_model_starts_total', {})
+    crashes = counters.get('llama_router_model_crashes_total', {})
+    total = summarize_results(results, duration)
+    total['cold_starts'] = int(sum(starts.values()))
+    total['crashes'] = int(sum(crashes.values()))
+    total['cpu_seconds'] = None if cpu_seconds is None else round(cpu_seconds, 3)
+    total['cpu_per_request'] = round(cpu_seconds * 1000 / total['requests'], 3) if cpu_seconds is not None and total['requests'] else None
+    models = {}
+    for model_name in sorted({result['model'] for result in results}):
+        summary = summarize_results([result for result in results if result['model'] == model_name], duration)
+        summary['cold_starts'] = int(starts.get(model_name, 0))
+        summary['crashes'] = int(crashes.get(model_name, 0))
+        models[model_name] = summary
+    return {
+        'meta': {
+            **git_revision(os.path.dirname(os.path.abspath(__file__))),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_scope': cpu_scope,
+            'duration': round(duration, 3),
+            **meta,
+        },
+        'total': total,
+        'models': models,
+    }
+
+
+def _fmt(value) -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return str(value)
+
+
+def format_report(report:dict) -> str:
+    meta = report['meta']
+    dirty = '+dirty' if meta.get('dirty') else ''
+    lines = [
+        f'commit {meta.get("commit")}{dirty}, trace {meta.get("trace")} ({meta.get("trace_sha256", "")[:12]}), '
+        f'{meta["duration"]:.1f}s, cpu scope {meta["cpu_scope"]}',
+        f'{"model":<20}{"req":>7}{"err":>6}{"req/s":>9}{"p50 ms":>9}{"p99 ms":>9}{"ttft50":>9}{"ttft99":>9}{"cold":>6}',
+    ]
+    rows = [*report['models'].items(), ('total', report['total'])]
+    for name, summary in rows:
+        lines.append(
+            f'{name:<20}{summary["requests"]:>7}{summary["errors"]:>6}{_fmt(summary["throughput"]):>9}'
+            f'{_fmt(summary["latency_p50"]):>9}{_fmt(summary["latency_p99"]):>9}{_fmt(summary["ttft_p50"]):>9}'
+            f'{_fmt(summary["ttft_p99"]):>9}{summary["cold_starts"]:>6}'
+        )
+    total = report['total']
+    if total['cpu_per_request'] is not None:
+        lines.append(f'router cpu: {total["cpu_seconds"]:.2f}s, {total["cpu_per_request"]:.3f} ms per request')
+    if total['statuses']:
+        lines.append(f'errors by status: {total["statuses"]}')
+    return '\n'.join(lines)
+
+
+def compare_reports(base:dict, new:dict) -> str:
+    """Side by side totals of two reports with the relative change, flags runs of different traces"""
+    lines = [f'{"metric":<18}{"base":>12}{"new":>12}{"change":>10}']
+    base_meta, new_meta = base['meta'], new['meta']
+    if base_meta.get('trace_sha256') != new_meta.get('trace_sha256'):
+        lines.insert(0, 'warning: the runs replayed different traces')
+    lines.insert(0, f'base {base_meta.get("commit")} ({base_meta.get("date")}), new {new_meta.get("commit")} ({new_meta.get("date")})')
+    for metric, unit, lower_is_better in COMPARED:
+        old, current = base['total'].get(metric), new['total'].get(metric)
+        change, verdict = '', ''
+        if old and current is not None:
+            delta = (current - old) / old * 100
+            change = f'{delta:+.1f}%'
+            if abs(delta) >= 5:
+                verdict = 'better' if (delta < 0) == lower_is_better else 'worse'
+        label = f'{metric} ({unit})' if unit else metric
+        lines.append(f'{label:<18}{_fmt(old):>12}{_fmt(current):>12}{change:>10}  {verdict}'.rstrip())
+    return '\n'.join(lines)
+
+
+def save_report(report:dict, path:str):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path:str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    args = parser.parse_args()
+    base, new = load_report(args.base), load_report(args.new)
+    print(format_report(new))
+    print()
+    print(compare_reports(base, new))
+
+
+if __name__ == '__main__':
+    main()
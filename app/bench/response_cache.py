@@ -0,0 +1,90 @@
+"""Latency of the completion response cache, hit path vs a request that goes to the model server.
+
+Every distinct prompt is sent once to fill the cache (miss) and then `--repeats` more times (hits), with and
+without `stream`. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.response_cache --prompts 50 --repeats 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from bench.startup import write_fixture, free_port
+
+
+async def timed_post(client:httpx.AsyncClient, body:dict) -> tuple[float, str|None]:
+    start = time.perf_counter()
+    async with client.stream('POST', '/v1/chat/completions', json=body) as resp:
+        resp.raise_for_status()
+        async for _ in resp.aiter_bytes():
+            pass
+    return time.perf_counter() - start, resp.headers.get('x-cache')
+
+
+def describe(label:str, samples:list[float]) -> str:
+    samples = sorted(samples)
+    p99 = samples[max(0, int(len(samples) * 0.99) - 1)]
+    return f'{label:>12}{len(samples):>8}{statistics.median(samples) * 1000:>10.3f}{p99 * 1000:>10.3f}'
+
+
+async def run(args):
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager, model_config
+    from exceptions import error_handler, BaseError
+
+    config = model_config['models']['fake-0']
+    config['port'] = free_port()
+    config['config'] = ['--fake-service-ms', str(args.service_ms)]
+    model_config['server']['response_cache'] = {'max_bytes': '64MB', 'ttl': 600}
+
+    manager = ContainerManager()
+    app = FastAPI()
+    app.include_router(router)
+    app.add_exception_handler(BaseError, error_handler)
+    app.state.container_manager = manager
+    await manager.ensure_running('fake-0')
+
+    print(f'service time {args.service_ms} ms, {args.prompts} prompts, {args.repeats} repeats each')
+    print(f'{"":>12}{"n":>8}{"p50 ms":>10}{"p99 ms":>10}')
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=60) as client:
+            for stream in (False, True):
+                misses, hits = [], []
+                for i in range(args.prompts):
+                    body = {'model': 'fake-0', 'temperature': 0, 'stream': stream, 'messages': [{'role': 'user', 'content': f'prompt {i}'}]}
+                    elapsed, cache = await timed_post(client, body)
+                    misses.append(elapsed)
+                    for _ in range(args.repeats):
+                        elapsed, cache = await timed_post(client, body)
+                        assert cache == 'HIT'
+                        hits.append(elapsed)
+                kind = 'stream' if stream else 'json'
+                print(describe(f'{kind} miss', misses))
+                print(describe(f'{kind} hit', hits))
+    finally:
+        await manager.stop_all_container()
+    print(manager.response_cache.stats())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prompts', type=int, default=50)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--service-ms', type=float, default=50.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, [0])
+        os.environ['CONFIG_PATH'] = root
+        os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+        asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Startup-time benchmark for `ContainerManager.pre_start` against fake llama-server processes.
+
+Every model is backed by `bench/fake_llama_server.py` with its own simulated load time, so the numbers only
+reflect the router's scheduling and health polling. Run from the `app` directory:
+    python -m bench.startup --load-ms 400 1500 800 2500 --concurrency 1 4
+"""
+import argparse
+import asyncio
+import math
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import yaml
+
+from bench.gguf_index import write_gguf
+
+FAKE_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_llama_server.py')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_fixture(root:str, load_ms:list[float]) -> None:
+    """Write a config.yaml and dummy gguf files, with the fake server as `llama_server_command`"""
+    model_dir = os.path.join(root, 'models')
+    os.makedirs(model_dir)
+
+    models = {}
+    for i, ms in enumerate(load_ms):
+        model_path = f'fake-{i}.gguf'
+        write_gguf(os.path.join(model_dir, model_path), metadata={'general.architecture': 'fake'})
+        models[f'fake-{i}'] = {
+            'model_path': model_path,
+            'port': free_port(),
+            'priority': len(load_ms) - i,
+            'config': ['--fake-load-ms', str(ms)],
+        }
+    config = {'server': {'llama_server_path': None, 'llama_server_command': [sys.executable, FAKE_SERVER], 'host': '127.0.0.1'}, 'models': models}
+    with open(os.path.join(root, 'config.yaml'), 'w') as f:
+        yaml.safe_dump(config, f)
+
+
+def legacy_estimate(load_ms:list[float]) -> float:
+    """Boot time of the old sequential loop: fixed 2s sleep, then a /health poll every 3s"""
+    total = 0.0
+    for ms in load_ms:
+        load = ms / 1000
+        total += 2 + (0 if load <= 2 else math.ceil((load - 2) / 3) * 3)
+    return total
+
+
+async def run(load_ms:list[float], concurrency_levels:list[int]):
+    from backend.model._internals.container import ContainerManager, model_config
+
+    print(f'models: {len(load_ms)}, simulated load time (ms): {load_ms}')
+    print(f'{"mode":<28}{"boot (s)":>10}')
+    print(f'{"legacy sequential (est.)":<28}{legacy_estimate(load_ms):>10.2f}')
+    for concurrency in concurrency_levels:
+        model_config['server']['pre_start_concurrency'] = concurrency
+        manager = ContainerManager()
+        start = time.perf_counter()
+        await manager.pre_start()
+        elapsed = time.perf_counter() - start
+        await manager.stop_all_container()
+        print(f'{f"concurrency={concurrency}":<28}{elapsed:>10.2f}')
+    print(f'{"lower bound (slowest model)":<28}{max(load_ms) / 1000:>10.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--load-ms', type=float, nargs='+', default=[400, 1500, 800, 2500])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, args.load_ms)
+        # container.py reads the config at import time
+        os.environ['CONFIG_PATH'] = root
+        os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+        asyncio.run(run(args.load_ms, args.concurrency))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Time to first token and requests per second of the streaming proxy vs the old buffered one, against a fake
+llama-server model.
+
+The buffered path is the proxy before streaming: a new `httpx.AsyncClient` per request and `post`, which reads the
+whole SSE response before the first chunk is passed on. The streamed path is the router's own endpoint with the
+pooled per-model client. `--concurrency` clients send `--requests` streaming chat completions of `--tokens` tokens
+at `--token-ms` per token, then the same number of short non streaming ones.
+
+The router is called as a plain ASGI app and the time of the first body message it sends is taken as the TTFT, an
+`httpx.ASGITransport` would buffer the response and hide the difference. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.streaming --requests 200 --concurrency 8 --tokens 32 --token-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+import yaml
+
+from bench.startup import write_fixture
+
+
+def legacy_router():
+    """The proxy endpoint before streaming, without the cold start handling that does not matter for a warm model"""
+    from fastapi import APIRouter, Request
+    from fastapi.responses import StreamingResponse
+    from backend.model._internals.container import model_config
+
+    router = APIRouter()
+
+    @router.post('/v1/chat/completions')
+    async def chat_proxy_requests(req:Request):
+        body = await req.json()
+        config = model_config['models'].get(body.get('model'))
+        target_url = f'http://{model_config["server"]["host"]}:{config["port"]}{req.url.path}'
+        async with httpx.AsyncClient() as http_client:
+            resp = await http_client.post(url=target_url, json=body, timeout=300.0)
+            if resp.headers.get('content-type', '').startswith('text/event-stream'):
+                async def stream_response():
+                    async for chunk in resp.aiter_bytes():
+                        yield chunk
+
+                return StreamingResponse(stream_response(), media_type='text/event-stream')
+            return resp.json()
+
+    return router
+
+
+async def asgi_post(app, path:str, body:dict) -> tuple[int, float, float]:
+    """POST `body` to an ASGI app
+
+    Returns:
+        tuple[int, float, float]: Status code, seconds until the first non empty body chunk and until the last one
+    """
+    payload = json.dumps(body).encode()
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'router'), (b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())],
+        'client': ('127.0.0.1', 0), 'server': ('router', 80),
+    }
+    sent = False
+    finished = asyncio.Event()
+    status = 0
+    first = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': payload, 'more_body': False}
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status, first
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            if first is None and message.get('body'):
+                first = time.perf_counter() - start
+            if not message.get('more_body'):
+                finished.set()
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    finished.set()
+    latency = time.perf_counter() - start
+    return status, first if first is not None else latency, latency
+
+
+async def run(args, legacy:bool, stream:bool) -> tuple[list[float], list[float], float]:
+    from fastapi import FastAPI
+    from backend.model import router
+    from backend.model._internals.container import ContainerManager
+    from exceptions import error_handler, BaseError
+
+    manager = ContainerManager()
+    app = FastAPI()
+    app.include_router(legacy_router() if legacy else router)
+    app.add_exception_handler(BaseError, error_handler)
+    app.state.container_manager = manager
+    await manager.start_container('fake-0')
+
+    ttfts:list[float] = []
+    latencies:list[float] = []
+    body = {'model': 'fake-0', 'messages': [], 'stream': stream, 'max_tokens': args.tokens if stream else 1}
+    remaining = args.requests
+
+    async def client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            status, ttft, latency = await asgi_post(app, '/v1/chat/completions', body)
+            assert status == 200, status
+            ttfts.append(ttft)
+            latencies.append(latency)
+
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await manager.stop_all_container()
+    ttfts.sort()
+    latencies.sort()
+    return ttfts, latencies, args.requests / elapsed
+
+
+def prepare(root:str, args):
+    write_fixture(root, [0])
+    config_path = os.path.join(root, 'config.yaml')
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    config['models']['fake-0']['config'] += [
+        '--fake-slots', str(args.concurrency), '--fake-service-ms', str(args.service_ms), '--fake-token-ms', str(args.token_ms)
+    ]
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f)
+    os.environ['CONFIG_PATH'] = root
+    os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+    from backend.model._internals import container
+    container.model_config.clear()
+    container.model_config.update(container.load_config(config_path))
+    container.config_yaml_path = root
+    container.state_dir_path = root
+    container.model_dir_path = os.environ['MODEL_PATH']
+
+
+def percentile(samples:list[float], q:float) -> float:
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--tokens', type=int, default=32)
+    parser.add_argument('--token-ms', type=float, default=20)
+    parser.add_argument('--service-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    print(f'{args.requests} requests, {args.concurrency} concurrent, {args.service_ms:.0f} ms to the first token, '
+          f'streams of {args.tokens} tokens at {args.token_ms:.0f} ms/token')
+    print(f'{"path":<18}{"ttft p50":>10}{"ttft p99":>10}{"total p50":>11}{"rps":>8}')
+    for stream in (True, False):
+        for legacy in (True, False):
+            with tempfile.TemporaryDirectory() as root:
+                prepare(root, args)
+                ttfts, latencies, rps = asyncio.run(run(args, legacy, stream))
+            name = f'{"buffered" if legacy else "streamed"}, {"sse" if stream else "json"}'
+            print(f'{name:<18}{percentile(ttfts, 0.5):>10.1f}{percentile(ttfts, 0.99):>10.1f}{percentile(latencies, 0.5):>11.1f}{rps:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
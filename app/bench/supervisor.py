@@ -0,0 +1,84 @@
+"""Scripted scenarios for the process supervisor against the fake llama-server.
+
+`readiness`: time until a model is usable after spawn, detected from the "server is listening on" line versus
+`/health` polling alone (`--fake-quiet` hides the line).
+`crash`: a server that exits shortly after loading. Reports how fast the router notices the exit and how long the
+restarts with backoff take. Run from the `app` directory:
+    CONFIG_PATH=.. python -m bench.supervisor --load-ms 300 1000 2000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from bench.startup import write_fixture, free_port
+
+
+async def readiness(args):
+    from backend.model._internals.container import ContainerManager, model_config
+
+    print(f'{"load ms":>8}{"line ms":>10}{"poll ms":>10}')
+    for load_ms in args.load_ms:
+        row = []
+        for quiet in (False, True):
+            samples = []
+            for _ in range(args.repeats):
+                config = model_config['models']['fake-0']
+                config['port'] = free_port()
+                config['config'] = ['--fake-load-ms', str(load_ms)] + (['--fake-quiet'] if quiet else [])
+                manager = ContainerManager()
+                start = time.perf_counter()
+                await manager.start_container('fake-0')
+                samples.append(time.perf_counter() - start)
+                await manager.stop_all_container()
+            row.append(statistics.median(samples) * 1000)
+        print(f'{load_ms:>8g}{row[0]:>10.0f}{row[1]:>10.0f}')
+
+
+async def crash(args):
+    from backend.model._internals.container import ContainerManager, model_config
+
+    model_config['server'].update({'restart_backoff_initial': 0.2, 'restart_backoff_max': 1, 'restart_max_attempts': 3})
+    config = model_config['models']['fake-0']
+    config['port'] = free_port()
+    config['config'] = ['--fake-load-ms', '100', '--fake-crash-after-ms', str(args.crash_after_ms)]
+    manager = ContainerManager()
+    await manager.ensure_running('fake-0')
+    start = time.perf_counter()
+    events = []
+    running = True
+    while time.perf_counter() - start < args.crash_duration:
+        now = manager.is_running('fake-0')
+        if now != running:
+            events.append((time.perf_counter() - start, 'up' if now else 'down'))
+            running = now
+        await asyncio.sleep(0.005)
+    for elapsed, state in events:
+        print(f'{elapsed * 1000:>8.0f} ms  {state}')
+    print(f'crashes detected: {manager.metrics.crashes._values.get("fake-0", 0):g}, restarts: {manager.metrics.restarts._values.get("fake-0", 0):g}')
+    await manager.stop_all_container()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=['readiness', 'crash', 'all'], default='all')
+    parser.add_argument('--load-ms', type=float, nargs='+', default=[300, 1000, 2000])
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--crash-after-ms', type=float, default=500)
+    parser.add_argument('--crash-duration', type=float, default=6.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        write_fixture(root, [0])
+        os.environ['CONFIG_PATH'] = root
+        os.environ['MODEL_PATH'] = os.path.join(root, 'models')
+        if args.scenario in ('readiness', 'all'):
+            asyncio.run(readiness(args))
+        if args.scenario in ('crash', 'all'):
+            asyncio.run(crash(args))
+
+
+if __name__ == '__main__':
+    main()
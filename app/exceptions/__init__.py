@@ -1,2 +1,2 @@
-from .exception import BaseError, ModelNotFound, ContainerError, ContainerNotFound, ContainerUnhealthyError, ModelFileError, ContainerExitedEarly
+from .exception import BaseError, ModelNotFound, ContainerError, ContainerNotFound, ContainerUnhealthyError, ModelFileError, ContainerExitedEarly, ModelQueueFull, ModelQueueTimeout, RateLimited, ModelBusy, InvalidConfig
 from .handler import error_handler, unexpected_error_handler
\ No newline at end of file
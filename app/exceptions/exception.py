@@ -70,4 +70,53 @@ class ContainerExitedEarly(BaseError):
             'model_name': model_name,
             'return_code': ret_code
         }
-        super().__init__(message=msg, error_code=err, details=det)
\ No newline at end of file
+        super().__init__(message=msg, error_code=err, details=det)
+
+class ModelQueueFull(BaseError):
+    def __init__(self, model_name:str, retry_after:int):
+        msg = f"Too many requests are waiting for model `{model_name}` to start. Retry after {retry_after}s"
+        err = "MODEL_QUEUE_FULL"
+        det = {
+            'model_name': model_name,
+            'retry_after': retry_after
+        }
+        super().__init__(message=msg, error_code=err, details=det)
+
+class ModelQueueTimeout(BaseError):
+    def __init__(self, model_name:str, retry_after:int):
+        msg = f"Timed out waiting for model `{model_name}` to start. Retry after {retry_after}s"
+        err = "MODEL_QUEUE_TIMEOUT"
+        det = {
+            'model_name': model_name,
+            'retry_after': retry_after
+        }
+        super().__init__(message=msg, error_code=err, details=det)
+
+class RateLimited(BaseError):
+    def __init__(self, tenant:str, retry_after:int):
+        msg = f"Tenant `{tenant}` is over its rate limit. Retry after {retry_after}s"
+        err = "RATE_LIMITED"
+        det = {
+            'tenant': tenant,
+            'retry_after': retry_after
+        }
+        super().__init__(message=msg, error_code=err, details=det)
+
+class ModelBusy(BaseError):
+    def __init__(self, model_name:str, retry_after:int):
+        msg = f"Model `{model_name}` has too many requests waiting for a free slot. Retry after {retry_after}s"
+        err = "MODEL_BUSY"
+        det = {
+            'model_name': model_name,
+            'retry_after': retry_after
+        }
+        super().__init__(message=msg, error_code=err, details=det)
+
+class InvalidConfig(BaseError):
+    def __init__(self, reason:str):
+        msg = f"The config was not loaded, the running config is kept: {reason}"
+        err = "INVALID_CONFIG"
+        det = {
+            'reason': reason
+        }
+        super().__init__(message=msg, error_code=err, details=det)
@@ -10,11 +10,21 @@ STATUS_CODE_MAP = {
     'DOCKER_CONTAINER_ERROR': status.HTTP_500_INTERNAL_SERVER_ERROR,
     'CONTAINER_NOT_FOUND': status.HTTP_404_NOT_FOUND,
     'MODEL_FILE_NOT_ACCESSIBLE': status.HTTP_404_NOT_FOUND,
-    'CONTAINER_EXITED_EARLY': status.HTTP_503_SERVICE_UNAVAILABLE
+    'CONTAINER_EXITED_EARLY': status.HTTP_503_SERVICE_UNAVAILABLE,
+    'MODEL_QUEUE_FULL': status.HTTP_429_TOO_MANY_REQUESTS,
+    'MODEL_QUEUE_TIMEOUT': status.HTTP_503_SERVICE_UNAVAILABLE,
+    'RATE_LIMITED': status.HTTP_429_TOO_MANY_REQUESTS,
+    'MODEL_BUSY': status.HTTP_429_TOO_MANY_REQUESTS,
+    'INVALID_CONFIG': status.HTTP_400_BAD_REQUEST
 }
 
 logger = get_logger()
 
+def _count_error(request:Request, error_code:str):
+    manager = getattr(request.app.state, 'container_manager', None)
+    if manager is not None:
+        manager.metrics.errors.inc(error_code)
+
 async def error_handler(request:Request, exc:BaseError):
     """Global exception handler
 
@@ -23,6 +33,7 @@ async def error_handler(request:Request, exc:BaseError):
         exc (BaseError): Received exception/error.
     """
     status_code = STATUS_CODE_MAP.get(exc.error_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+    _count_error(request, exc.error_code)
     response_content = {
         'error_code': exc.error_code,
         'message': exc.message,
@@ -36,8 +47,11 @@ async def error_handler(request:Request, exc:BaseError):
         logger.info('Client error: %s - %s', exc.error_code, exc.message)
 
     if exc.error_code != 'CONTAINER_NOT_FOUND':
+        headers = None
+        if 'retry_after' in exc.details:
+            headers = {'Retry-After': str(exc.details['retry_after'])}
         resp = JSONResponse(
-            content=response_content, status_code=status_code
+            content=response_content, status_code=status_code, headers=headers
         )
         return resp
     else:
@@ -50,6 +64,7 @@ async def unexpected_error_handler(request:Request, exc:Exception):
         request (Request): FastAPI request that cause this error.
         exc (Exception): Received exception/error.
     """
+    _count_error(request, 'INTERNAL_ERROR')
     logger.error(
     f"Unexpected error in {request.method} {request.url}: {type(exc).__name__}: {exc}",
     exc_info=True,
@@ -4,13 +4,12 @@ from fastapi import FastAPI
 from contextlib import asynccontextmanager
 import asyncio
 import pathlib
-import pynvml
 
 env_path = '.env'
 if pathlib.Path(env_path).exists():    
     dotenv.load_dotenv()
 
-from backend import router, check_stop_idle_containers, ContainerManager
+from backend import router, check_stop_idle_containers, run_prefetch_scheduler, watch_config, ContainerManager
 from exceptions import error_handler, unexpected_error_handler, BaseError
 from logger import get_logger
 
@@ -21,26 +20,28 @@ PRE_START = True if os.getenv('PRE_START', 'n').lower() == 'y' else False
 async def lifespan(app: FastAPI):
     #pre start
     manager = ContainerManager()
-    app.state.available_gpus = None
-    try:
-        pynvml.nvmlInit()
-        app.state.available_gpus = pynvml.nvmlDeviceGetCount()
-    except Exception:
-        logger.warning('Could not determine number of GPU using nvml. Skipping.')
+    await manager.gpu_telemetry.start()
+    await asyncio.to_thread(manager.index_models)
+    # with `server.coordination` only the leader worker runs the model servers
+    await manager.start_coordination()
     if PRE_START:
         logger.info('Starting with pre-start version')
         await manager.pre_start()
+        asyncio.create_task(check_stop_idle_containers(manager, stop_models=False))
     else:
         logger.info('Starting with load-on-demand version')
         asyncio.create_task(check_stop_idle_containers(manager))
+        if manager.predictor is not None:
+            asyncio.create_task(run_prefetch_scheduler(manager))
+    # with `server.config_reload` config.yaml changes are applied without a restart
+    asyncio.create_task(watch_config(manager))
     app.state.container_manager = manager
 
     yield
 
     #post start
     await manager.stop_all_container()
-    if app.state.available_gpus:
-        pynvml.nvmlShutdown()
+    await manager.gpu_telemetry.stop()
 
 app = FastAPI(lifespan=lifespan)
 
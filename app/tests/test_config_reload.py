@@ -0,0 +1,79 @@
+import asyncio
+import copy
+import gc
+import os
+import tempfile
+import time
+import unittest
+
+from backend.model._internals import container
+from bench.startup import write_fixture
+
+
+class PendingRestartTest(unittest.TestCase):
+    """A reload that detaches a crashed model while its restart waits for the backoff"""
+    def setUp(self):
+        self._saved = (copy.deepcopy(container.model_config), container.config_yaml_path, container.state_dir_path, container.model_dir_path)
+        self.root = tempfile.TemporaryDirectory()
+        root = self.root.name
+        write_fixture(root, [100, 100])
+        container.model_config.clear()
+        container.model_config.update(container.load_config(os.path.join(root, 'config.yaml')))
+        container.model_config['server'].update({'restart_backoff_initial': 1.0, 'health_poll_initial': 0.05, 'health_poll_max': 0.1})
+        container.model_config['models']['fake-0']['config'] += ['--fake-crash-after-ms', '300']
+        container.config_yaml_path = container.state_dir_path = root
+        container.model_dir_path = os.path.join(root, 'models')
+
+    def tearDown(self):
+        config, container.config_yaml_path, container.state_dir_path, container.model_dir_path = self._saved
+        container.model_config.clear()
+        container.model_config.update(config)
+        self.root.cleanup()
+
+    async def reload_during_backoff(self, change) -> dict:
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        manager = container.ContainerManager()
+        try:
+            await manager.start_container('fake-0')
+            deadline = time.monotonic() + 10
+            while manager.is_running('fake-0') and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            pending = len(manager._restarts.get('fake-0', ()))
+            new_config = copy.deepcopy(container.model_config)
+            change(new_config['models'])
+            await manager.reload_config(new_config)
+            await manager.wait_for_rolls()
+            # past the backoff of the cancelled restart
+            await asyncio.sleep(1.5)
+            gc.collect()
+            return {
+                'pending': pending,
+                'restarts': len(manager._restarts.get('fake-0', ())),
+                'running': manager.is_running('fake-0'),
+                'pool': manager._pools.get('fake-0'),
+                'errors': errors,
+            }
+        finally:
+            await manager.stop_all_container()
+
+    def check(self, result:dict):
+        self.assertEqual(result['pending'], 1)
+        self.assertEqual(result['restarts'], 0)
+        self.assertFalse(result['running'])
+        self.assertIsNone(result['pool'])
+        self.assertEqual(result['errors'], [])
+
+    def test_roll(self):
+        def change(models):
+            models['fake-0']['config'] = ['--fake-load-ms', '50']
+        self.check(asyncio.run(self.reload_during_backoff(change)))
+
+    def test_remove(self):
+        def change(models):
+            del models['fake-0']
+        self.check(asyncio.run(self.reload_during_backoff(change)))
+
+
+if __name__ == '__main__':
+    unittest.main()
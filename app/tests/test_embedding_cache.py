@@ -0,0 +1,85 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from backend.model._internals.embedding_cache import DiskEmbeddingStore, EmbeddingCache
+from backend.model.model import _embeddings
+
+
+class FakeManager:
+    """Just what `_embeddings` uses of the container manager, answering every input with a constant vector"""
+    def __init__(self, cache:EmbeddingCache):
+        self.embedding_cache = cache
+        self.embedding_batcher = None
+        self.upstream_inputs:list = []
+
+    def model_identity(self, model_name:str) -> str:
+        return 'identity'
+
+    async def update_last_request_time(self, model_name:str):
+        pass
+
+    async def ensure_running(self, model_name:str):
+        pass
+
+    def track_request(self, model_name:str):
+        return self
+
+    def release(self):
+        pass
+
+    async def post_json(self, model_name:str, path:str, body:dict) -> httpx.Response:
+        self.upstream_inputs.append(body['input'])
+        data = [{'object': 'embedding', 'index': i, 'embedding': [1.0, 2.0, 3.0]} for i in range(len(body['input']))]
+        return httpx.Response(200, json={'data': data, 'usage': {'prompt_tokens': len(body['input'])}})
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+    def test_put_same_key_again(self):
+        cache = EmbeddingCache(max_bytes=48)
+        for _ in range(5):
+            cache.put(b'key', [1.0, 2.0, 3.0], 1)
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], 12)
+        cache.put(b'other', [1.0, 2.0, 3.0], 1)
+        self.assertIsNotNone(cache.get(b'other'))
+        self.assertEqual(cache.stats()['bytes'], 24)
+
+    def test_repeated_inputs_in_one_request(self):
+        cache = EmbeddingCache(max_bytes=1024)
+        manager = FakeManager(cache)
+        resp = asyncio.run(_embeddings(manager, 'model', {'model': 'model', 'input': ['a', 'b', 'a', 'a']}))
+        content = json.loads(resp.body)
+        self.assertEqual(len(content['data']), 4)
+        self.assertEqual(content['data'][2]['embedding'], [1.0, 2.0, 3.0])
+        self.assertEqual(manager.upstream_inputs, [['a', 'b']])
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['bytes'], 24)
+
+    def test_disk_index_is_compacted(self):
+        with tempfile.TemporaryDirectory() as path:
+            store = DiskEmbeddingStore(path, dim=2, max_entries=4)
+            from array import array
+            for i in range(20):
+                store.put(i.to_bytes(4, 'big'), array('f', [float(i), 0.0]), i)
+            store.close()
+            with open(os.path.join(path, '2.idx')) as f:
+                self.assertLessEqual(len(f.readlines()), 8)
+            store = DiskEmbeddingStore(path, dim=2, max_entries=4)
+            self.assertEqual(store.get((19).to_bytes(4, 'big'))[1], 19)
+            self.assertIsNone(store.get((15).to_bytes(4, 'big')))
+            # the next write reuses the oldest slot
+            store.put(b'new!', array('f', [0.0, 0.0]), 0)
+            self.assertIsNone(store.get((16).to_bytes(4, 'big')))
+            self.assertIsNotNone(store.get((17).to_bytes(4, 'big')))
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
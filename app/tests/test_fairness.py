@@ -0,0 +1,36 @@
+import unittest
+
+from backend.model._internals.fairness import ModelScheduler
+
+
+class PruneTest(unittest.TestCase):
+    def test_live_tags_are_not_pruned_on_every_call(self):
+        scheduler = ModelScheduler('model', lambda: 1, max_waiting=1, timeout=1)
+        scans = 0
+        tag = ModelScheduler._tag
+
+        def counting_tag(self, tenant, cost, weight):
+            nonlocal scans
+            before = self._prune_at
+            finish = tag(self, tenant, cost, weight)
+            scans += self._prune_at != before
+            return finish
+
+        # every tag is ahead of the virtual time, so none can be dropped
+        for i in range(20_000):
+            counting_tag(scheduler, f'tenant-{i}', 1.0, 1.0)
+        self.assertEqual(len(scheduler._finish), 20_000)
+        self.assertLessEqual(scans, 3)
+
+    def test_stale_tags_are_pruned(self):
+        scheduler = ModelScheduler('model', lambda: 1, max_waiting=1, timeout=1)
+        for i in range(4096):
+            scheduler._tag(f'tenant-{i}', 1.0, 1.0)
+        scheduler._virtual = 10.0
+        scheduler._tag('late', 1.0, 1.0)
+        self.assertEqual(list(scheduler._finish), ['late'])
+        self.assertEqual(scheduler._prune_at, 4096)
+
+
+if __name__ == '__main__':
+    unittest.main()
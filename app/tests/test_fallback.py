@@ -0,0 +1,93 @@
+import asyncio
+import copy
+import os
+import tempfile
+import unittest
+
+import httpx
+import yaml
+
+from backend.model._internals import container
+from backend.model._internals.eviction import EvictionEngine, LRUPolicy
+from bench.gguf_index import write_gguf
+from bench.startup import write_fixture
+
+GB = 1024**3
+
+
+class FitsTest(unittest.TestCase):
+    def test_fits_without_protected_models(self):
+        engine = EvictionEngine(15 * GB, LRUPolicy(), lambda model_name: 10 * GB)
+        engine.record_start('b', 1.0)
+        self.assertTrue(engine.fits('a'))
+        self.assertFalse(engine.fits('a', protected={'b'}))
+        self.assertEqual(engine.plan('a', protected={'b'}), [])
+
+
+class BudgetFallbackTest(unittest.TestCase):
+    """A two model group where the memory budget holds one of them"""
+    def setUp(self):
+        self._saved = (copy.deepcopy(container.model_config), container.config_yaml_path, container.state_dir_path, container.model_dir_path)
+        self.root = tempfile.TemporaryDirectory()
+        root = self.root.name
+        write_fixture(root, [100, 100])
+        for i in range(2):
+            write_gguf(os.path.join(root, 'models', f'fake-{i}.gguf'), size=10 * GB, metadata={'general.architecture': 'fake'})
+        config_path = os.path.join(root, 'config.yaml')
+        with open(config_path) as f:
+            config = yaml.safe_load(f)
+        config['server'].update({
+            'memory_budget': '15GB', 'eviction_drain_timeout': 0.2,
+            'fallback': {'slo': 0.1, 'groups': [{'models': ['fake-0', 'fake-1']}]},
+        })
+        for model in config['models'].values():
+            model['config'] += ['--fake-token-ms', '20']
+        with open(config_path, 'w') as f:
+            yaml.safe_dump(config, f)
+        container.model_config.clear()
+        container.model_config.update(container.load_config(config_path))
+        container.config_yaml_path = container.state_dir_path = root
+        container.model_dir_path = os.path.join(root, 'models')
+
+    def tearDown(self):
+        config, container.config_yaml_path, container.state_dir_path, container.model_dir_path = self._saved
+        container.model_config.clear()
+        container.model_config.update(config)
+        self.root.cleanup()
+
+    async def serve_substituted(self) -> tuple[list[httpx.Response], bool, bool]:
+        from fastapi import FastAPI
+        from backend.model import router
+        from exceptions import error_handler, BaseError
+
+        manager = container.ContainerManager()
+        app = FastAPI()
+        app.include_router(router)
+        app.add_exception_handler(BaseError, error_handler)
+        app.state.container_manager = manager
+        await manager.start_container('fake-1')
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=60) as client:
+                # each generation takes 1s, longer than the eviction drain
+                body = {'model': 'fake-0', 'messages': [], 'stream': True, 'max_tokens': 50}
+                responses = await asyncio.gather(*(client.post('/v1/chat/completions', json=body) for _ in range(3)))
+            await asyncio.sleep(0.3)
+            return responses, manager.is_running('fake-1'), manager.is_running('fake-0') or 'fake-0' in manager._starting
+        finally:
+            await manager.stop_all_container()
+
+    def test_substituted_requests_are_not_cut_off(self):
+        responses, member_running, started = asyncio.run(self.serve_substituted())
+        for resp in responses:
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.headers['x-served-model'], 'fake-1')
+            self.assertEqual(resp.text.count('data: {'), 50)
+            self.assertTrue(resp.text.rstrip().endswith('data: [DONE]'))
+        self.assertTrue(member_running)
+        # fake-0 only fits without fake-1, so it is not warmed up while fake-1 stands in for it
+        self.assertFalse(started)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from backend.model._internals.gguf import GgufIndex
+from bench.gguf_index import write_gguf
+
+
+class GgufIndexTest(unittest.TestCase):
+    def test_concurrent_get_and_save(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = [os.path.join(root, f'model-{i}.gguf') for i in range(16)]
+            for path in paths:
+                write_gguf(path, metadata={'general.architecture': 'llama'})
+            index_path = os.path.join(root, 'state', '.gguf-index.json')
+            os.makedirs(os.path.dirname(index_path))
+            index = GgufIndex(index_path)
+            errors = []
+
+            def work(offset:int):
+                try:
+                    for i in range(len(paths)):
+                        self.assertIsNotNone(index.get(paths[(i + offset) % len(paths)]))
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=work, args=(offset,)) for offset in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            with open(index_path) as f:
+                self.assertEqual(set(json.load(f)['files']), set(paths))
+            # no tmp file of any writer is left behind
+            self.assertEqual(os.listdir(os.path.dirname(index_path)), ['.gguf-index.json'])
+            for path in paths:
+                self.assertIsNotNone(index.cached(path))
+
+    def test_cached_does_not_read(self):
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'model.gguf')
+            write_gguf(path, metadata={'general.architecture': 'llama'})
+            index = GgufIndex()
+            self.assertIsNone(index.cached(path))
+            index.get(path)
+            os.remove(path)
+            self.assertIsNotNone(index.cached(path))
+            self.assertIsNone(index.get(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import copy
+import os
+import tempfile
+import time
+import unittest
+
+import httpx
+
+from backend.model._internals import container
+from backend.model._internals.supervisor import RestartBackoff
+from bench.startup import write_fixture
+
+
+class RestartBackoffTest(unittest.TestCase):
+    def test_delays_grow_reset_and_give_up(self):
+        backoff = RestartBackoff(initial=1, maximum=4, reset_after=10, max_attempts=4)
+        self.assertEqual([backoff.next_delay(uptime=0) for _ in range(4)], [1, 2, 4, 4])
+        self.assertIsNone(backoff.next_delay(uptime=0))
+        # a process that stayed up for `reset_after` counts as a first crash again
+        self.assertEqual(backoff.next_delay(uptime=10), 1)
+        self.assertEqual(backoff.next_delay(uptime=9.9), 2)
+
+
+class FakeServerTest(unittest.TestCase):
+    """The supervisor against `bench/fake_llama_server.py` as the llama-server binary"""
+    def setUp(self):
+        self._saved = (copy.deepcopy(container.model_config), container.config_yaml_path, container.state_dir_path, container.model_dir_path)
+        self.root = tempfile.TemporaryDirectory()
+        root = self.root.name
+        write_fixture(root, [300])
+        config_path = os.path.join(root, 'config.yaml')
+        container.model_config.clear()
+        container.model_config.update(container.load_config(config_path))
+        container.config_yaml_path = container.state_dir_path = root
+        container.model_dir_path = os.path.join(root, 'models')
+
+    def tearDown(self):
+        config, container.config_yaml_path, container.state_dir_path, container.model_dir_path = self._saved
+        container.model_config.clear()
+        container.model_config.update(config)
+        self.root.cleanup()
+
+    def configure(self, flags:list[str], **server):
+        container.model_config['server'].update(server)
+        container.model_config['models']['fake-0']['config'] += flags
+
+    async def start(self) -> tuple[float, bool, bool]:
+        manager = container.ContainerManager()
+        try:
+            start = time.perf_counter()
+            await manager.start_container('fake-0')
+            elapsed = time.perf_counter() - start
+            replica = manager._pools['fake-0'].replicas[0]
+            return elapsed, replica.watch.ready.is_set(), manager.is_running('fake-0')
+        finally:
+            await manager.stop_all_container()
+
+    def test_ready_on_listening_line(self):
+        # the first poll comes before the model is loaded and the next one only 30s later
+        self.configure([], health_poll_initial=30, health_poll_max=30)
+        elapsed, line_seen, running = asyncio.run(self.start())
+        self.assertTrue(line_seen)
+        self.assertTrue(running)
+        self.assertLess(elapsed, 10)
+
+    def test_quiet_server_ready_on_health_poll(self):
+        self.configure(['--fake-quiet'], health_poll_initial=0.05, health_poll_max=0.1)
+        elapsed, line_seen, running = asyncio.run(self.start())
+        self.assertFalse(line_seen)
+        self.assertTrue(running)
+
+    async def crash(self) -> dict:
+        from fastapi import FastAPI
+        from backend.model import router
+        from exceptions import error_handler, BaseError
+
+        manager = container.ContainerManager()
+        app = FastAPI()
+        app.include_router(router)
+        app.add_exception_handler(BaseError, error_handler)
+        app.state.container_manager = manager
+        statuses = []
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url='http://router', timeout=30) as client:
+                body = {'model': 'fake-0', 'messages': []}
+                for _ in range(3):
+                    statuses.append((await client.post('/v1/chat/completions', json=body)).status_code)
+                deadline = time.monotonic() + 10
+                while manager.is_running('fake-0') and time.monotonic() < deadline:
+                    await asyncio.sleep(0.01)
+                after_crash = {
+                    'status': manager._server_status['fake-0']['status'],
+                    'ready': len(manager._pools['fake-0'].ready()),
+                    'crashed': 'fake-0' in manager._crashed,
+                }
+                # the next request cold starts the model again
+                statuses.append((await client.post('/v1/chat/completions', json=body)).status_code)
+            return {**after_crash, 'statuses': statuses, 'running': manager.is_running('fake-0')}
+        finally:
+            await manager.stop_all_container()
+
+    def test_crash_clears_ready_state(self):
+        self.configure(['--fake-crash-after-ms', '1000', '--fake-quiet'], restart_on_crash=False, health_poll_initial=0.05, health_poll_max=0.1)
+        result = asyncio.run(self.crash())
+        self.assertFalse(result['status'])
+        self.assertEqual(result['ready'], 0)
+        self.assertTrue(result['crashed'])
+        self.assertEqual(result['statuses'], [200] * 4)
+        self.assertTrue(result['running'])
+
+
+if __name__ == '__main__':
+    unittest.main()